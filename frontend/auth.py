@@ -1,8 +1,10 @@
-from flask import Blueprint, render_template, redirect, url_for, flash, request
+from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify
 from flask_login import login_user, logout_user, login_required, current_user
 from urllib.parse import urlparse
-from db import User, Role
-from forms import LoginForm, RegistrationForm, LibrarianCreationForm
+from db import User, Role, pool_stats
+from query_stats import query_stats
+from forms import LoginForm, RegistrationForm, LibrarianCreationForm, PurchaseSettingsForm
+from purchase_settings import purchase_settings
 
 auth_bp = Blueprint('auth', __name__)
 
@@ -25,6 +27,9 @@ def login():
             flash('Invalid username or password', 'danger')
             return redirect(url_for('auth.login', admin='1' if request.args.get('admin') == '1' else None))
         
+        # Bring hashes made with older algorithms or costs up to the current settings
+        user.upgrade_password_hash(form.password.data)
+        
         # Log the user in
         login_user(user, remember=form.remember_me.data)
         
@@ -109,6 +114,57 @@ def admin_dashboard():
     
     return render_template('auth/admin_dashboard.html')
 
+@auth_bp.route('/admin/db-pool')
+@login_required
+def db_pool_stats():
+    # Check if the user is an admin
+    if not current_user.is_admin():
+        return jsonify({'error': 'Administrator privileges required'}), 403
+    
+    # Connection pool usage and checkout wait times, for sizing DB_POOL_MAX
+    return jsonify(pool_stats())
+
+@auth_bp.route('/admin/db-queries')
+@login_required
+def db_query_report():
+    # Check if the user is an admin
+    if not current_user.is_admin():
+        return jsonify({'error': 'Administrator privileges required'}), 403
+    
+    # Queries and DB time per endpoint, the costliest statements, N+1 suspects and slow queries
+    report = query_stats.report(top=request.args.get('top', 25, type=int))
+    if request.args.get('reset') == '1':
+        query_stats.reset()
+    return jsonify(report)
+
+@auth_bp.route('/admin/purchase-settings', methods=['GET', 'POST'])
+@login_required
+def edit_purchase_settings():
+    # Check if the user is an admin
+    if not current_user.is_admin():
+        flash('Access denied. Administrator privileges required.', 'danger')
+        return redirect(url_for('main.index'))
+    
+    form = PurchaseSettingsForm()
+    
+    if form.validate_on_submit():
+        try:
+            # Broadcast to every worker, so the change applies immediately everywhere
+            purchase_settings.update(
+                allow_student_purchases=form.allow_student_purchases.data,
+                default_book_price=form.default_book_price.data
+            )
+            flash('Purchase settings updated successfully!', 'success')
+            return redirect(url_for('auth.admin_dashboard'))
+        except Exception:
+            flash('An error occurred while updating the purchase settings.', 'danger')
+    elif request.method == 'GET':
+        settings = purchase_settings.get()
+        form.allow_student_purchases.data = settings['allow_student_purchases']
+        form.default_book_price.data = settings['default_book_price']
+    
+    return render_template('auth/purchase_settings.html', form=form)
+
 @auth_bp.route('/admin/create-librarian', methods=['GET', 'POST'])
 @login_required
 def create_librarian():
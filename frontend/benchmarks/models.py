@@ -0,0 +1,117 @@
+"""Compare the cost of turning result rows into Book objects.
+
+Run from the frontend directory:
+
+    python -m benchmarks.models
+    python -m benchmarks.models --rows 100000 --repeat 5
+
+"before" is the old path: a dict per row (as a dict cursor returns them) and
+a Book built from it by keyword, with an instance __dict__. "after" is the
+current path: tuple rows mapped positionally by db.row_maker into __slots__
+Books. No database is needed; rows are synthetic but shaped like a listing query.
+"""
+import sys
+import time
+import json
+import argparse
+import tracemalloc
+from datetime import datetime
+
+import db
+
+COLUMNS = ('id', 'title', 'author', 'isbn', 'genre', 'section_id', 'available', 'created_at', 'updated_at',
+           'section_name')
+
+class LegacyBook:
+    """Book as it was before __slots__ and row mapping"""
+
+    def __init__(self, id=None, title=None, author=None, isbn=None, genre=None, section_id=None,
+                 available=True, created_at=None, updated_at=None, section_name=None):
+        self.id = id
+        self.title = title
+        self.author = author
+        self.isbn = isbn
+        self.genre = genre
+        self.section_id = section_id
+        self.available = available
+        self.created_at = created_at
+        self.updated_at = updated_at
+        self._section_name = section_name
+        self._section = None
+
+def make_rows(count):
+    now = datetime.now()
+    return [
+        (i, f"Book title {i}", f"Author {i % 500}", f"978-{i:010d}", 'Fiction', i % 20, True, now, now,
+         f"Section {i % 20}")
+        for i in range(count)
+    ]
+
+def map_before(rows):
+    dict_rows = [dict(zip(COLUMNS, row)) for row in rows]
+    return [
+        LegacyBook(
+            id=row['id'],
+            title=row['title'],
+            author=row['author'],
+            isbn=row['isbn'],
+            genre=row['genre'],
+            section_id=row['section_id'],
+            available=row['available'],
+            created_at=row['created_at'],
+            updated_at=row['updated_at'],
+            section_name=row['section_name']
+        )
+        for row in dict_rows
+    ]
+
+def map_after(rows):
+    make = db.row_maker(db.Book, COLUMNS)
+    return [make(row) for row in rows]
+
+def bench_speed(mapper, rows, repeat):
+    """Best objects/sec over `repeat` runs"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        mapper(rows)
+        best = min(best, time.perf_counter() - start)
+    return len(rows) / best
+
+def bench_memory(mapper, rows):
+    """(bytes retained per Book, peak bytes per row while mapping), excluding the row values themselves"""
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    tracemalloc.reset_peak()
+    books = mapper(rows)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    retained = (current - baseline) / len(rows)
+    del books
+    return retained, (peak - baseline) / len(rows)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=50000, help='rows to map per run')
+    parser.add_argument('--repeat', type=int, default=3, help='timing runs per mapper (best is reported)')
+    parser.add_argument('--json', dest='json_path', help='write results to this JSON file')
+    args = parser.parse_args(argv)
+
+    rows = make_rows(args.rows)
+    results = {}
+    print(f"{'mapper':<8}{'objects/s':>14}{'bytes/Book':>12}{'peak bytes/row':>16}")
+    for name, mapper in (('before', map_before), ('after', map_after)):
+        per_sec = bench_speed(mapper, rows, args.repeat)
+        retained, peak = bench_memory(mapper, rows)
+        results[name] = {'objects_per_sec': per_sec, 'bytes_per_book': retained, 'peak_bytes_per_row': peak}
+        print(f"{name:<8}{per_sec:>14,.0f}{retained:>12.0f}{peak:>16.0f}")
+
+    speedup = results['after']['objects_per_sec'] / results['before']['objects_per_sec']
+    saving = 1 - results['after']['bytes_per_book'] / results['before']['bytes_per_book']
+    print(f"\n{speedup:.2f}x faster, {saving:.0%} less memory per Book")
+    if args.json_path:
+        with open(args.json_path, 'w') as f:
+            json.dump({'rows': args.rows, 'results': results}, f, indent=2)
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,87 @@
+"""Measure login (password verification) throughput for candidate hashing settings.
+
+Run from the frontend directory:
+
+    python -m benchmarks.passwords
+    python -m benchmarks.passwords --methods scrypt:16384:8:1 pbkdf2:sha256:600000 --seconds 5
+
+For each method it reports verifications per second on one core, and with
+--pool the throughput of the app's hashing process pool across all workers.
+"""
+import os
+import sys
+import time
+import json
+import argparse
+from werkzeug.security import generate_password_hash, check_password_hash
+
+DEFAULT_METHODS = [
+    'scrypt:32768:8:1',
+    'scrypt:16384:8:1',
+    'pbkdf2:sha256:600000',
+    'pbkdf2:sha256:260000'
+]
+
+def bench_inline(method, seconds):
+    """Verifications per second on the current core"""
+    password_hash = generate_password_hash('correct horse battery staple', method)
+    count = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        check_password_hash(password_hash, 'correct horse battery staple')
+        count += 1
+    elapsed = time.perf_counter() - start
+    return count / elapsed, elapsed / count
+
+def bench_pool(method, seconds):
+    """Verifications per second through the app's process pool, with every worker busy"""
+    import passwords
+    from concurrent.futures import ThreadPoolExecutor
+
+    passwords.PASSWORD_SETTINGS['method'] = method
+    password_hash = passwords.hash_password('correct horse battery staple')
+    workers = passwords.PASSWORD_SETTINGS['workers']
+    deadline = time.perf_counter() + seconds
+
+    def client():
+        done = 0
+        while time.perf_counter() < deadline:
+            passwords.verify_password(password_hash, 'correct horse battery staple')
+            done += 1
+        return done
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers * 2) as clients:
+        total = sum(clients.map(lambda _: client(), range(workers * 2)))
+    elapsed = time.perf_counter() - start
+    passwords.shutdown()
+    return total / elapsed, workers
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--methods', nargs='+', default=DEFAULT_METHODS, help='werkzeug hash methods to compare')
+    parser.add_argument('--seconds', type=float, default=3.0, help='time to spend on each method')
+    parser.add_argument('--pool', action='store_true', help='also measure the multi-process hashing pool')
+    parser.add_argument('--json', dest='json_path', help='write results to this JSON file')
+    args = parser.parse_args(argv)
+
+    results = []
+    print(f"{'method':<28}{'logins/s/core':>15}{'ms/login':>10}{'pool logins/s':>16}")
+    for method in args.methods:
+        per_core, per_login = bench_inline(method, args.seconds)
+        result = {'method': method, 'logins_per_sec_per_core': per_core, 'ms_per_login': per_login * 1000}
+        line = f"{method:<28}{per_core:>15.1f}{per_login * 1000:>10.1f}"
+        if args.pool:
+            pooled, workers = bench_pool(method, args.seconds)
+            result.update({'pool_logins_per_sec': pooled, 'pool_workers': workers})
+            line += f"{pooled:>16.1f}"
+        results.append(result)
+        print(line)
+
+    print(f"\nCPUs available: {os.cpu_count()}")
+    if args.json_path:
+        with open(args.json_path, 'w') as f:
+            json.dump({'cpus': os.cpu_count(), 'results': results}, f, indent=2)
+
+if __name__ == '__main__':
+    sys.exit(main())
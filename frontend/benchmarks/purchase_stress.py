@@ -0,0 +1,148 @@
+"""Concurrency stress test for the purchase path.
+
+Creates a scratch section with --books books and --students students, then has
+--threads threads race to buy them all at once. Every book must end up sold
+exactly once; the run fails (exit code 1) on any double-sell or lost sale.
+
+Run from the frontend directory against a disposable database:
+
+    python -m benchmarks.purchase_stress --books 200 --students 50 --threads 16
+
+Everything created is deleted afterwards unless --keep is given.
+"""
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import db
+
+def setup(run_id, books, students):
+    """Create the scratch section, books and students; returns (section_id, book_ids, user_ids)"""
+    student_role = db.role_registry.get_by_name('Student')
+    conn = db.get_connection()
+    with db.get_cursor(conn) as cursor:
+        cursor.execute("SELECT COUNT(*) FROM purchase_settings WHERE allow_student_purchases")
+        if cursor.fetchone()[0] == 0:
+            raise SystemExit("Student purchases are disabled in purchase_settings")
+        cursor.execute("INSERT INTO sections (name, description) VALUES (%s, %s) RETURNING id",
+                       (f"stress-{run_id}", "Purchase stress test scratch section"))
+        section_id = cursor.fetchone()[0]
+        cursor.execute(
+            "INSERT INTO books (title, author, section_id, available) "
+            "SELECT 'Stress book ' || n, 'Stress author', %s, TRUE FROM generate_series(1, %s) n RETURNING id",
+            (section_id, books)
+        )
+        book_ids = [row[0] for row in cursor.fetchall()]
+        cursor.execute(
+            "INSERT INTO users (username, email, password_hash, role_id) "
+            "SELECT %s || n, %s || n || '@example.invalid', 'x', %s FROM generate_series(1, %s) n RETURNING id",
+            (f"stress-{run_id}-", f"stress-{run_id}-", student_role.id, students)
+        )
+        user_ids = [row[0] for row in cursor.fetchall()]
+    conn.commit()
+    db.release_connection()
+    return section_id, book_ids, user_ids
+
+def teardown(section_id, book_ids, user_ids):
+    conn = db.get_connection()
+    with db.get_cursor(conn) as cursor:
+        cursor.execute("DELETE FROM purchases WHERE book_id = ANY(%s)", (book_ids,))
+        cursor.execute("DELETE FROM books WHERE id = ANY(%s)", (book_ids,))
+        cursor.execute("DELETE FROM users WHERE id = ANY(%s)", (user_ids,))
+        cursor.execute("DELETE FROM sections WHERE id = %s", (section_id,))
+    conn.commit()
+    db.release_connection()
+
+def verify(book_ids):
+    """Count books sold more than once, and available books that have a purchase (or vice versa)"""
+    conn = db.get_connection()
+    with db.get_cursor(conn) as cursor:
+        cursor.execute("""
+        SELECT
+            COUNT(*) FILTER (WHERE sales > 1) AS double_sold,
+            COUNT(*) FILTER (WHERE sales = 1 AND available) AS sold_but_available,
+            COUNT(*) FILTER (WHERE sales = 0 AND NOT available) AS unavailable_unsold,
+            COUNT(*) FILTER (WHERE sales = 1) AS sold
+        FROM (
+            SELECT b.id, b.available, COUNT(p.id) AS sales
+            FROM books b LEFT JOIN purchases p ON p.book_id = b.id
+            WHERE b.id = ANY(%s)
+            GROUP BY b.id, b.available
+        ) per_book
+        """, (book_ids,))
+        row = dict(cursor.fetchone())
+    conn.rollback()
+    db.release_connection()
+    return row
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--books', type=int, default=200)
+    parser.add_argument('--students', type=int, default=50)
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--attempts', type=int, default=0, help='purchase attempts (default: 4 per book)')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--keep', action='store_true', help='keep the scratch data')
+    parser.add_argument('--json', dest='json_path', help='write results to this JSON file')
+    args = parser.parse_args(argv)
+
+    db.POOL_SETTINGS['maxconn'] = max(db.POOL_SETTINGS['maxconn'], args.threads + 1)
+    run_id = f"{int(time.time())}-{random.randint(0, 9999)}"
+    section_id, book_ids, user_ids = setup(run_id, args.books, args.students)
+
+    # Every book is targeted by several students, in a shuffled order, to force contention
+    rng = random.Random(args.seed)
+    attempts = [(rng.choice(user_ids), book_id) for book_id in book_ids
+                for _ in range(max(args.attempts // max(len(book_ids), 1), 4))]
+    rng.shuffle(attempts)
+
+    outcomes = {}
+    lock = threading.Lock()
+
+    def buy(attempt):
+        user_id, book_id = attempt
+        try:
+            success, message = db.purchase_book(user_id, book_id)
+        finally:
+            db.release_connection()
+        outcome = 'purchased' if success else message
+        with lock:
+            outcomes[outcome] = outcomes.get(outcome, 0) + 1
+        return success
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.threads) as executor:
+        successes = sum(executor.map(buy, attempts))
+    elapsed = time.perf_counter() - start
+
+    check = verify(book_ids)
+    ok = check['double_sold'] == 0 and check['sold_but_available'] == 0 and check['unavailable_unsold'] == 0 \
+        and check['sold'] == successes == len(book_ids)
+
+    result = {
+        'books': len(book_ids),
+        'attempts': len(attempts),
+        'threads': args.threads,
+        'successful_purchases': successes,
+        'elapsed': round(elapsed, 3),
+        'purchases_per_sec': round(successes / elapsed, 1),
+        'attempts_per_sec': round(len(attempts) / elapsed, 1),
+        'outcomes': outcomes,
+        'consistency': check,
+        'ok': ok
+    }
+    print(json.dumps(result, indent=2))
+    if args.json_path:
+        with open(args.json_path, 'w') as f:
+            json.dump(result, f, indent=2)
+
+    if not args.keep:
+        teardown(section_id, book_ids, user_ids)
+    return 0 if ok else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,507 @@
+"""Production-sized synthetic data, and EXPLAIN checks for the hot queries against it.
+
+Run from the frontend directory, against the database in db.DB_PARAMS (the
+same one migrate.py and the app use):
+
+    python -m benchmarks.scale_data generate                      # 1M books, 300 sections, 100k students
+    python -m benchmarks.scale_data generate --books 50000 --students 5000 --purchases 20000
+    python -m benchmarks.scale_data generate --reset              # empty books/sections/purchases first
+    python -m benchmarks.scale_data check-plans                   # exit 1 on a sequential scan of a large table
+
+`generate` is deterministic for a given --seed and sizes. The data is skewed
+the way a real catalog is: section sizes, author output and how many books
+each student buys all follow Zipf-like distributions. Every table is streamed
+in with one COPY, in one transaction, then vacuumed and analyzed so the planner
+sees realistic statistics; foreign keys, unique constraints and secondary
+indexes are dropped for the load and rebuilt in bulk afterwards. A book is a single copy (buying it marks it
+unavailable), so --purchases cannot exceed --books.
+
+`check-plans` signs in as a student and a librarian and drives every hot
+request path through the app (listings and deep pages, search, book detail,
+the student dashboard and purchase history, purchase and checkout, and
+book/section create, edit and delete, leaving the data as it was). Each
+distinct statement executed along the way is EXPLAINed with the parameters it
+actually ran with, and any sequential scan of a table with at least --min-rows
+rows is reported as a failure, unless ALLOWED_SEQ_SCANS explains why that
+scan is the right plan. Listings count their matches with
+BOOK_COUNT_MODE=estimated, the setting a catalog this size should run with,
+unless BOOK_COUNT_MODE is set explicitly. Substring search is only indexed when
+pg_trgm is installed (see migration 0003), so without it the search statements
+fail.
+"""
+import os
+import sys
+import json
+import time
+import random
+import logging
+import argparse
+import itertools
+from datetime import datetime, timedelta
+
+import psycopg2
+
+import db
+import migrate
+import passwords
+from query_stats import capture, normalize
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+WORDS = ['shadow', 'river', 'garden', 'empire', 'silent', 'winter', 'crystal', 'harbor', 'ancient', 'forest',
+         'machine', 'midnight', 'golden', 'broken', 'hidden', 'secret', 'storm', 'island', 'mountain', 'letters',
+         'kingdom', 'journey', 'mirror', 'summer', 'paper', 'ocean', 'fire', 'glass', 'stone', 'engine',
+         'theory', 'history', 'principles', 'introduction', 'modern', 'quantum', 'organic', 'digital', 'urban',
+         'economics', 'philosophy', 'language', 'systems', 'networks', 'biology', 'chemistry', 'art', 'music',
+         'war', 'peace', 'light', 'dark', 'city', 'road', 'house', 'night', 'morning', 'dream', 'memory', 'song']
+FIRST_NAMES = ['Ada', 'Ben', 'Chloe', 'David', 'Elena', 'Farid', 'Grace', 'Hiro', 'Ines', 'Jonas', 'Kemi', 'Liam',
+               'Maya', 'Noor', 'Oscar', 'Priya', 'Quentin', 'Rosa', 'Sven', 'Tara', 'Umar', 'Vera', 'Wei', 'Yara']
+SURNAMES = ['Adams', 'Baker', 'Chen', 'Diaz', 'Evans', 'Fischer', 'Garcia', 'Haddad', 'Ito', 'Jensen',
+            'Kowalski', 'Lopez', 'Moreau', 'Nakamura', 'Okafor', 'Patel', 'Quinn', 'Rossi', 'Singh', 'Tanaka',
+            'Ueda', 'Volkov', 'Wright', 'Xu', 'Young', 'Zimmerman']
+# (genre, weight)
+GENRES = [('Fiction', 30), ('Science', 14), ('History', 12), ('Computer Science', 10), ('Mathematics', 8),
+          ('Biography', 7), ('Philosophy', 5), ('Poetry', 4), ('Economics', 4), ('Art', 3), ('Law', 2),
+          ('Medicine', 1)]
+PRICES = ['4.99', '9.99', '9.99', '9.99', '14.99', '19.99', '29.99']
+
+USER_PREFIX = 'scale_'
+STUDENT_PASSWORD = 'scale-password'
+
+# Every generated timestamp falls in the five years before this, so runs are reproducible
+EPOCH = datetime(2026, 1, 1)
+SPAN_SECONDS = 5 * 365 * 24 * 3600
+
+# Characters per read() handed to COPY
+COPY_CHUNK = 1 << 20
+
+class RowStream:
+    """File-like view of an iterator of tab-separated text rows, for COPY ... FROM STDIN"""
+
+    def __init__(self, rows):
+        self._rows = iter(rows)
+        self._buffer = ''
+        self.count = 0
+
+    def read(self, size=-1):
+        parts = [self._buffer]
+        length = len(self._buffer)
+        for row in self._rows:
+            line = '\t'.join(row) + '\n'
+            parts.append(line)
+            length += len(line)
+            self.count += 1
+            if 0 <= size <= length:
+                break
+        data = ''.join(parts)
+        if size < 0:
+            self._buffer = ''
+            return data
+        self._buffer = data[size:]
+        return data[:size]
+
+def zipf_cum_weights(n, s=1.1):
+    """Cumulative Zipf weights for ranks 0..n-1, for random.choices(cum_weights=...)"""
+    return list(itertools.accumulate(1.0 / (rank + 1) ** s for rank in range(n)))
+
+def timestamp(seconds_before_epoch):
+    return (EPOCH - timedelta(seconds=seconds_before_epoch)).strftime('%Y-%m-%d %H:%M:%S')
+
+def _copy(cursor, table, columns, rows):
+    """COPY rows into a table; returns (row count, seconds)"""
+    stream = RowStream(rows)
+    start = time.perf_counter()
+    cursor.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN", stream, size=COPY_CHUNK)
+    elapsed = time.perf_counter() - start
+    logger.info(f"Loaded {stream.count} rows into {table} in {elapsed:.1f}s "
+                f"({stream.count / elapsed if elapsed else 0:,.0f} rows/s)")
+    return stream.count, elapsed
+
+def _next_id(cursor, table):
+    cursor.execute(f"SELECT COALESCE(MAX(id), 0) FROM {table}")
+    return cursor.fetchone()[0] + 1
+
+def _defer_indexes(cursor, tables):
+    """Drop the foreign keys, unique constraints and secondary indexes of `tables`.
+
+    Returns the statements that put them back. Building an index once over the
+    loaded rows, and checking a foreign key with one join, is several times
+    faster than maintaining them row by row during COPY. Primary keys stay.
+    """
+    cursor.execute("""
+    SELECT format('ALTER TABLE %%s DROP CONSTRAINT %%I', conrelid::regclass, conname),
+           format('ALTER TABLE %%s ADD CONSTRAINT %%I %%s', conrelid::regclass, conname, pg_get_constraintdef(oid))
+    FROM pg_constraint
+    WHERE conrelid = ANY(%s::regclass[]) AND contype IN ('f', 'u')
+    ORDER BY contype = 'u', conname
+    """, (list(tables),))
+    constraints = cursor.fetchall()
+    cursor.execute("""
+    SELECT format('DROP INDEX %%s', i.indexrelid::regclass), pg_get_indexdef(i.indexrelid),
+           format('COMMENT ON INDEX %%s IS %%L', i.indexrelid::regclass, obj_description(i.indexrelid, 'pg_class'))
+    FROM pg_index i
+    WHERE i.indrelid = ANY(%s::regclass[]) AND NOT i.indisprimary
+      AND NOT EXISTS (SELECT 1 FROM pg_constraint c WHERE c.conindid = i.indexrelid)
+    ORDER BY i.indexrelid
+    """, (list(tables),))
+    indexes = cursor.fetchall()
+
+    # Foreign keys go first and come back last, after the unique constraints they might rely on
+    for drop, _ in constraints:
+        cursor.execute(drop)
+    for drop, _, _ in indexes:
+        cursor.execute(drop)
+    restore = []
+    for _, create, comment in indexes:
+        restore.append(create)
+        if comment:
+            restore.append(comment)
+    restore.extend(add for _, add in reversed(constraints))
+    return restore
+
+def section_rows(first_id, count):
+    for n in range(count):
+        name = f"Scale {WORDS[n % len(WORDS)].title()} {n // len(WORDS) + 1:03d}"
+        yield (str(first_id + n), name, f"Generated section {n + 1} of {count}")
+
+def book_rows(rng, first_id, count, section_ids, sold):
+    """Books spread over sections and authors by Zipf weights; `sold` holds the offsets of unavailable books"""
+    section_choice = rng.choices(section_ids, cum_weights=zipf_cum_weights(len(section_ids)), k=count)
+    authors = [f"{rng.choice(FIRST_NAMES)} {rng.choice(SURNAMES)}-{n}" for n in range(max(1, count // 8))]
+    author_choice = rng.choices(authors, cum_weights=zipf_cum_weights(len(authors)), k=count)
+    genre_names = [genre for genre, _ in GENRES]
+    genre_choice = rng.choices(genre_names, weights=[weight for _, weight in GENRES], k=count)
+    for n in range(count):
+        words = rng.choices(WORDS, k=rng.randint(1, 4))
+        title = ' '.join(words).title()
+        if rng.random() < 0.7:
+            # Most titles are distinct; the rest repeat like reprints and common titles do
+            title = f"{title} {rng.randint(1, count)}"
+        created = timestamp(rng.randrange(SPAN_SECONDS))
+        yield (str(first_id + n), title, author_choice[n], f"979{n:010d}", genre_choice[n],
+               str(section_choice[n]), 'f' if n in sold else 't', created, created)
+
+def user_rows(first_id, role_id, kind, count, password_hash):
+    for n in range(1, count + 1):
+        username = f"{USER_PREFIX}{kind}_{n:06d}"
+        created = timestamp(SPAN_SECONDS * n // (count + 1))
+        yield (str(first_id + n - 1), username, f"{username}@example.com", password_hash, str(role_id),
+               created, created)
+
+def purchase_rows(rng, first_book_id, sold, student_ids):
+    """One purchase per sold book; a few heavy buyers account for most of them"""
+    buyers = rng.choices(student_ids, cum_weights=zipf_cum_weights(len(student_ids), s=0.5), k=len(sold))
+    for buyer, n in zip(buyers, sorted(sold)):
+        purchased = timestamp(rng.randrange(SPAN_SECONDS // 5))
+        yield (str(buyer), str(first_book_id + n), purchased, rng.choice(PRICES))
+
+def generate(books=1000000, sections=300, students=100000, librarians=20, purchases=600000, seed=42,
+             reset=False):
+    """Load a synthetic catalog into the configured database; returns {table: (rows, seconds)}"""
+    if purchases > books:
+        raise ValueError(f"--purchases ({purchases}) cannot exceed --books ({books}): each book is one copy")
+    if not students and purchases:
+        raise ValueError("Purchases need at least one student")
+
+    migrate.upgrade()
+    rng = random.Random(seed)
+    conn = db.get_connection()
+    loaded = {}
+    try:
+        with db.get_cursor(conn, cursor_factory=psycopg2.extensions.cursor) as cursor:
+            cursor.execute("SET LOCAL synchronous_commit TO OFF")
+            cursor.execute("SET LOCAL maintenance_work_mem TO '512MB'")
+            if reset:
+                cursor.execute("TRUNCATE purchases, books, sections RESTART IDENTITY")
+                cursor.execute("DELETE FROM users WHERE username LIKE %s", (f"{USER_PREFIX}%",))
+            else:
+                cursor.execute("SELECT 1 FROM users WHERE username LIKE %s LIMIT 1", (f"{USER_PREFIX}%",))
+                if cursor.fetchone():
+                    raise RuntimeError("Generated data is already loaded; pass --reset to replace it")
+
+            cursor.execute("SELECT name, id FROM roles")
+            role_ids = dict(cursor.fetchall())
+            # One hash for every account: hashing 100k passwords would dwarf the rest of the load
+            password_hash = passwords.hash_password(STUDENT_PASSWORD)
+
+            restore = _defer_indexes(cursor, ('sections', 'books', 'users', 'purchases'))
+
+            first_section = _next_id(cursor, 'sections')
+            section_ids = list(range(first_section, first_section + sections))
+            loaded['sections'] = _copy(cursor, 'sections', ('id', 'name', 'description'),
+                                       section_rows(first_section, sections))
+
+            first_book = _next_id(cursor, 'books')
+            sold = set(rng.sample(range(books), purchases))
+            loaded['books'] = _copy(
+                cursor, 'books',
+                ('id', 'title', 'author', 'isbn', 'genre', 'section_id', 'available', 'created_at', 'updated_at'),
+                book_rows(rng, first_book, books, section_ids, sold)
+            )
+
+            user_columns = ('id', 'username', 'email', 'password_hash', 'role_id', 'created_at', 'updated_at')
+            first_student = _next_id(cursor, 'users')
+            loaded['users'] = _copy(cursor, 'users', user_columns,
+                                    user_rows(first_student, role_ids['Student'], 'student', students, password_hash))
+            first_librarian = first_student + students
+            _copy(cursor, 'users', user_columns,
+                  user_rows(first_librarian, role_ids['Librarian'], 'librarian', librarians, password_hash))
+
+            student_ids = list(range(first_student, first_student + students))
+            loaded['purchases'] = _copy(cursor, 'purchases', ('user_id', 'book_id', 'purchase_date', 'price'),
+                                        purchase_rows(rng, first_book, sold, student_ids))
+
+            start = time.perf_counter()
+            for statement in restore:
+                cursor.execute(statement)
+            logger.info(f"Rebuilt {len(restore)} indexes and constraints in {time.perf_counter() - start:.1f}s")
+
+            for table in ('sections', 'books', 'users'):
+                cursor.execute(f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), "
+                               f"(SELECT COALESCE(MAX(id), 1) FROM {table}))")
+        conn.commit()
+
+        # Sets the visibility map too, so index-only scans are costed as they would be in production
+        conn.autocommit = True
+        try:
+            with db.get_cursor(conn) as cursor:
+                start = time.perf_counter()
+                cursor.execute("VACUUM (ANALYZE) sections, books, users, purchases")
+                logger.info(f"Vacuumed and analyzed in {time.perf_counter() - start:.1f}s")
+        finally:
+            conn.autocommit = False
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        db.release_connection()
+
+    # Listings, counts and user lookups all changed underneath their caches
+    from cache import invalidate_all_books, invalidate_sections, invalidate_section_counts, invalidate_users
+    invalidate_all_books()
+    invalidate_sections()
+    invalidate_section_counts()
+    invalidate_users()
+    return loaded
+
+# Plan checks
+
+EXPLAINABLE = ('SELECT', 'WITH', 'INSERT', 'UPDATE', 'DELETE')
+
+# (statement prefix, table, why a sequential scan is the right plan) for the scans that are expected
+ALLOWED_SEQ_SCANS = [
+    (
+        'SELECT s.id, s.name, s.description, s.created_at, s.updated_at, COUNT(b.id) AS book_count', 'books',
+        "Section._catalog counts every book per section, so it has to read them all; the result is cached "
+        "in catalog_cache and only recomputed after books are added, moved or deleted"
+    ),
+    (
+        'SELECT COUNT(*) FROM books b WHERE ?=?', 'books',
+        "An exact count of the whole catalog reads every book; it only runs with BOOK_COUNT_MODE=exact "
+        "(or below BOOK_EXACT_COUNT_THRESHOLD), and large catalogs should use estimated counts"
+    )
+]
+
+def allowed_reason(statement, table):
+    for prefix, allowed_table, reason in ALLOWED_SEQ_SCANS:
+        if table == allowed_table and statement.startswith(prefix):
+            return reason
+    return None
+
+def large_tables(cursor, min_rows):
+    """Names of the public tables the planner believes hold at least `min_rows` rows"""
+    cursor.execute("""
+    SELECT c.relname FROM pg_class c JOIN pg_namespace n ON n.oid = c.relnamespace
+    WHERE n.nspname = 'public' AND c.relkind = 'r' AND c.reltuples >= %s
+    """, (min_rows,))
+    return {row[0] for row in cursor.fetchall()}
+
+def seq_scans(plan, tables):
+    """(table, estimated rows) for every sequential scan of one of `tables` in an EXPLAIN (FORMAT JSON) plan"""
+    found = []
+    if plan.get('Node Type') == 'Seq Scan' and plan.get('Relation Name') in tables:
+        found.append((plan['Relation Name'], plan.get('Plan Rows')))
+    for child in plan.get('Plans', []):
+        found.extend(seq_scans(child, tables))
+    return found
+
+def _workload_ids():
+    """Ids and tokens that point the plan workload at realistic (large, deep, busy) data"""
+    rows = db.execute_query("""
+    SELECT
+        (SELECT section_id FROM books GROUP BY section_id ORDER BY COUNT(*) DESC LIMIT 1),
+        (SELECT id FROM books WHERE available ORDER BY id LIMIT 1),
+        (SELECT id FROM books WHERE NOT available ORDER BY id LIMIT 1),
+        (SELECT COUNT(*) FROM books)
+    """)
+    section_id, book_id, sold_id, total = rows[0]
+    if not total:
+        raise RuntimeError("The database has no books; run `python -m benchmarks.scale_data generate` first")
+    deep_page = max(1, total // 12 * 3 // 4)
+    row = db.execute_query("SELECT title, id FROM books ORDER BY title, id OFFSET %s LIMIT 1",
+                           (max(0, (deep_page - 1) * 12 - 1),))[0]
+    buyer = db.execute_query("""
+    SELECT u.username FROM purchases p JOIN users u ON u.id = p.user_id
+    WHERE u.username LIKE %s GROUP BY u.username ORDER BY COUNT(*) DESC LIMIT 1
+    """, (f"{USER_PREFIX}student_%",))
+    db.release_connection()
+    return {
+        'section': section_id,
+        'book': book_id,
+        'sold_book': sold_id or book_id,
+        'deep_page': deep_page,
+        'deep_cursor': db.encode_cursor('next', row['title'], row['id'], deep_page),
+        'student': buyer[0][0] if buyer else f"{USER_PREFIX}student_000001",
+        'librarian': f"{USER_PREFIX}librarian_000001"
+    }
+
+def run_workload(app):
+    """Drive the hot request paths; returns [(step, [(statement, parameters)])]"""
+    ids = _workload_ids()
+    steps = []
+
+    def step(client, label, method, path, data=None):
+        with capture() as statements:
+            response = client.open(path, method=method, data=data)
+        if response.status_code >= 500:
+            logger.warning(f"{label}: {method} {path} answered {response.status_code}")
+        steps.append((label, statements))
+        return response
+
+    student = app.test_client()
+    step(student, 'login', 'POST', '/auth/login', {'username': ids['student'], 'password': STUDENT_PASSWORD})
+    step(student, 'books first page', 'GET', '/books')
+    step(student, 'books deep page', 'GET', f"/books?page={ids['deep_page']}")
+    step(student, 'books deep cursor', 'GET', f"/books?cursor={ids['deep_cursor']}")
+    step(student, 'books in a section', 'GET', f"/books?section={ids['section']}")
+    step(student, 'books in a section, page 20', 'GET', f"/books?section={ids['section']}&page=20")
+    step(student, 'books search', 'GET', '/books?query=shadow')
+    step(student, 'books search in a section', 'GET', f"/books?query=river&section={ids['section']}")
+    step(student, 'type-ahead search', 'GET', '/search?query=gard')
+    step(student, 'book detail', 'GET', f"/books/{ids['book']}")
+    step(student, 'sections', 'GET', '/sections')
+    step(student, 'student dashboard', 'GET', '/student')
+    step(student, 'purchase history', 'GET', '/student/purchases')
+    # Both fail harmlessly on a book that is already sold, but run the same statements
+    step(student, 'purchase', 'POST', f"/books/{ids['sold_book']}/purchase")
+    step(student, 'checkout', 'POST', '/cart/checkout', {'book_ids': [ids['sold_book'], ids['book']]})
+
+    librarian = app.test_client()
+    step(librarian, 'librarian login', 'POST', '/auth/login',
+         {'username': ids['librarian'], 'password': STUDENT_PASSWORD})
+    name = f"Plan check {os.getpid()}"
+    step(librarian, 'create section', 'POST', '/sections/create', {'name': name, 'description': 'temporary'})
+    section = db.Section.get_by_name(name)
+    db.release_connection()
+    if section is None:
+        raise RuntimeError("Creating the plan-check section failed; is the librarian account loaded?")
+    book = {'title': name, 'author': 'Plan Check', 'isbn': f"PC{os.getpid()}", 'genre': 'Test',
+            'section_id': section.id, 'available': 'y'}
+    step(librarian, 'create book', 'POST', '/books/create', book)
+    created = db.execute_query("SELECT id FROM books WHERE isbn = %s", (book['isbn'],))
+    db.release_connection()
+    if created:
+        book_id = created[0][0]
+        step(librarian, 'edit book', 'POST', f"/books/{book_id}/edit", dict(book, title=f"{name} (edited)"))
+        step(librarian, 'delete book', 'POST', f"/books/{book_id}/delete")
+    step(librarian, 'edit section', 'POST', f"/sections/{section.id}/edit", {'name': name, 'description': 'edited'})
+    step(librarian, 'delete section', 'POST', f"/sections/{section.id}/delete")
+    return steps
+
+def check_plans(min_rows=10000):
+    """EXPLAIN every distinct statement the hot paths execute; returns (results, failures)"""
+    os.environ.setdefault('PURCHASE_SETTINGS_LISTEN', '0')
+    if 'BOOK_COUNT_MODE' not in os.environ:
+        db.PAGINATION_SETTINGS['count_mode'] = 'estimated'
+    from app import app
+    app.config.update(TESTING=True, WTF_CSRF_ENABLED=False)
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+
+    # One entry per statement shape, remembering every step that ran it
+    statements = {}
+    for label, executed in run_workload(app):
+        for sql, params in executed:
+            if isinstance(sql, bytes):
+                sql = sql.decode('utf-8')
+            shape = normalize(sql)
+            if not shape.upper().startswith(EXPLAINABLE):
+                continue
+            entry = statements.setdefault(shape, {'statement': shape, 'steps': [], 'sql': sql, 'params': params})
+            if label not in entry['steps']:
+                entry['steps'].append(label)
+
+    conn = db.get_connection()
+    results = []
+    failures = []
+    try:
+        with db.get_cursor(conn, cursor_factory=psycopg2.extensions.cursor) as cursor:
+            tables = large_tables(cursor, min_rows)
+            for entry in statements.values():
+                sql = cursor.mogrify(entry['sql'], entry['params']).decode('utf-8')
+                cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}")
+                plan = cursor.fetchone()[0][0]['Plan']
+                scans = [
+                    {'table': table, 'rows': rows, 'allowed': allowed_reason(entry['statement'], table)}
+                    for table, rows in seq_scans(plan, tables)
+                ]
+                result = {
+                    'statement': entry['statement'],
+                    'steps': entry['steps'],
+                    'cost': plan['Total Cost'],
+                    'seq_scans': scans
+                }
+                results.append(result)
+                if any(not scan['allowed'] for scan in scans):
+                    failures.append(result)
+        # EXPLAIN of INSERT/UPDATE/DELETE plans them without running them; nothing to keep
+        conn.rollback()
+    finally:
+        db.release_connection()
+    return results, failures
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    generate_parser = subparsers.add_parser('generate', help='load synthetic data at scale')
+    generate_parser.add_argument('--books', type=int, default=1000000, help='books (default: 1000000)')
+    generate_parser.add_argument('--sections', type=int, default=300, help='sections (default: 300)')
+    generate_parser.add_argument('--students', type=int, default=100000, help='students (default: 100000)')
+    generate_parser.add_argument('--librarians', type=int, default=20, help='librarians (default: 20)')
+    generate_parser.add_argument('--purchases', type=int, default=600000,
+                                 help='purchases, at most one per book (default: 600000)')
+    generate_parser.add_argument('--seed', type=int, default=42, help='random seed (default: 42)')
+    generate_parser.add_argument('--reset', action='store_true',
+                                 help='truncate books, sections and purchases and remove generated users first')
+    check_parser = subparsers.add_parser('check-plans', help='EXPLAIN the hot queries and fail on large seq scans')
+    check_parser.add_argument('--min-rows', type=int, default=10000,
+                              help='tables with at least this many rows count as large (default: 10000)')
+    check_parser.add_argument('--json', dest='json_path', help='write every statement and its verdict here')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(levelname)s %(message)s')
+    if args.command == 'generate':
+        start = time.perf_counter()
+        loaded = generate(args.books, args.sections, args.students, args.librarians, args.purchases, args.seed,
+                          args.reset)
+        total = sum(rows for rows, _ in loaded.values())
+        print(f"loaded {total:,} rows in {time.perf_counter() - start:.1f}s; "
+              f"sign in as {USER_PREFIX}student_000001 / {STUDENT_PASSWORD}")
+        return 0
+
+    results, failures = check_plans(args.min_rows)
+    for result in results:
+        verdict = 'SEQ SCAN' if result in failures else 'allowed' if result['seq_scans'] else 'ok'
+        print(f"{verdict:<9}{result['cost']:>12.1f}  {', '.join(result['steps'])}")
+        print(f"    {result['statement'][:160]}")
+        for scan in result['seq_scans']:
+            print(f"    sequential scan of {scan['table']} (~{scan['rows']} rows)"
+                  + (f"; allowed: {scan['allowed']}" if scan['allowed'] else ''))
+    print(f"\n{len(results)} statements checked, {len(failures)} with sequential scans of large tables")
+    if args.json_path:
+        with open(args.json_path, 'w') as f:
+            json.dump({'min_rows': args.min_rows, 'results': results}, f, indent=2)
+    return 1 if failures else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,248 @@
+import os
+import time
+import pickle
+import logging
+import threading
+from collections import OrderedDict
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Cache settings: an empty CACHE_URL keeps everything in-process, redis://... shares it across workers.
+# In-process caches are per worker, so other workers see a write only once their entries expire.
+# A TTL of 0 turns that cache off.
+CACHE_SETTINGS = {
+    'url': os.environ.get('CACHE_URL', ''),
+    'search_ttl': float(os.environ.get('SEARCH_CACHE_TTL', 60)),
+    'search_max_entries': int(os.environ.get('SEARCH_CACHE_SIZE', 1024)),
+    'catalog_ttl': float(os.environ.get('SECTION_CATALOG_TTL', 300)),
+    'user_ttl': float(os.environ.get('USER_CACHE_TTL', 30)),
+    'user_max_entries': int(os.environ.get('USER_CACHE_SIZE', 10000))
+}
+
+_MISSING = object()
+
+class LocalBackend:
+    """In-process LRU store with per-entry expiry"""
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()   # key -> (expires_at, value)
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return _MISSING
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return _MISSING
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get_counters(self, keys):
+        with self._lock:
+            return [self._counters.get(key, 0) for key in keys]
+
+    def incr(self, key):
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + 1
+            return self._counters[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+class RedisBackend:
+    """Store shared by every worker; eviction is left to Redis' maxmemory policy"""
+
+    def __init__(self, url):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("CACHE_URL points at Redis but the 'redis' package is not installed")
+        self._client = redis.Redis.from_url(url)
+
+    def get(self, key):
+        value = self._client.get(key)
+        if value is None:
+            return _MISSING
+        return pickle.loads(value)
+
+    def set(self, key, value, ttl):
+        self._client.set(key, pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL), ex=max(int(ttl), 1))
+
+    def get_counters(self, keys):
+        return [int(value or 0) for value in self._client.mget(keys)]
+
+    def incr(self, key):
+        return self._client.incr(key)
+
+    def clear(self):
+        pass
+
+    def __len__(self):
+        return 0
+
+def make_backend(max_entries):
+    """Build the backend selected by CACHE_URL"""
+    url = CACHE_SETTINGS['url']
+    if url.startswith('redis://') or url.startswith('rediss://'):
+        return RedisBackend(url)
+    if url:
+        logger.warning(f"Unsupported CACHE_URL scheme, using in-process cache: {url}")
+    return LocalBackend(max_entries=max_entries)
+
+class VersionedCache:
+    """Result cache invalidated by bumping generation numbers.
+
+    Every entry is stored under a key that embeds the current generation of
+    each scope it depends on (e.g. 'all' or 'section:3'). Writes bump the
+    generations of the scopes they touch, so stale entries are simply never
+    looked up again and age out through LRU/TTL.
+    """
+
+    def __init__(self, name, backend=None, ttl=60):
+        self.name = name
+        self.backend = backend
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.errors = 0
+
+    def _generation_keys(self, scopes):
+        return [f"{self.name}:gen:{scope}" for scope in scopes]
+
+    def get_or_load(self, key, scopes, loader):
+        """Return the cached value for `key`, calling `loader()` to fill it on a miss"""
+        if self.ttl <= 0:
+            return loader()
+        try:
+            generations = self.backend.get_counters(self._generation_keys(scopes))
+            cache_key = f"{self.name}:{key!r}:{generations}"
+            value = self.backend.get(cache_key)
+        except Exception as e:
+            # A cache outage should slow requests down, not break them
+            self.errors += 1
+            logger.error(f"Cache error in {self.name}: {e}")
+            return loader()
+
+        if value is not _MISSING:
+            self.hits += 1
+            return value
+
+        self.misses += 1
+        value = loader()
+        try:
+            self.backend.set(cache_key, value, self.ttl)
+        except Exception as e:
+            self.errors += 1
+            logger.error(f"Cache error in {self.name}: {e}")
+        return value
+
+    def generation(self, scopes):
+        """Sum of the scopes' generations: changes whenever any of them is invalidated (None on a cache error)"""
+        try:
+            return sum(self.backend.get_counters(self._generation_keys(scopes)))
+        except Exception as e:
+            self.errors += 1
+            logger.error(f"Cache error in {self.name}: {e}")
+            return None
+
+    def invalidate(self, *scopes):
+        """Bump the generation of each scope so dependent entries are no longer served"""
+        self.invalidations += 1
+        for generation_key in self._generation_keys(scopes):
+            try:
+                self.backend.incr(generation_key)
+            except Exception as e:
+                self.errors += 1
+                logger.error(f"Cache error in {self.name}: {e}")
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'name': self.name,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': (self.hits / lookups) if lookups else 0.0,
+            'invalidations': self.invalidations,
+            'errors': self.errors,
+            'entries': len(self.backend)
+        }
+
+# Book.search results, keyed on the search arguments
+search_cache = VersionedCache(
+    'book_search',
+    backend=make_backend(CACHE_SETTINGS['search_max_entries']),
+    ttl=CACHE_SETTINGS['search_ttl']
+)
+
+def search_scopes(section_id):
+    """Generation scopes a search result depends on"""
+    return ['books', f"section:{section_id}" if section_id else 'all']
+
+def invalidate_books(*section_ids):
+    """Invalidate cached searches affected by a write to books in the given sections"""
+    search_cache.invalidate('all', *{f"section:{section_id}" for section_id in section_ids if section_id})
+
+def invalidate_all_books():
+    """Invalidate every cached search, e.g. after a bulk load"""
+    search_cache.invalidate('books')
+
+# Every write to books bumps one of these, through invalidate_books or invalidate_all_books
+BOOK_GENERATION_SCOPES = ['books', 'all']
+
+def books_generation():
+    """A number that changes on every write to books; shared by all workers with a Redis backend"""
+    return search_cache.generation(BOOK_GENERATION_SCOPES)
+
+# Section list with per-section book counts, used by forms, filters and the sections page
+catalog_cache = VersionedCache(
+    'section_catalog',
+    backend=make_backend(16),
+    ttl=CACHE_SETTINGS['catalog_ttl']
+)
+
+CATALOG_SCOPES = ['sections', 'book_counts']
+
+def invalidate_sections():
+    """Invalidate the section catalog after a section is created, renamed or deleted"""
+    catalog_cache.invalidate('sections')
+
+def invalidate_section_counts():
+    """Invalidate per-section book counts after books are added, moved or removed"""
+    catalog_cache.invalidate('book_counts')
+
+# Users loaded by Flask-Login. Always in-process: entries hold password hashes and the TTL is short
+user_cache = VersionedCache(
+    'users',
+    backend=LocalBackend(max_entries=CACHE_SETTINGS['user_max_entries']),
+    ttl=CACHE_SETTINGS['user_ttl']
+)
+
+def user_scopes(user_id):
+    """Generation scopes a cached user depends on"""
+    return ['users', f"user:{user_id}"]
+
+def invalidate_user(user_id):
+    """Drop one cached user after it changes"""
+    user_cache.invalidate(f"user:{user_id}")
+
+def invalidate_users():
+    """Drop every cached user, e.g. after roles change"""
+    user_cache.invalidate('users')
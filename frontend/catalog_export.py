@@ -0,0 +1,137 @@
+"""Streaming catalog and purchase export as CSV or JSONL.
+
+Usage (from the frontend directory):
+
+    python catalog_export.py books -o books.csv
+    python catalog_export.py purchases --format jsonl --since 2026-09-01 --until 2026-10-01 > september.jsonl
+    python catalog_export.py books --section 3
+
+Rows are read through a server-side cursor and written as they arrive, so memory
+use stays flat however large the table is. Dates are YYYY-MM-DD; --until is exclusive.
+"""
+import io
+import sys
+import csv
+import json
+import argparse
+from datetime import datetime, date
+from decimal import Decimal
+
+import db
+
+# What each export selects, and the timestamp column its date range filters on
+EXPORTS = {
+    'books': {
+        'columns': ['id', 'title', 'author', 'isbn', 'genre', 'section_id', 'section', 'available',
+                    'created_at', 'updated_at'],
+        'query': """
+        SELECT b.id, b.title, b.author, b.isbn, b.genre, b.section_id, s.name, b.available,
+               b.created_at, b.updated_at
+        FROM books b
+        JOIN sections s ON b.section_id = s.id
+        """,
+        'date_column': 'b.created_at',
+        'order_by': 'b.id'
+    },
+    'purchases': {
+        'columns': ['id', 'purchase_date', 'user_id', 'username', 'book_id', 'title', 'isbn', 'section_id',
+                    'section', 'price', 'status'],
+        'query': """
+        SELECT p.id, p.purchase_date, p.user_id, u.username, p.book_id, b.title, b.isbn, b.section_id,
+               s.name, p.price, p.status
+        FROM purchases p
+        JOIN users u ON p.user_id = u.id
+        JOIN books b ON p.book_id = b.id
+        JOIN sections s ON b.section_id = s.id
+        """,
+        'date_column': 'p.purchase_date',
+        'order_by': 'p.purchase_date, p.id'
+    }
+}
+
+FORMATS = {
+    'csv': 'text/csv',
+    'jsonl': 'application/x-ndjson'
+}
+
+def parse_date(value):
+    """Parse a YYYY-MM-DD filter value, or return None for an empty one"""
+    if not value:
+        return None
+    return datetime.strptime(value, '%Y-%m-%d')
+
+def export_rows(kind, section_id=None, since=None, until=None, itersize=2000):
+    """Yield export rows (tuples in EXPORTS[kind]['columns'] order) matching the filters"""
+    export = EXPORTS[kind]
+    where_clauses = []
+    params = []
+
+    if section_id:
+        where_clauses.append("b.section_id = %s")
+        params.append(section_id)
+    if since:
+        where_clauses.append(f"{export['date_column']} >= %s")
+        params.append(since)
+    if until:
+        where_clauses.append(f"{export['date_column']} < %s")
+        params.append(until)
+
+    where_clause = " AND ".join(where_clauses) if where_clauses else "1=1"
+    query = f"{export['query']} WHERE {where_clause} ORDER BY {export['order_by']}"
+    return db.stream_query(query, params, itersize=itersize)
+
+def _json_value(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+def format_csv(columns, rows):
+    """Yield CSV text chunks: a header, then one line per row"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    yield buffer.getvalue()
+    for row in rows:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerow(row)
+        yield buffer.getvalue()
+
+def format_jsonl(columns, rows):
+    """Yield one JSON object per line"""
+    for row in rows:
+        yield json.dumps({column: _json_value(value) for column, value in zip(columns, row)}) + '\n'
+
+def export(kind, fmt='csv', section_id=None, since=None, until=None):
+    """Yield the formatted export of `kind` ('books' or 'purchases') as text chunks"""
+    if kind not in EXPORTS:
+        raise ValueError(f"Unknown export: {kind}")
+    if fmt not in FORMATS:
+        raise ValueError(f"Unsupported export format: {fmt}")
+    rows = export_rows(kind, section_id=section_id, since=since, until=until)
+    formatter = format_csv if fmt == 'csv' else format_jsonl
+    return formatter(EXPORTS[kind]['columns'], rows)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('kind', choices=sorted(EXPORTS), help='what to export')
+    parser.add_argument('--format', choices=sorted(FORMATS), default='csv', help='output format (default: csv)')
+    parser.add_argument('--section', type=int, help='only books in this section id')
+    parser.add_argument('--since', type=parse_date, help='from this date (inclusive)')
+    parser.add_argument('--until', type=parse_date, help='up to this date (exclusive)')
+    parser.add_argument('-o', '--output', help='output file (default: stdout)')
+    args = parser.parse_args(argv)
+
+    out = open(args.output, 'w', newline='', encoding='utf-8') if args.output else sys.stdout
+    try:
+        for chunk in export(args.kind, args.format, args.section, args.since, args.until):
+            out.write(chunk)
+    finally:
+        if args.output:
+            out.close()
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
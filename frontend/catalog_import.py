@@ -0,0 +1,356 @@
+"""Bulk catalog import: stream CSV or JSONL into `books` with COPY.
+
+Usage (from the frontend directory):
+
+    python catalog_import.py catalog.csv
+    python catalog_import.py catalog.jsonl --batch-size 10000 --create-sections --rejects rejects.csv
+
+Each input row needs `title` and `author`, and either `section` (a section name)
+or `section_id`; `isbn`, `genre` and `available` are optional. Rows whose ISBN
+already exists update that book instead of adding a duplicate; its availability
+only changes if the row gives one, so re-importing a catalog never puts sold
+books back on sale. Invalid rows are reported and skipped without stopping the
+load, including rows the database rejects.
+"""
+import io
+import sys
+import csv
+import json
+import time
+import logging
+import argparse
+
+import psycopg2
+
+import db
+import search_index
+from cache import invalidate_all_books, invalidate_sections, invalidate_section_counts
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+IMPORT_COLUMNS = ('title', 'author', 'isbn', 'genre', 'section_id', 'available')
+
+# Column limits from the books table
+FIELD_LIMITS = {'title': 256, 'author': 128, 'isbn': 20, 'genre': 64}
+
+TRUE_VALUES = {'1', 'true', 't', 'yes', 'y'}
+FALSE_VALUES = {'0', 'false', 'f', 'no', 'n'}
+
+class ImportResult:
+    """Counters and rejected rows for one import run"""
+
+    def __init__(self, max_rejects_kept=1000):
+        self.rows = 0
+        self.inserted = 0
+        self.updated = 0
+        self.rejected = 0
+        self.rejects = []   # (line number, reason), capped at max_rejects_kept
+        self.max_rejects_kept = max_rejects_kept
+        self.started_at = time.monotonic()
+
+    def reject(self, line, reason):
+        self.rejected += 1
+        if len(self.rejects) < self.max_rejects_kept:
+            self.rejects.append((line, reason))
+
+    @property
+    def elapsed(self):
+        return time.monotonic() - self.started_at
+
+    @property
+    def rows_per_sec(self):
+        return self.rows / self.elapsed if self.elapsed else 0.0
+
+    def as_dict(self):
+        return {
+            'rows': self.rows,
+            'inserted': self.inserted,
+            'updated': self.updated,
+            'rejected': self.rejected,
+            'elapsed': round(self.elapsed, 3),
+            'rows_per_sec': round(self.rows_per_sec, 1),
+            'rejects': self.rejects
+        }
+
+def read_rows(f, fmt):
+    """Yield (line number, dict) pairs from a CSV or JSONL file object"""
+    if fmt == 'csv':
+        reader = csv.DictReader(f)
+        for row in reader:
+            yield reader.line_num, row
+    elif fmt == 'jsonl':
+        for line_num, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as e:
+                yield line_num, e
+                continue
+            yield line_num, row if isinstance(row, dict) else ValueError("expected a JSON object")
+    else:
+        raise ValueError(f"Unsupported import format: {fmt}")
+
+class SectionResolver:
+    """Map section names to ids, optionally creating missing sections"""
+
+    def __init__(self, create_missing=False):
+        self.create_missing = create_missing
+        self.created = 0
+        self._ids = {name.lower(): section_id for section_id, name in db.Section.choices()}
+        self._known_ids = set(self._ids.values())
+
+    def resolve(self, row):
+        section_id = row.get('section_id')
+        if section_id not in (None, ''):
+            try:
+                section_id = int(section_id)
+            except (TypeError, ValueError):
+                raise ValueError(f"invalid section_id {section_id!r}")
+            if section_id not in self._known_ids:
+                raise ValueError(f"unknown section_id {section_id}")
+            return section_id
+
+        name = (row.get('section') or '').strip()
+        if not name:
+            raise ValueError("missing section")
+        section_id = self._ids.get(name.lower())
+        if section_id is None:
+            if not self.create_missing:
+                raise ValueError(f"unknown section {name!r}")
+            section_id = self._create(name)
+        return section_id
+
+    def _create(self, name):
+        query = """
+        INSERT INTO sections (name) VALUES (%s)
+        ON CONFLICT (name) DO UPDATE SET name = EXCLUDED.name
+        RETURNING id
+        """
+        section_id = db.execute_query(query, (name[:64],), commit=True)[0]['id']
+        self._ids[name.lower()] = section_id
+        self._known_ids.add(section_id)
+        self.created += 1
+        logger.info(f"Created section {name!r} (id: {section_id})")
+        return section_id
+
+def clean_row(row, sections):
+    """Validate one input row and return the tuple to load, or raise ValueError"""
+    values = {}
+    for field in ('title', 'author', 'isbn', 'genre'):
+        value = row.get(field)
+        value = str(value).strip() if value is not None else ''
+        if len(value) > FIELD_LIMITS[field]:
+            raise ValueError(f"{field} longer than {FIELD_LIMITS[field]} characters")
+        values[field] = value or None
+    if not values['title']:
+        raise ValueError("missing title")
+    if not values['author']:
+        raise ValueError("missing author")
+
+    # None when the row does not say: new books default to available, existing ones keep their state
+    available = row.get('available')
+    if isinstance(available, str):
+        text = available.strip().lower()
+        if text in TRUE_VALUES:
+            available = True
+        elif text in FALSE_VALUES:
+            available = False
+        elif text == '':
+            available = None
+        else:
+            raise ValueError(f"invalid available value {available!r}")
+
+    values['section_id'] = sections.resolve(row)
+    values['available'] = bool(available) if available is not None else None
+    return tuple(values[column] for column in IMPORT_COLUMNS)
+
+def _copy_batch(conn, batch):
+    """COPY one batch into a staging table and upsert it into books; returns (inserted, updated).
+
+    Runs in the caller's transaction, which commits it.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for values in batch:
+        writer.writerow(['\\N' if value is None else value for value in values])
+    buffer.seek(0)
+
+    inserted = updated = 0
+    with db.get_cursor(conn) as cursor:
+        cursor.execute("""
+        CREATE TEMP TABLE IF NOT EXISTS books_import_stage (
+            title VARCHAR(256),
+            author VARCHAR(128),
+            isbn VARCHAR(20),
+            genre VARCHAR(64),
+            section_id INTEGER,
+            available BOOLEAN
+        ) ON COMMIT DELETE ROWS
+        """)
+        # A retried batch shares its transaction with the rows already loaded
+        cursor.execute("TRUNCATE books_import_stage")
+        cursor.copy_expert(
+            f"COPY books_import_stage ({', '.join(IMPORT_COLUMNS)}) FROM STDIN WITH (FORMAT csv, NULL '\\N')",
+            buffer
+        )
+        # Rows without an availability keep an existing book's; xmax = 0 only for freshly inserted rows
+        for given in (True, False):
+            set_available = "available = EXCLUDED.available," if given else ""
+            cursor.execute(f"""
+            WITH upserted AS (
+                INSERT INTO books ({', '.join(IMPORT_COLUMNS)})
+                SELECT title, author, isbn, genre, section_id, COALESCE(available, TRUE)
+                FROM books_import_stage
+                WHERE (available IS NOT NULL) = %s
+                ON CONFLICT (isbn) DO UPDATE
+                SET title = EXCLUDED.title, author = EXCLUDED.author, genre = EXCLUDED.genre,
+                    section_id = EXCLUDED.section_id, {set_available}
+                    updated_at = CURRENT_TIMESTAMP
+                RETURNING (xmax = 0) AS inserted
+            )
+            SELECT COUNT(*) FILTER (WHERE inserted), COUNT(*) FILTER (WHERE NOT inserted) FROM upserted
+            """, (given,))
+            batch_inserted, batch_updated = cursor.fetchone()
+            inserted += batch_inserted
+            updated += batch_updated
+    return inserted, updated
+
+def _load_rows(conn, rows, reject):
+    """Load [(line, values)] under a savepoint, bisecting a failed load until only the rows the
+    database rejects are left out; returns (inserted, updated)"""
+    with db.get_cursor(conn) as cursor:
+        cursor.execute("SAVEPOINT import_rows")
+        try:
+            inserted, updated = _copy_batch(conn, [values for _, values in rows])
+        except psycopg2.Error as e:
+            if conn.closed:
+                raise
+            cursor.execute("ROLLBACK TO SAVEPOINT import_rows")
+            if len(rows) == 1:
+                reject(rows[0][0], str(e).strip().splitlines()[0])
+                return 0, 0
+            middle = len(rows) // 2
+            first = _load_rows(conn, rows[:middle], reject)
+            second = _load_rows(conn, rows[middle:], reject)
+            return first[0] + second[0], first[1] + second[1]
+        cursor.execute("RELEASE SAVEPOINT import_rows")
+    return inserted, updated
+
+def import_books(f, fmt='csv', batch_size=5000, create_sections=False, on_progress=None, on_reject=None):
+    """Stream books from an open CSV/JSONL file into the catalog.
+
+    Rows are loaded in batches of `batch_size`, each in its own transaction; a
+    batch the database refuses is split until only the offending rows are rejected.
+    Duplicate ISBNs update the existing book (within a batch the last row wins).
+    `on_progress(result)` is called after every batch and `on_reject(line, reason)`
+    for every skipped row. Returns an ImportResult.
+    """
+    result = ImportResult()
+    sections = SectionResolver(create_missing=create_sections)
+    conn = db.get_connection()
+
+    def reject(line, reason):
+        result.reject(line, reason)
+        if on_reject:
+            on_reject(line, reason)
+
+    def flush(pending):
+        # ON CONFLICT cannot touch the same row twice in one statement, so dedupe ISBNs first
+        by_isbn = {}
+        batch = []
+        for line, values in pending:
+            isbn = values[IMPORT_COLUMNS.index('isbn')]
+            if isbn is None:
+                batch.append((line, values))
+            else:
+                if isbn in by_isbn:
+                    reject(by_isbn[isbn][0], f"superseded by line {line} with the same ISBN")
+                by_isbn[isbn] = (line, values)
+        batch.extend(by_isbn.values())
+        try:
+            inserted, updated = _load_rows(conn, batch, reject)
+            conn.commit()
+            result.inserted += inserted
+            result.updated += updated
+        except Exception as e:
+            conn.rollback()
+            logger.error(f"Import batch ending at line {pending[-1][0]} failed: {e}")
+            for line, _ in pending:
+                reject(line, f"batch failed: {e}")
+        if on_progress:
+            on_progress(result)
+
+    pending = []
+    try:
+        for line, row in read_rows(f, fmt):
+            result.rows += 1
+            if isinstance(row, Exception):
+                reject(line, str(row))
+                continue
+            try:
+                pending.append((line, clean_row(row, sections)))
+            except ValueError as e:
+                reject(line, str(e))
+                continue
+            if len(pending) >= batch_size:
+                flush(pending)
+                pending = []
+        if pending:
+            flush(pending)
+    finally:
+        # Listings, counts and the type-ahead index all changed underneath their caches
+        invalidate_all_books()
+        invalidate_section_counts()
+        if sections.created:
+            invalidate_sections()
+        search_index.refresh_in_background()
+
+    logger.info(f"Import finished: {result.inserted} inserted, {result.updated} updated, "
+                f"{result.rejected} rejected in {result.elapsed:.1f}s")
+    return result
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('path', help="CSV or JSONL file, or '-' for stdin")
+    parser.add_argument('--format', choices=['csv', 'jsonl'], help='input format (default: from the file extension)')
+    parser.add_argument('--batch-size', type=int, default=5000, help='rows per COPY batch (default: 5000)')
+    parser.add_argument('--create-sections', action='store_true', help='create sections that do not exist yet')
+    parser.add_argument('--rejects', help='write rejected rows (line, reason) to this CSV file')
+    args = parser.parse_args(argv)
+
+    fmt = args.format or ('jsonl' if args.path.endswith(('.jsonl', '.ndjson')) else 'csv')
+
+    rejects_file = open(args.rejects, 'w', newline='') if args.rejects else None
+    rejects_writer = csv.writer(rejects_file) if rejects_file else None
+    if rejects_writer:
+        rejects_writer.writerow(['line', 'reason'])
+
+    def on_progress(result):
+        print(f"\r{result.rows} rows read, {result.inserted} inserted, {result.updated} updated, "
+              f"{result.rejected} rejected ({result.rows_per_sec:.0f} rows/s)", end='', file=sys.stderr, flush=True)
+
+    def on_reject(line, reason):
+        if rejects_writer:
+            rejects_writer.writerow([line, reason])
+
+    try:
+        if args.path == '-':
+            result = import_books(sys.stdin, fmt, args.batch_size, args.create_sections, on_progress, on_reject)
+        else:
+            with open(args.path, newline='', encoding='utf-8') as f:
+                result = import_books(f, fmt, args.batch_size, args.create_sections, on_progress, on_reject)
+    finally:
+        if rejects_file:
+            rejects_file.close()
+        db.release_connection()
+
+    print(file=sys.stderr)
+    summary = result.as_dict()
+    summary['rejects'] = summary['rejects'][:20]
+    print(json.dumps(summary, indent=2, default=str))
+    return 0 if not result.rejected else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
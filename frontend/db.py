@@ -1,11 +1,29 @@
 import os
+import base64
+import json
 import psycopg2
 import psycopg2.extras
 import logging
+import operator
+import re
+import threading
+import time
+import uuid
 from datetime import datetime
-from werkzeug.security import generate_password_hash, check_password_hash
+from functools import lru_cache
+from contextlib import contextmanager
+from flask import g, has_app_context, has_request_context, session
 from flask_login import UserMixin
 from dotenv import load_dotenv
+from search_index import book_index
+from purchase_settings import purchase_settings
+from replicas import replica_set, REPLICA_SETTINGS
+import passwords
+import query_stats
+from query_stats import instrumented
+from cache import (search_cache, search_scopes, invalidate_books, catalog_cache, CATALOG_SCOPES,
+                   invalidate_sections, invalidate_section_counts, user_cache, user_scopes, invalidate_users,
+                   invalidate_user)
 load_dotenv()
 
 # Configure logging
@@ -21,249 +39,849 @@ DB_PARAMS = {
     'port': '5432'
 }
 
-# Connection pool
-_conn = None
+# Connection pool settings
+POOL_SETTINGS = {
+    'minconn': int(os.environ.get('DB_POOL_MIN', 1)),
+    'maxconn': int(os.environ.get('DB_POOL_MAX', 10)),
+    'timeout': float(os.environ.get('DB_POOL_TIMEOUT', 30)),      # seconds to wait for a free connection
+    'recycle': float(os.environ.get('DB_POOL_RECYCLE', 1800)),    # max connection age in seconds
+    'health_check': float(os.environ.get('DB_POOL_HEALTH_CHECK', 30))  # ping connections idle longer than this
+}
 
-def get_connection():
-    """Get a database connection from the pool"""
-    global _conn
-    if _conn is None or _conn.closed:
+# Book search settings: 'fulltext' uses the indexed tsvector/trigram search, 'ilike' the plain scan
+SEARCH_SETTINGS = {
+    'engine': os.environ.get('SEARCH_ENGINE', 'fulltext'),
+    'ts_config': os.environ.get('SEARCH_TS_CONFIG', 'english')
+}
+
+# Listing pagination: 'exact' counts with COUNT(*), 'estimated' reads the planner's row estimate
+PAGINATION_SETTINGS = {
+    'count_mode': os.environ.get('BOOK_COUNT_MODE', 'exact'),
+    'exact_count_threshold': int(os.environ.get('BOOK_EXACT_COUNT_THRESHOLD', 1000))
+}
+
+def _connect():
+    """Open a new raw connection to PostgreSQL"""
+    try:
+        logger.info(f"Connecting to PostgreSQL database on {DB_PARAMS['host']}:{DB_PARAMS['port']}")
+        # Log connection parameters for debugging (mask password for security)
+        debug_params = dict(DB_PARAMS)
+        debug_params['password'] = '***' if debug_params['password'] else 'empty'
+        logger.debug(f"Connection parameters: {debug_params}")
+        
+        conn = psycopg2.connect(**DB_PARAMS)
+        logger.info("Database connection established successfully")
+        return conn
+    except psycopg2.OperationalError as e:
+        logger.error(f"Could not connect to the PostgreSQL database: {e}")
+        logger.info("Please ensure PostgreSQL is running and the connection parameters are correct")
+        logger.info(f"Current connection parameters (host:port): {DB_PARAMS['host']}:{DB_PARAMS['port']}")
+        
+        # Try alternate connection method with connection string
         try:
-            logger.info(f"Connecting to PostgreSQL database on {DB_PARAMS['host']}:{DB_PARAMS['port']}")
-            # Log connection parameters for debugging (mask password for security)
-            debug_params = dict(DB_PARAMS)
-            debug_params['password'] = '***' if debug_params['password'] else 'empty'
-            logger.debug(f"Connection parameters: {debug_params}")
-            
-            _conn = psycopg2.connect(**DB_PARAMS)
-            logger.info("Database connection established successfully")
-        except psycopg2.OperationalError as e:
-            logger.error(f"Could not connect to the PostgreSQL database: {e}")
-            logger.info("Please ensure PostgreSQL is running and the connection parameters are correct")
-            logger.info(f"Current connection parameters (host:port): {DB_PARAMS['host']}:{DB_PARAMS['port']}")
+            logger.info("Attempting alternate connection method...")
+            conn_string = f"dbname='{DB_PARAMS['dbname']}' user='{DB_PARAMS['user']}' password='{DB_PARAMS['password']}' host='{DB_PARAMS['host']}' port='{DB_PARAMS['port']}'"
+            conn = psycopg2.connect(conn_string)
+            logger.info("Alternative connection method successful")
+            return conn
+        except Exception as alt_e:
+            logger.error(f"Alternative connection method failed: {alt_e}")
+        
+        raise
+
+class PoolTimeout(psycopg2.OperationalError):
+    """Raised when no pooled connection becomes free in time"""
+
+class ConnectionPool:
+    """Thread-safe pool of psycopg2 connections with health checks and recycling"""
+    
+    def __init__(self, minconn=1, maxconn=10, timeout=30, recycle=1800, health_check=30, connect=None):
+        if minconn < 0 or maxconn < 1 or minconn > maxconn:
+            raise ValueError(f"Invalid pool size: min={minconn}, max={maxconn}")
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.recycle = recycle
+        self.health_check = health_check
+        self._connect = connect or _connect
+        self._reset()
+    
+    def _reset(self):
+        """(Re)initialize pool state for the current process"""
+        self._pid = os.getpid()
+        self._lock = threading.Condition()
+        self._idle = []        # list of (conn, created_at, returned_at)
+        self._created = {}     # id(conn) -> created_at for every open connection
+        self._in_use = 0
+        self._stats = {
+            'checkouts': 0,
+            'waits': 0,
+            'wait_time_total': 0.0,
+            'wait_time_max': 0.0,
+            'timeouts': 0,
+            'recycled': 0,
+            'failed_health_checks': 0
+        }
+    
+    def _check_fork(self):
+        """Drop connections inherited from a parent process"""
+        if self._pid != os.getpid():
+            logger.info(f"Process fork detected (pid {self._pid} -> {os.getpid()}), reinitializing connection pool")
+            # Never close inherited sockets from the child; the parent still owns them
+            self._reset()
+    
+    @property
+    def size(self):
+        return len(self._created)
+    
+    def _discard(self, conn):
+        """Close a connection and forget about it (lock must be held)"""
+        self._created.pop(id(conn), None)
+        try:
+            if not conn.closed:
+                conn.close()
+        except Exception as e:
+            logger.debug(f"Error closing pooled connection: {e}")
+    
+    def _is_reusable(self, conn, created_at):
+        """Whether an idle connection is still open and young enough to hand out (lock must be held)"""
+        if conn.closed:
+            return False
+        if self.recycle and time.monotonic() - created_at > self.recycle:
+            self._stats['recycled'] += 1
+            return False
+        return True
+    
+    def _needs_ping(self, returned_at):
+        return self.health_check is not None and time.monotonic() - returned_at > self.health_check
+    
+    def _ping(self, conn):
+        """Check a connection that sat idle; runs without the lock, since a half-open
+        connection can take as long as the TCP timeout to answer"""
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except Exception as e:
+            logger.warning(f"Pooled connection failed health check: {e}")
+            return False
+    
+    def getconn(self):
+        """Check out a connection, waiting up to `timeout` seconds for one to free up"""
+        self._check_fork()
+        start = time.monotonic()
+        waited = False
+        while True:
+            conn = None
+            with self._lock:
+                while True:
+                    if self._idle:
+                        conn, created_at, returned_at = self._idle.pop()
+                        if not self._is_reusable(conn, created_at):
+                            self._discard(conn)
+                            conn = None
+                            continue
+                        if not self._needs_ping(returned_at):
+                            return self._checked_out(conn, start, waited)
+                        # Still counted in the pool size while it is pinged, so no one else can take its slot
+                        break
+                    
+                    if self.size < self.maxconn:
+                        # Reserve the slot before connecting so other threads see it
+                        placeholder = object()
+                        self._created[id(placeholder)] = None
+                        break
+                    
+                    remaining = self.timeout - (time.monotonic() - start)
+                    if remaining <= 0:
+                        self._stats['timeouts'] += 1
+                        raise PoolTimeout(f"Timed out after {self.timeout}s waiting for a database connection "
+                                          f"(pool size {self.maxconn})")
+                    waited = True
+                    self._lock.wait(remaining)
             
-            # Try alternate connection method with connection string
+            if conn is None:
+                break
+            healthy = self._ping(conn)
+            if not healthy:
+                try:
+                    conn.close()
+                except Exception as e:
+                    logger.debug(f"Error closing pooled connection: {e}")
+            with self._lock:
+                if healthy:
+                    return self._checked_out(conn, start, waited)
+                self._stats['failed_health_checks'] += 1
+                self._created.pop(id(conn), None)
+                self._lock.notify()
+        
+        try:
+            conn = self._connect()
+        except Exception:
+            with self._lock:
+                self._created.pop(id(placeholder), None)
+                self._lock.notify()
+            raise
+        
+        with self._lock:
+            self._created.pop(id(placeholder), None)
+            self._created[id(conn)] = time.monotonic()
+            return self._checked_out(conn, start, waited)
+    
+    def _checked_out(self, conn, start, waited):
+        """Record checkout statistics (lock must be held)"""
+        wait_time = time.monotonic() - start
+        self._in_use += 1
+        self._stats['checkouts'] += 1
+        if waited:
+            self._stats['waits'] += 1
+        self._stats['wait_time_total'] += wait_time
+        self._stats['wait_time_max'] = max(self._stats['wait_time_max'], wait_time)
+        return conn
+    
+    def putconn(self, conn, close=False):
+        """Return a connection to the pool, rolling back any open transaction"""
+        if self._pid != os.getpid():
+            # Connection belongs to a pool from before a fork; just drop it
+            return
+        
+        if not close and not conn.closed:
             try:
-                logger.info("Attempting alternate connection method...")
-                conn_string = f"dbname='{DB_PARAMS['dbname']}' user='{DB_PARAMS['user']}' password='{DB_PARAMS['password']}' host='{DB_PARAMS['host']}' port='{DB_PARAMS['port']}'"
-                _conn = psycopg2.connect(conn_string)
-                logger.info("Alternative connection method successful")
-                return _conn
-            except Exception as alt_e:
-                logger.error(f"Alternative connection method failed: {alt_e}")
-            
+                if conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+            except Exception as e:
+                logger.warning(f"Discarding connection that failed to reset: {e}")
+                close = True
+        
+        with self._lock:
+            if id(conn) not in self._created:
+                return
+            self._in_use -= 1
+            created_at = self._created[id(conn)]
+            if close or conn.closed or len(self._idle) >= self.maxconn:
+                self._discard(conn)
+            else:
+                self._idle.append((conn, created_at, time.monotonic()))
+            self._lock.notify()
+    
+    def fill(self):
+        """Open connections until the pool holds at least `minconn`"""
+        self._check_fork()
+        while True:
+            with self._lock:
+                if self.size >= self.minconn:
+                    return
+            conn = self._connect()
+            with self._lock:
+                now = time.monotonic()
+                self._created[id(conn)] = now
+                self._idle.append((conn, now, now))
+                self._lock.notify()
+    
+    def closeall(self):
+        """Close every idle connection and forget checked-out ones"""
+        with self._lock:
+            for conn, _, _ in self._idle:
+                self._discard(conn)
+            self._idle = []
+    
+    def stats(self):
+        """Snapshot of pool usage and wait time, for sizing the pool"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats.update({
+                'size': self.size,
+                'in_use': self._in_use,
+                'idle': len(self._idle),
+                'minconn': self.minconn,
+                'maxconn': self.maxconn,
+                'wait_time_avg': (stats['wait_time_total'] / stats['checkouts']) if stats['checkouts'] else 0.0
+            })
+            return stats
+
+_pool = None
+_pool_lock = threading.Lock()
+_local = threading.local()
+
+def get_pool():
+    """Get the process-wide connection pool, creating it on first use"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(**POOL_SETTINGS)
+                _pool.fill()
+    return _pool
+
+def _after_fork_in_child():
+    """Forget connections inherited from the parent process"""
+    global _local
+    _local = threading.local()
+    if _pool is not None:
+        _pool._check_fork()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
+
+def _binding():
+    """Where the current unit of work keeps its connection: flask.g inside a request, else the thread"""
+    if has_app_context():
+        return g
+    return _local
+
+def get_connection():
+    """Get the primary database connection checked out for the current request or thread.
+    
+    Writes must come through here: using the primary marks the unit of work as a
+    writer, so its later reads stay on the primary too (see get_read_connection).
+    """
+    binding = _binding()
+    binding._db_wrote = True
+    return _primary_connection(binding)
+
+def _primary_connection(binding):
+    conn = getattr(binding, '_db_conn', None)
+    if conn is None or conn.closed:
+        if conn is not None:
+            get_pool().putconn(conn, close=True)
+        start = time.perf_counter()
+        conn = get_pool().getconn()
+        query_stats.query_stats.record_pool_wait(time.perf_counter() - start)
+        binding._db_conn = conn
+    return conn
+
+_READ_ONLY_RE = re.compile(r'^\s*(SELECT|WITH|EXPLAIN|SHOW|VALUES|TABLE)\b', re.IGNORECASE)
+_WRITE_RE = re.compile(
+    r'\b(INSERT|UPDATE|DELETE|MERGE|INTO|nextval|setval|pg_notify|pg_(try_)?advisory\w*|FOR\s+(NO\s+KEY\s+|KEY\s+)?SHARE)\b',
+    re.IGNORECASE
+)
+
+@lru_cache(maxsize=1024)
+def is_read_only(query):
+    """Whether a statement only reads, so a replica may answer it; errs towards the primary"""
+    return bool(_READ_ONLY_RE.match(query)) and not _WRITE_RE.search(query)
+
+# Session key holding the time until which the session reads from the primary
+PRIMARY_UNTIL_KEY = '_db_primary_until'
+
+def _reads_from_primary(binding):
+    """Whether reads must go to the primary: no replicas, a cache fill (see cached), or a write
+    in this unit of work or recently in this session"""
+    if not replica_set.enabled or getattr(binding, '_db_wrote', False):
+        return True
+    if getattr(binding, '_db_primary_only', False):
+        return True
+    return has_request_context() and session.get(PRIMARY_UNTIL_KEY, 0) > time.time()
+
+def get_read_connection():
+    """Get a connection for read-only statements: a healthy replica's when allowed, else the primary's.
+    
+    Replicas are only used until the unit of work writes, and not at all for a
+    session that wrote within the last DB_READ_YOUR_WRITES_SECONDS, so users
+    always read their own writes.
+    """
+    binding = _binding()
+    if _reads_from_primary(binding):
+        return _primary_connection(binding)
+    conn = getattr(binding, '_db_read_conn', None)
+    if conn is not None and not conn.closed:
+        return conn
+    if conn is not None:
+        _drop_read_connection(binding)
+    start = time.perf_counter()
+    replica, conn = replica_set.getconn()
+    query_stats.query_stats.record_pool_wait(time.perf_counter() - start)
+    if conn is None:
+        return _primary_connection(binding)
+    binding._db_read_conn = conn
+    binding._db_read_replica = replica
+    return conn
+
+def _drop_read_connection(binding, error=None):
+    """Discard the replica connection after a failure, ejecting the replica if the connection broke"""
+    conn = binding._db_read_conn
+    replica = binding._db_read_replica
+    binding._db_read_conn = binding._db_read_replica = None
+    if error is not None and conn.closed:
+        replica.fail(error)
+    replica.pool.putconn(conn, close=True)
+
+def _run_read(query, work):
+    """Run `work(conn)` for `query`: on the read connection if the statement only reads, retrying
+    once on the primary if a replica fails; on the primary otherwise"""
+    if not isinstance(query, str) or not is_read_only(query):
+        return work(get_connection())
+    conn = get_read_connection()
+    try:
+        return work(conn)
+    except psycopg2.OperationalError as e:
+        binding = _binding()
+        if conn is not getattr(binding, '_db_read_conn', None):
             raise
-    return _conn
+        # A dropped connection, or a statement cancelled by a recovery conflict
+        logger.warning(f"Read failed on replica {binding._db_read_replica.name}, retrying on the primary: {e}")
+        _drop_read_connection(binding, error=e)
+        return work(_primary_connection(binding))
+
+@contextmanager
+def primary_reads():
+    """Send the current unit of work's reads to the primary for the duration of the block.
+    
+    For anything that pairs what it reads with a cache generation, like a cache fill
+    or the search index, where rows from a lagging replica would go unnoticed.
+    """
+    binding = _binding()
+    previous = getattr(binding, '_db_primary_only', False)
+    binding._db_primary_only = True
+    try:
+        yield
+    finally:
+        binding._db_primary_only = previous
+
+def cached(cache, key, scopes, loader):
+    """cache.get_or_load, keeping read replicas out of the shared caches.
+    
+    A lagging replica could store rows from before a write under the generation
+    that write just bumped, so misses are loaded from the primary, and units of
+    work that must read from the primary skip the caches altogether.
+    """
+    if not replica_set.enabled:
+        return cache.get_or_load(key, scopes, loader)
+    binding = _binding()
+    if getattr(binding, '_db_primary_only', False):
+        # Nested inside another fill, which already reads from the primary
+        return cache.get_or_load(key, scopes, loader)
+    if _reads_from_primary(binding):
+        return loader()
+    
+    def load():
+        with primary_reads():
+            return loader()
+    
+    return cache.get_or_load(key, scopes, load)
+
+def release_connection(exception=None):
+    """Return the current request's or thread's connections to their pools"""
+    binding = _binding()
+    conn = getattr(binding, '_db_conn', None)
+    if conn is not None:
+        binding._db_conn = None
+        get_pool().putconn(conn)
+    read_conn = getattr(binding, '_db_read_conn', None)
+    if read_conn is not None:
+        replica = binding._db_read_replica
+        binding._db_read_conn = binding._db_read_replica = None
+        replica.pool.putconn(read_conn)
+    binding._db_wrote = False
+
+def init_app(app):
+    """Hook the connection pool and query instrumentation into a Flask app's request lifecycle"""
+    app.teardown_appcontext(release_connection)
+    query_stats.init_app(app)
+
+    @app.after_request
+    def read_your_writes(response):
+        # Keep this session's reads on the primary until the replicas have caught up with its write
+        if replica_set.enabled and getattr(g, '_db_wrote', False):
+            session[PRIMARY_UNTIL_KEY] = time.time() + REPLICA_SETTINGS['sticky_seconds']
+        return response
+
+def pool_stats():
+    """Usage and wait-time statistics for the connection pool, plus each read replica's health"""
+    stats = get_pool().stats()
+    if replica_set.enabled:
+        stats['replicas'] = replica_set.stats()
+    return stats
 
 def get_cursor(conn=None, cursor_factory=psycopg2.extras.DictCursor):
-    """Get a cursor with the specified factory"""
+    """Get a cursor with the specified factory, instrumented for query statistics"""
     if conn is None:
         conn = get_connection()
-    return conn.cursor(cursor_factory=cursor_factory)
+    return conn.cursor(cursor_factory=instrumented(cursor_factory))
 
-def execute_query(query, params=None, fetch=True, commit=False):
-    """Execute a query and optionally fetch results or commit changes"""
-    conn = get_connection()
+def _execute(conn, query, params, fetch, commit):
     try:
         with get_cursor(conn) as cursor:
             cursor.execute(query, params)
-            if fetch:
-                return cursor.fetchall()
+            result = cursor.fetchall() if fetch else cursor.rowcount
             if commit:
                 conn.commit()
-                return cursor.rowcount
-            return None
+                return result
+            return result if fetch else None
     except Exception as e:
         if commit:
             conn.rollback()
         logger.error(f"Database error: {e}")
         raise
 
-def create_tables():
-    """Create database tables if they don't exist"""
+def execute_query(query, params=None, fetch=True, commit=False):
+    """Execute a query and optionally fetch results or commit changes.
+    
+    Read-only statements that are not committed may be answered by a read replica
+    (see get_read_connection); everything else runs on the primary.
+    """
+    if commit:
+        return _execute(get_connection(), query, params, fetch, commit)
+    return _run_read(query, lambda conn: _execute(conn, query, params, fetch, False))
+
+def stream_query(query, params=None, itersize=2000):
+    """Yield rows (as tuples) from a server-side cursor, holding at most `itersize` rows in memory.
+    
+    The cursor runs on its own pooled connection, so a streamed response never
+    shares a transaction with the request's other queries. It is a replica's
+    connection whenever get_read_connection would use one.
+    """
+    if _reads_from_primary(_binding()) or not is_read_only(query):
+        replica, conn = None, None
+    else:
+        replica, conn = replica_set.getconn()
+    pool = replica.pool if replica is not None else get_pool()
+    if conn is None:
+        conn = pool.getconn()
+    try:
+        with conn.cursor(name=f"stream_{uuid.uuid4().hex}",
+                         cursor_factory=instrumented(psycopg2.extensions.cursor)) as cursor:
+            cursor.itersize = itersize
+            cursor.execute(query, params)
+            for row in cursor:
+                yield row
+    finally:
+        pool.putconn(conn)
+
+def estimate_count(query, params=None):
+    """Estimate how many rows a query returns from planner statistics, without running it"""
+    result = execute_query(f"EXPLAIN (FORMAT JSON) {query}", params)
+    return int(result[0][0][0]['Plan']['Plan Rows'])
+
+def _prefix_tsquery(text):
+    """Turn free text into a prefix-matching tsquery string, e.g. 'harry pot' -> 'harry:* & pot:*'"""
+    terms = re.findall(r'\w+', text.lower())
+    return ' & '.join(f"{term}:*" for term in terms)
+
+# Relevance ordering for full-text matches; takes the rank parameters returned by search_filter
+SEARCH_RANK_ORDER = "ts_rank(b.search_vector, to_tsquery(%s, %s)) DESC, b.title, b.id"
+
+def search_filter(query=None, section_id=None, available_only=False):
+    """Build the WHERE clause of a book search over `books b`.
+    
+    Returns (where_clause, params, rank_params); rank_params is empty unless the
+    matches can be ordered by SEARCH_RANK_ORDER. Shared by Book.search and the
+    async search API so both match exactly the same books.
+    """
+    params = []
+    where_clauses = []
+    rank_params = []
+    
+    if query and SEARCH_SETTINGS['engine'] == 'fulltext':
+        # Word-prefix matches come from the GIN tsvector index, substrings from the trigram indexes
+        tsquery = _prefix_tsquery(query)
+        if tsquery:
+            where_clauses.append(
+                "(b.search_vector @@ to_tsquery(%s, %s) OR b.title ILIKE %s OR b.author ILIKE %s OR b.isbn ILIKE %s)"
+            )
+            params.extend([SEARCH_SETTINGS['ts_config'], tsquery])
+            rank_params = [SEARCH_SETTINGS['ts_config'], tsquery]
+        else:
+            where_clauses.append("(b.title ILIKE %s OR b.author ILIKE %s OR b.isbn ILIKE %s)")
+        params.extend([f'%{query}%', f'%{query}%', f'%{query}%'])
+    elif query:
+        where_clauses.append("(b.title ILIKE %s OR b.author ILIKE %s OR b.isbn ILIKE %s)")
+        params.extend([f'%{query}%', f'%{query}%', f'%{query}%'])
+    
+    if section_id:
+        where_clauses.append("b.section_id = %s")
+        params.append(section_id)
+    
+    if available_only:
+        # Matches the partial index idx_books_available_title
+        where_clauses.append("b.available")
+    
+    where_clause = " AND ".join(where_clauses) if where_clauses else "1=1"
+    return where_clause, params, rank_params
+
+# Claims the book and records the purchase in one statement. The conditional UPDATE takes the
+# row lock, so a concurrent buyer blocks on it, re-checks `available` and claims nothing.
+# The price comes from the cached purchase settings rather than a per-purchase read.
+PURCHASE_QUERY = """
+WITH buyer AS (
+    SELECT id FROM users WHERE id = %(user_id)s AND role_id = %(student_role_id)s
+), claimed AS (
+    UPDATE books b
+    SET available = FALSE
+    FROM buyer
+    WHERE b.id = %(book_id)s AND b.available
+    RETURNING b.id, b.title, b.section_id
+), purchased AS (
+    INSERT INTO purchases (user_id, book_id, price)
+    SELECT %(user_id)s, claimed.id, %(price)s FROM claimed
+    RETURNING book_id
+)
+SELECT claimed.title, claimed.section_id
+FROM purchased
+JOIN claimed ON claimed.id = purchased.book_id
+"""
+
+def purchase_book(user_id, book_id):
+    """Process a book purchase by a student"""
+    settings = purchase_settings.get()
+    if not settings['allow_student_purchases']:
+        logger.warning("Student purchases are currently disabled")
+        return False, "Book purchases are currently disabled"
+    
     conn = get_connection()
+    student_role = role_registry.get_by_name('Student')
     try:
         with get_cursor(conn) as cursor:
-            # Create roles table
-            cursor.execute("""
-            CREATE TABLE IF NOT EXISTS roles (
-                id SERIAL PRIMARY KEY,
-                name VARCHAR(64) UNIQUE NOT NULL,
-                description VARCHAR(256),
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-            """)
+            try:
+                cursor.execute(PURCHASE_QUERY, {
+                    'user_id': user_id,
+                    'book_id': book_id,
+                    'student_role_id': student_role.id if student_role else None,
+                    'price': settings['default_book_price']
+                })
+                book = cursor.fetchone()
+            except psycopg2.errors.UniqueViolation:
+                conn.rollback()
+                logger.warning(f"User {user_id} already purchased book {book_id}")
+                return False, "You have already purchased this book"
             
-            # Create users table
-            cursor.execute("""
-            CREATE TABLE IF NOT EXISTS users (
-                id SERIAL PRIMARY KEY,
-                username VARCHAR(64) UNIQUE NOT NULL,
-                email VARCHAR(120) UNIQUE NOT NULL,
-                password_hash VARCHAR(256) NOT NULL,
-                role_id INTEGER REFERENCES roles(id) NOT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-            """)
+            if book:
+                conn.commit()
+                invalidate_books(book['section_id'])
+                book_index.set_available(book_id, False)
+                logger.info(f"Book {book_id} purchased successfully by user {user_id}")
+                return True, f"Successfully purchased {book['title']}"
             
-            # Create sections table
+            # Nothing was claimed; find out why (only failed purchases pay for this query)
+            conn.rollback()
             cursor.execute("""
-            CREATE TABLE IF NOT EXISTS sections (
-                id SERIAL PRIMARY KEY,
-                name VARCHAR(64) UNIQUE NOT NULL,
-                description TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-            """)
+            SELECT
+                (SELECT role_id FROM users WHERE id = %s) AS role_id,
+                (SELECT available FROM books WHERE id = %s) AS available
+            """, (user_id, book_id))
+            state = cursor.fetchone()
+            conn.rollback()
             
-            # Create books table
-            cursor.execute("""
-            CREATE TABLE IF NOT EXISTS books (
-                id SERIAL PRIMARY KEY,
-                title VARCHAR(256) NOT NULL,
-                author VARCHAR(128) NOT NULL,
-                isbn VARCHAR(20) UNIQUE,
-                genre VARCHAR(64),
-                section_id INTEGER REFERENCES sections(id) NOT NULL,
-                available BOOLEAN DEFAULT TRUE,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-            """)
+            if state['role_id'] is None or role_registry.name_for(state['role_id']) != 'Student':
+                logger.warning(f"Non-student user {user_id} attempted to purchase a book")
+                return False, "Only students can purchase books"
             
-            conn.commit()
+            if state['available'] is None:
+                logger.warning(f"Attempted to purchase non-existent book ID {book_id}")
+                return False, "Book not found"
             
-            # Create default roles if they don't exist
-            cursor.execute("SELECT COUNT(*) FROM roles WHERE name = 'Admin'")
-            if cursor.fetchone()[0] == 0:
-                cursor.execute(
-                    "INSERT INTO roles (name, description) VALUES (%s, %s)",
-                    ("Admin", "System administrator with full privileges")
-                )
+            logger.warning(f"Attempted to purchase unavailable book {book_id}")
+            return False, "Book is not available for purchase"
                 
-            cursor.execute("SELECT COUNT(*) FROM roles WHERE name = 'Librarian'")
-            if cursor.fetchone()[0] == 0:
-                cursor.execute(
-                    "INSERT INTO roles (name, description) VALUES (%s, %s)",
-                    ("Librarian", "Library staff with management access")
-                )
-            
-            cursor.execute("SELECT COUNT(*) FROM roles WHERE name = 'Student'")
-            if cursor.fetchone()[0] == 0:
-                cursor.execute(
-                    "INSERT INTO roles (name, description) VALUES (%s, %s)",
-                    ("Student", "Library user with limited access")
-                )
-            
-            conn.commit()
-            logger.info("Database tables created successfully")
-            
     except Exception as e:
         conn.rollback()
-        logger.error(f"Error creating tables: {e}")
-        raise
+        logger.error(f"Error during book purchase: {e}")
+        return False, "An error occurred while processing your purchase"
 
-def initialize_purchase_system():
-    """Create purchase tables and initial settings"""
-    conn = get_connection()
-    try:
-        with get_cursor(conn) as cursor:
-            # Create purchases table
-            cursor.execute("""
-            CREATE TABLE IF NOT EXISTS purchases (
-                id SERIAL PRIMARY KEY,
-                user_id INTEGER REFERENCES users(id) NOT NULL,
-                book_id INTEGER REFERENCES books(id) NOT NULL,
-                purchase_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                price NUMERIC(10, 2) NOT NULL,
-                status VARCHAR(20) DEFAULT 'completed',
-                UNIQUE(user_id, book_id)
-            )
-            """)
-            
-            # Create purchase settings table
-            cursor.execute("""
-            CREATE TABLE IF NOT EXISTS purchase_settings (
-                id SERIAL PRIMARY KEY,
-                allow_student_purchases BOOLEAN DEFAULT TRUE,
-                default_book_price NUMERIC(10, 2) DEFAULT 9.99
-            )
-            """)
-            
-            # Check if settings exist, if not create default
-            cursor.execute("SELECT COUNT(*) FROM purchase_settings")
-            if cursor.fetchone()[0] == 0:
-                cursor.execute(
-                    "INSERT INTO purchase_settings (allow_student_purchases, default_book_price) VALUES (true, 9.99)"
-                )
-            
-            conn.commit()
-            logger.info("Purchase system initialized successfully")
-    except Exception as e:
-        conn.rollback()
-        logger.error(f"Error initializing purchase system: {e}")
-        raise
+# Locks the requested books in id order, so overlapping carts cannot deadlock. This is a
+# statement of its own because PostgreSQL does not promise when, or in what order, a CTE
+# that is only read through IN (SELECT ...) takes its row locks.
+CHECKOUT_LOCK_QUERY = "SELECT id FROM books WHERE id = ANY(%(book_ids)s) ORDER BY id FOR UPDATE"
 
-def purchase_book(user_id, book_id):
-    """Process a book purchase by a student"""
+# Claims the (already locked) books and records the purchases in one statement. The final
+# SELECT reads the pre-statement snapshot, so `available` and `owned` describe each book as
+# it was before this checkout.
+CHECKOUT_QUERY = """
+WITH buyer AS (
+    SELECT id FROM users WHERE id = %(user_id)s AND role_id = %(student_role_id)s
+), requested AS (
+    SELECT DISTINCT unnest(%(book_ids)s::int[]) AS id
+), claimed AS (
+    UPDATE books b
+    SET available = FALSE
+    FROM buyer
+    WHERE b.id IN (SELECT id FROM requested) AND b.available
+      AND NOT EXISTS (SELECT 1 FROM purchases p WHERE p.user_id = %(user_id)s AND p.book_id = b.id)
+    RETURNING b.id
+), purchased AS (
+    INSERT INTO purchases (user_id, book_id, price)
+    SELECT %(user_id)s, claimed.id, %(price)s FROM claimed
+    RETURNING book_id, price
+)
+SELECT r.id AS book_id, b.title, b.section_id, b.available, pu.price,
+       pu.book_id IS NOT NULL AS purchased,
+       EXISTS (SELECT 1 FROM purchases p WHERE p.user_id = %(user_id)s AND p.book_id = r.id) AS owned,
+       EXISTS (SELECT 1 FROM buyer) AS is_student
+FROM requested r
+LEFT JOIN books b ON b.id = r.id
+LEFT JOIN purchased pu ON pu.book_id = r.id
+ORDER BY r.id
+"""
+
+CHECKOUT_MESSAGES = {
+    'purchased': "Purchased",
+    'not_found': "Book not found",
+    'already_purchased': "You have already purchased this book",
+    'unavailable': "Book is not available for purchase",
+    'not_committed': "Not purchased because another book in the cart could not be purchased"
+}
+
+def checkout_cart(user_id, book_ids, all_or_nothing=True):
+    """Purchase several books for a student in one transaction.
+    
+    With `all_or_nothing` the whole cart is rolled back if any book cannot be
+    purchased; otherwise every purchasable book is bought. Returns
+    (success, message, results) where results holds one dict per distinct book id
+    with its `status` (see CHECKOUT_MESSAGES), `message`, `title` and `price`.
+    """
+    book_ids = sorted({int(book_id) for book_id in book_ids})
+    if not book_ids:
+        return False, "Your cart is empty", []
+    
+    settings = purchase_settings.get()
+    if not settings['allow_student_purchases']:
+        logger.warning("Student purchases are currently disabled")
+        return False, "Book purchases are currently disabled", []
+    
     conn = get_connection()
+    student_role = role_registry.get_by_name('Student')
     try:
-        # First check if student purchases are allowed
         with get_cursor(conn) as cursor:
-            cursor.execute("SELECT allow_student_purchases, default_book_price FROM purchase_settings LIMIT 1")
-            settings = cursor.fetchone()
-            
-            if not settings or not settings['allow_student_purchases']:
-                logger.warning("Student purchases are currently disabled")
-                return False, "Book purchases are currently disabled"
+            try:
+                cursor.execute(CHECKOUT_LOCK_QUERY, {'book_ids': book_ids})
+                cursor.execute(CHECKOUT_QUERY, {
+                    'user_id': user_id,
+                    'book_ids': book_ids,
+                    'student_role_id': student_role.id if student_role else None,
+                    'price': settings['default_book_price']
+                })
+                rows = cursor.fetchall()
+            except psycopg2.errors.UniqueViolation:
+                # Only possible when the same student checks out the same book concurrently
+                conn.rollback()
+                logger.warning(f"Concurrent duplicate checkout by user {user_id}")
+                return False, "You have already purchased one of these books", []
             
-            # Get user and verify it's a student
-            cursor.execute("SELECT r.name FROM users u JOIN roles r ON u.role_id = r.id WHERE u.id = %s", (user_id,))
-            user_role = cursor.fetchone()
-            if not user_role or user_role['name'] != 'Student':
-                logger.warning(f"Non-student user {user_id} attempted to purchase a book")
-                return False, "Only students can purchase books"
+            if rows and not rows[0]['is_student']:
+                conn.rollback()
+                logger.warning(f"Non-student user {user_id} attempted to check out a cart")
+                return False, "Only students can purchase books", []
             
-            # Check if book exists and is available
-            cursor.execute("SELECT title, available FROM books WHERE id = %s", (book_id,))
-            book = cursor.fetchone()
-            if not book:
-                logger.warning(f"Attempted to purchase non-existent book ID {book_id}")
-                return False, "Book not found"
-                
-            if not book['available']:
-                logger.warning(f"Attempted to purchase unavailable book {book_id}")
-                return False, "Book is not available for purchase"
+            results = []
+            for row in rows:
+                if row['purchased']:
+                    status = 'purchased'
+                elif row['title'] is None:
+                    status = 'not_found'
+                elif row['owned']:
+                    status = 'already_purchased'
+                else:
+                    status = 'unavailable'
+                results.append({
+                    'book_id': row['book_id'],
+                    'title': row['title'],
+                    'status': status,
+                    'message': CHECKOUT_MESSAGES[status],
+                    'price': str(row['price']) if row['price'] is not None else None,
+                    'section_id': row['section_id']
+                })
             
-            # Process the purchase
-            try:
-                cursor.execute(
-                    "INSERT INTO purchases (user_id, book_id, price) VALUES (%s, %s, %s)",
-                    (user_id, book_id, settings['default_book_price'])
-                )
-                
-                # Update book availability
-                cursor.execute("UPDATE books SET available = false WHERE id = %s", (book_id,))
-                
-                conn.commit()
-                logger.info(f"Book {book_id} purchased successfully by user {user_id}")
-                return True, f"Successfully purchased {book['title']}"
-            except psycopg2.errors.UniqueViolation:
+            purchased = [result for result in results if result['status'] == 'purchased']
+            if all_or_nothing and len(purchased) < len(results):
                 conn.rollback()
-                logger.warning(f"User {user_id} already purchased book {book_id}")
-                return False, "You have already purchased this book"
-                
+                for result in purchased:
+                    result.update(status='not_committed', message=CHECKOUT_MESSAGES['not_committed'], price=None)
+                logger.info(f"Cart checkout by user {user_id} rolled back: "
+                            f"{len(results) - len(purchased)} of {len(results)} books unavailable")
+                return False, "Some books in your cart could not be purchased, so nothing was bought", results
+            
+            conn.commit()
+            if purchased:
+                invalidate_books(*{result['section_id'] for result in purchased})
+                for result in purchased:
+                    book_index.set_available(result['book_id'], False)
+            logger.info(f"Cart checkout by user {user_id}: {len(purchased)} of {len(results)} books purchased")
+            if not purchased:
+                return False, "None of the books in your cart could be purchased", results
+            return True, f"Purchased {len(purchased)} of {len(results)} books", results
+    
     except Exception as e:
         conn.rollback()
-        logger.error(f"Error during book purchase: {e}")
-        return False, "An error occurred while processing your purchase"
+        logger.error(f"Error during cart checkout: {e}")
+        return False, "An error occurred while processing your purchase", []
+
+# Row mapping. Models are built straight from tuple rows: each model lists its
+# constructor arguments in `_columns`, and the first time a query shape is seen
+# for a model that is compiled into positional lookups. This skips the per-row
+# dict of a DictCursor, and the models use __slots__ instead of an instance dict.
+
+_row_makers = {}
+_row_makers_lock = threading.Lock()
+
+def _itemgetter(indexes):
+    """Like operator.itemgetter, but always returns a tuple"""
+    if len(indexes) == 1:
+        index = indexes[0]
+        return lambda row: (row[index],)
+    return operator.itemgetter(*indexes)
+
+def row_maker(cls, columns, extra=()):
+    """Get a function that turns a tuple row with the given column names into a `cls` instance.
+    
+    Columns the model does not know are ignored and model fields missing from the
+    row keep their constructor defaults. With `extra` column names, the function
+    returns (instance, *extra values) instead.
+    """
+    key = (cls, columns, extra)
+    maker = _row_makers.get(key)
+    if maker is not None:
+        return maker
+    
+    positions = {}
+    for index, column in enumerate(columns):
+        positions.setdefault(column, index)
+    fields = [(name, positions[name]) for name in cls._columns if name in positions]
+    getter = _itemgetter([index for _, index in fields])
+    
+    if len(fields) == len(cls._columns):
+        # Every field present: pass the values positionally, in _columns order
+        build = lambda row: cls(*getter(row))
+    else:
+        names = [name for name, _ in fields]
+        build = lambda row: cls(**dict(zip(names, getter(row))))
+    
+    if extra:
+        extra_getter = _itemgetter([positions[name] for name in extra])
+        maker = lambda row: (build(row),) + extra_getter(row)
+    else:
+        maker = build
+    
+    with _row_makers_lock:
+        _row_makers[key] = maker
+    return maker
+
+def fetch_models(cls, query, params=None, extra=()):
+    """Run a query and build a `cls` instance from every row (see row_maker)"""
+    def run(conn):
+        try:
+            with get_cursor(conn, cursor_factory=psycopg2.extensions.cursor) as cursor:
+                cursor.execute(query, params)
+                return cursor.fetchall(), tuple(column.name for column in cursor.description)
+        except Exception as e:
+            logger.error(f"Database error: {e}")
+            raise
+    
+    rows, columns = _run_read(query, run)
+    make = row_maker(cls, columns, extra)
+    return [make(row) for row in rows]
+
+def fetch_model(cls, query, params=None):
+    """Run a query and build a `cls` instance from its first row, or return None"""
+    models = fetch_models(cls, query, params)
+    return models[0] if models else None
 
 # Model classes for data access
 
 class User(UserMixin):
+    # No __slots__: UserMixin gives every instance a __dict__ anyway
+    _columns = ('id', 'username', 'email', 'password_hash', 'role_id', 'created_at', 'updated_at')
+    
     def __init__(self, id=None, username=None, email=None, password_hash=None, role_id=None, 
                  created_at=None, updated_at=None, role_name=None):
         self.id = id
@@ -278,74 +896,37 @@ class User(UserMixin):
     @classmethod
     def get_by_id(cls, user_id):
         """Get user by ID"""
-        query = """
-        SELECT u.*, r.name as role_name
-        FROM users u
-        JOIN roles r ON u.role_id = r.id
-        WHERE u.id = %s
-        """
-        result = execute_query(query, (user_id,))
-        if result:
-            row = result[0]
-            return cls(
-                id=row['id'],
-                username=row['username'],
-                email=row['email'],
-                password_hash=row['password_hash'],
-                role_id=row['role_id'],
-                created_at=row['created_at'],
-                updated_at=row['updated_at'],
-                role_name=row['role_name']
+        return cls._fetch_one("SELECT * FROM users WHERE id = %s", (user_id,))
+    
+    @classmethod
+    def _fetch_one(cls, query, params):
+        user = fetch_model(cls, query, params)
+        if user:
+            user._role_name = role_registry.name_for(user.role_id)
+        return user
+    
+    @classmethod
+    def get_cached(cls, user_id):
+        """Get user by ID through a per-request memo and the short-lived user cache"""
+        memo = request_cache('_users_by_id')
+        if user_id not in memo:
+            memo[user_id] = cached(
+                user_cache,
+                user_id,
+                user_scopes(user_id),
+                lambda: cls.get_by_id(user_id)
             )
-        return None
+        return memo[user_id]
     
     @classmethod
     def get_by_username(cls, username):
         """Get user by username"""
-        query = """
-        SELECT u.*, r.name as role_name
-        FROM users u
-        JOIN roles r ON u.role_id = r.id
-        WHERE u.username = %s
-        """
-        result = execute_query(query, (username,))
-        if result:
-            row = result[0]
-            return cls(
-                id=row['id'],
-                username=row['username'],
-                email=row['email'],
-                password_hash=row['password_hash'],
-                role_id=row['role_id'],
-                created_at=row['created_at'],
-                updated_at=row['updated_at'],
-                role_name=row['role_name']
-            )
-        return None
+        return cls._fetch_one("SELECT * FROM users WHERE username = %s", (username,))
     
     @classmethod
     def get_by_email(cls, email):
         """Get user by email"""
-        query = """
-        SELECT u.*, r.name as role_name
-        FROM users u
-        JOIN roles r ON u.role_id = r.id
-        WHERE u.email = %s
-        """
-        result = execute_query(query, (email,))
-        if result:
-            row = result[0]
-            return cls(
-                id=row['id'],
-                username=row['username'],
-                email=row['email'],
-                password_hash=row['password_hash'],
-                role_id=row['role_id'],
-                created_at=row['created_at'],
-                updated_at=row['updated_at'],
-                role_name=row['role_name']
-            )
-        return None
+        return cls._fetch_one("SELECT * FROM users WHERE email = %s", (email,))
     
     def create(self):
         """Create a new user"""
@@ -432,11 +1013,27 @@ class User(UserMixin):
     
     def set_password(self, password):
         """Set password hash"""
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = passwords.hash_password(password)
     
     def check_password(self, password):
         """Check password"""
-        return check_password_hash(self.password_hash, password)
+        return passwords.verify_password(self.password_hash, password)
+    
+    def upgrade_password_hash(self, password):
+        """Rehash a just-verified password if it was hashed with outdated parameters"""
+        if not self.id or not passwords.needs_rehash(self.password_hash):
+            return False
+        try:
+            self.set_password(password)
+            query = "UPDATE users SET password_hash = %s, updated_at = CURRENT_TIMESTAMP WHERE id = %s"
+            execute_query(query, (self.password_hash, self.id), fetch=False, commit=True)
+            invalidate_user(self.id)
+            logger.info(f"Upgraded password hash for user {self.id}")
+            return True
+        except Exception as e:
+            # The old hash still works, so a failed upgrade must not fail the login
+            logger.error(f"Error upgrading password hash for user {self.id}: {e}")
+            return False
     
     def is_librarian(self):
         """Check if user is a librarian"""
@@ -451,6 +1048,9 @@ class User(UserMixin):
         return self._role_name == 'Admin'
 
 class Role:
+    __slots__ = ('id', 'name', 'description', 'created_at', 'updated_at')
+    _columns = __slots__
+    
     def __init__(self, id=None, name=None, description=None, created_at=None, updated_at=None):
         self.id = id
         self.name = name
@@ -461,128 +1061,158 @@ class Role:
     @classmethod
     def get_all(cls):
         """Get all roles"""
-        query = "SELECT * FROM roles ORDER BY name"
-        result = execute_query(query)
-        return [
-            cls(
-                id=row['id'],
-                name=row['name'],
-                description=row['description'],
-                created_at=row['created_at'],
-                updated_at=row['updated_at']
-            )
-            for row in result
-        ]
+        return sorted(role_registry.roles(), key=lambda role: role.name)
     
     @classmethod
     def get_by_name(cls, name):
         """Get role by name"""
-        query = "SELECT * FROM roles WHERE name = %s"
-        result = execute_query(query, (name,))
-        if result:
-            row = result[0]
-            return cls(
-                id=row['id'],
-                name=row['name'],
-                description=row['description'],
-                created_at=row['created_at'],
-                updated_at=row['updated_at']
-            )
-        return None
+        return role_registry.get_by_name(name)
     
     @classmethod
     def get_by_id(cls, role_id):
         """Get role by ID"""
-        query = "SELECT * FROM roles WHERE id = %s"
-        result = execute_query(query, (role_id,))
-        if result:
-            row = result[0]
-            return cls(
-                id=row['id'],
-                name=row['name'],
-                description=row['description'],
-                created_at=row['created_at'],
-                updated_at=row['updated_at']
-            )
-        return None
+        return role_registry.get_by_id(role_id)
+
+class RoleRegistry:
+    """In-memory id <-> name map of roles.
+    
+    Roles are loaded once per process and reloaded after invalidate(), or when a
+    lookup misses (a role added by another worker), at most every `miss_reload_interval`
+    seconds.
+    """
+    
+    def __init__(self, miss_reload_interval=30):
+        self.miss_reload_interval = miss_reload_interval
+        self._by_id = {}
+        self._by_name = {}
+        self._loaded = False
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+    
+    def load(self):
+        """(Re)load every role from the database"""
+        roles = fetch_models(Role, "SELECT * FROM roles")
+        with self._lock:
+            self._by_id = {role.id: role for role in roles}
+            self._by_name = {role.name: role for role in roles}
+            self._loaded = True
+            self._loaded_at = time.monotonic()
+    
+    def invalidate(self):
+        """Force a reload on the next lookup"""
+        self._loaded = False
+        # Cached users carry their role name
+        invalidate_users()
+    
+    def _lookup(self, table_name, key):
+        if not self._loaded:
+            self.load()
+        role = getattr(self, table_name).get(key)
+        if role is None and time.monotonic() - self._loaded_at > self.miss_reload_interval:
+            self.load()
+            role = getattr(self, table_name).get(key)
+        return role
+    
+    def get_by_id(self, role_id):
+        return self._lookup('_by_id', role_id)
+    
+    def get_by_name(self, name):
+        return self._lookup('_by_name', name)
+    
+    def name_for(self, role_id):
+        """Get a role's name from its ID"""
+        role = self.get_by_id(role_id)
+        return role.name if role else None
+    
+    def roles(self):
+        if not self._loaded:
+            self.load()
+        return list(self._by_id.values())
+
+role_registry = RoleRegistry()
+
+def request_cache(name):
+    """Get a dict that lives for the current request (or a throwaway one outside requests)"""
+    if not has_app_context():
+        return {}
+    cache = getattr(g, name, None)
+    if cache is None:
+        cache = {}
+        setattr(g, name, cache)
+    return cache
 
 class Section:
-    def __init__(self, id=None, name=None, description=None, created_at=None, updated_at=None, books=None):
+    __slots__ = ('id', 'name', 'description', 'created_at', 'updated_at', 'book_count', '_books')
+    _columns = ('id', 'name', 'description', 'created_at', 'updated_at')
+    
+    def __init__(self, id=None, name=None, description=None, created_at=None, updated_at=None, books=None,
+                 book_count=None):
         self.id = id
         self.name = name
         self.description = description
         self.created_at = created_at
         self.updated_at = updated_at
-        self.books = books or []
+        self.book_count = book_count
+        self._books = books
+    
+    @property
+    def books(self):
+        """Get books in this section (loaded only when asked for)"""
+        if self._books is None:
+            self._books = Book.get_by_section(self.id, section_name=self.name) if self.id is not None else []
+        return self._books
+    
+    @books.setter
+    def books(self, books):
+        self._books = books
     
     @classmethod
     def get_all(cls):
-        """Get all sections"""
-        query = "SELECT * FROM sections ORDER BY name"
-        result = execute_query(query)
-        return [
-            cls(
-                id=row['id'],
-                name=row['name'],
-                description=row['description'],
-                created_at=row['created_at'],
-                updated_at=row['updated_at']
-            )
-            for row in result
-        ]
+        """Get all sections with their book counts, served from the cached section catalog"""
+        return [cls(**row) for row in cls._catalog()]
+    
+    @classmethod
+    def choices(cls):
+        """Get (id, name) pairs for section select fields"""
+        return [(row['id'], row['name']) for row in cls._catalog()]
+    
+    @classmethod
+    def _catalog(cls):
+        """Get the section catalog as plain dicts, loading it on a cache miss"""
+        query = """
+        SELECT s.id, s.name, s.description, s.created_at, s.updated_at, COUNT(b.id) AS book_count
+        FROM sections s
+        LEFT JOIN books b ON b.section_id = s.id
+        GROUP BY s.id
+        ORDER BY s.name
+        """
+        return cached(
+            catalog_cache,
+            'all',
+            CATALOG_SCOPES,
+            lambda: [dict(row) for row in execute_query(query)]
+        )
     
     @classmethod
     def get_by_id(cls, section_id):
         """Get section by ID"""
-        query = "SELECT * FROM sections WHERE id = %s"
-        result = execute_query(query, (section_id,))
-        if result:
-            row = result[0]
-            section = cls(
-                id=row['id'],
-                name=row['name'],
-                description=row['description'],
-                created_at=row['created_at'],
-                updated_at=row['updated_at']
-            )
-            
-            # Get books for this section
-            books_query = "SELECT * FROM books WHERE section_id = %s ORDER BY title"
-            books_result = execute_query(books_query, (section_id,))
-            section.books = [
-                Book(
-                    id=book_row['id'],
-                    title=book_row['title'],
-                    author=book_row['author'],
-                    isbn=book_row['isbn'],
-                    genre=book_row['genre'],
-                    section_id=book_row['section_id'],
-                    available=book_row['available'],
-                    created_at=book_row['created_at'],
-                    updated_at=book_row['updated_at'],
-                    section_name=row['name']
-                )
-                for book_row in books_result
-            ]
-            
-            return section
-        return None
+        # Books for this section are loaded lazily through Section.books
+        return fetch_model(cls, "SELECT * FROM sections WHERE id = %s", (section_id,))
+    
+    @classmethod
+    def get_many(cls, section_ids):
+        """Get sections by ID in one query, memoized for the current request (books are not loaded)"""
+        cache = request_cache('_sections_by_id')
+        missing = [section_id for section_id in set(section_ids) if section_id not in cache]
+        if missing:
+            for section in fetch_models(cls, "SELECT * FROM sections WHERE id = ANY(%s)", (missing,)):
+                cache[section.id] = section
+        return {section_id: cache[section_id] for section_id in section_ids if section_id in cache}
     
     @classmethod
     def get_by_name(cls, name):
         """Get section by name"""
-        query = "SELECT * FROM sections WHERE name = %s"
-        result = execute_query(query, (name,))
-        if result:
-            row = result[0]
-            return cls(
-                id=row['id'],
-                name=row['name'],
-                description=row['description'],
-                created_at=row['created_at'],
-                updated_at=row['updated_at']
-            )
-        return None
+        return fetch_model(cls, "SELECT * FROM sections WHERE name = %s", (name,))
     
     def create(self):
         """Create a new section"""
@@ -601,6 +1231,7 @@ class Section:
             self.id = row['id']
             self.created_at = row['created_at']
             self.updated_at = row['updated_at']
+            invalidate_sections()
             return True
         return False
     
@@ -619,13 +1250,19 @@ class Section:
         )
         if result:
             self.updated_at = result[0]['updated_at']
+            invalidate_sections()
+            invalidate_books(self.id)
+            book_index.rename_section(self.id, self.name)
             return True
         return False
     
     def delete(self):
         """Delete section"""
         query = "DELETE FROM sections WHERE id = %s"
-        return execute_query(query, (self.id,), fetch=False, commit=True) > 0
+        deleted = execute_query(query, (self.id,), fetch=False, commit=True) > 0
+        if deleted:
+            invalidate_sections()
+        return deleted
     
     def count_books(self):
         """Count books in this section"""
@@ -633,7 +1270,45 @@ class Section:
         result = execute_query(query, (self.id,))
         return result[0][0] if result else 0
 
+class SectionRef:
+    """Section reference held by a Book.
+    
+    The id and (usually joined-in) name are available without a query. Any other
+    attribute resolves the full Section through Section.get_many, batching every
+    reference created during the request into a single query.
+    """
+    
+    __slots__ = ('id', 'name')
+    
+    def __init__(self, id, name=None):
+        self.id = id
+        if name is not None:
+            self.name = name
+        request_cache('_pending_section_ids')[id] = True
+    
+    def _resolve(self):
+        pending = request_cache('_pending_section_ids')
+        section_ids = list(pending) if self.id in pending else [self.id]
+        pending.clear()
+        return Section.get_many(section_ids).get(self.id)
+    
+    def __getattr__(self, attr):
+        if attr == 'id' or attr.startswith('_'):
+            raise AttributeError(attr)
+        section = self._resolve()
+        if section is None:
+            return None
+        return getattr(section, attr)
+
+# Book columns for listings; search_vector is left out, it is only ever filtered on
+BOOK_COLUMNS = "b.id, b.title, b.author, b.isbn, b.genre, b.section_id, b.available, b.created_at, b.updated_at"
+
 class Book:
+    __slots__ = ('id', 'title', 'author', 'isbn', 'genre', 'section_id', 'available', 'created_at', 'updated_at',
+                 '_section_name', '_section')
+    _columns = ('id', 'title', 'author', 'isbn', 'genre', 'section_id', 'available', 'created_at', 'updated_at',
+                'section_name')
+    
     def __init__(self, id=None, title=None, author=None, isbn=None, genre=None, section_id=None,
                 available=True, created_at=None, updated_at=None, section_name=None):
         self.id = id
@@ -650,132 +1325,110 @@ class Book:
     
     @property
     def section(self):
-        """Get section for this book (lazy loading)"""
-        if self._section is None and self.section_id is not None:
-            self._section = Section.get_by_id(self.section_id)
+        """Get a lightweight reference to this book's section"""
+        if self.section_id is None:
+            return None
+        if self._section is None or self._section.id != self.section_id:
+            self._section = SectionRef(self.section_id, self._section_name)
         return self._section
     
     @classmethod
-    def get_all(cls, page=1, per_page=12):
+    def get_by_section(cls, section_id, section_name=None):
+        """Get all books in a section"""
+        query = f"SELECT {BOOK_COLUMNS}, %s::varchar AS section_name FROM books b WHERE b.section_id = %s ORDER BY b.title"
+        return fetch_models(cls, query, (section_name, section_id))
+    
+    @classmethod
+    def get_all(cls, page=1, per_page=12, cursor=None, count_mode=None):
         """Get all books with pagination"""
-        count_query = "SELECT COUNT(*) FROM books"
-        count = execute_query(count_query)[0][0]
-        
-        offset = (page - 1) * per_page
-        query = """
-        SELECT b.*, s.name as section_name
-        FROM books b
-        JOIN sections s ON b.section_id = s.id
-        ORDER BY b.title
-        LIMIT %s OFFSET %s
-        """
-        result = execute_query(query, (per_page, offset))
-        
-        books = [
-            cls(
-                id=row['id'],
-                title=row['title'],
-                author=row['author'],
-                isbn=row['isbn'],
-                genre=row['genre'],
-                section_id=row['section_id'],
-                available=row['available'],
-                created_at=row['created_at'],
-                updated_at=row['updated_at'],
-                section_name=row['section_name']
-            )
-            for row in result
-        ]
-        
-        # Return a pagination-like object
-        return {
-            'items': books,
-            'page': page,
-            'per_page': per_page,
-            'total': count,
-            'pages': (count + per_page - 1) // per_page
-        }
+        return cls.search(page=page, per_page=per_page, cursor=cursor, count_mode=count_mode)
     
     @classmethod
     def get_by_id(cls, book_id):
         """Get book by ID"""
-        query = """
-        SELECT b.*, s.name as section_name
+        query = f"""
+        SELECT {BOOK_COLUMNS}, s.name as section_name
         FROM books b
         JOIN sections s ON b.section_id = s.id
         WHERE b.id = %s
         """
-        result = execute_query(query, (book_id,))
-        if result:
-            row = result[0]
-            return cls(
-                id=row['id'],
-                title=row['title'],
-                author=row['author'],
-                isbn=row['isbn'],
-                genre=row['genre'],
-                section_id=row['section_id'],
-                available=row['available'],
-                created_at=row['created_at'],
-                updated_at=row['updated_at'],
-                section_name=row['section_name']
-            )
-        return None
+        return fetch_model(cls, query, (book_id,))
     
     @classmethod
-    def search(cls, query=None, section_id=None, page=1, per_page=12):
-        """Search books by title, author, or ISBN, and optionally filter by section"""
-        params = []
-        where_clauses = []
-        
-        if query:
-            where_clauses.append("(b.title ILIKE %s OR b.author ILIKE %s OR b.isbn ILIKE %s)")
-            params.extend([f'%{query}%', f'%{query}%', f'%{query}%'])
-        
-        if section_id:
-            where_clauses.append("b.section_id = %s")
-            params.append(section_id)
+    def search(cls, query=None, section_id=None, page=1, per_page=12, cursor=None, count_mode=None,
+               available_only=False):
+        """Search books by title, author, or ISBN, and optionally filter by section or availability.
         
-        where_clause = " AND ".join(where_clauses) if where_clauses else "1=1"
+        Pages can be addressed by number (LIMIT/OFFSET) or by an opaque `cursor` token
+        from a previous result, which seeks on (title, id) so deep pages stay cheap.
+        Results are cached until a write to books invalidates them.
+        """
+        return cached(
+            search_cache,
+            (query, section_id, page, per_page, cursor, count_mode, available_only),
+            search_scopes(section_id),
+            lambda: cls._search(query, section_id, page, per_page, cursor, count_mode, available_only)
+        )
+    
+    @classmethod
+    def _search(cls, query=None, section_id=None, page=1, per_page=12, cursor=None, count_mode=None,
+                available_only=False):
+        """Run a book search against the database (see Book.search)"""
+        position = decode_cursor(cursor) if cursor else None
+        where_clause, params, rank_params = search_filter(query, section_id, available_only)
+        if position:
+            # Relevance ordering has no stable seek key, so ranked results paginate by offset only
+            rank_params = []
+        order_by = SEARCH_RANK_ORDER if rank_params else "b.title, b.id"
         
         # Count total matches
-        count_query = f"""
-        SELECT COUNT(*) 
-        FROM books b
-        WHERE {where_clause}
-        """
-        count = execute_query(count_query, params)[0][0]
+        count = cls.count_matching(where_clause, params, count_mode)
         
-        # Get paginated results
-        offset = (page - 1) * per_page
-        params.extend([per_page, offset])
+        # Get one row more than a page to learn whether another page follows
+        select_params = list(params)
+        if position:
+            page = position['page']
+            backwards = position['direction'] == 'prev'
+            seek_clause = "(b.title, b.id) < (%s, %s)" if backwards else "(b.title, b.id) > (%s, %s)"
+            where_clause = f"{where_clause} AND {seek_clause}"
+            select_params.extend([position['title'], position['id']])
+            order_by = "b.title DESC, b.id DESC" if backwards else "b.title, b.id"
+            select_params.append(per_page + 1)
+            limit_clause = "LIMIT %s"
+        else:
+            backwards = False
+            select_params.extend(rank_params)
+            select_params.extend([per_page + 1, (page - 1) * per_page])
+            limit_clause = "LIMIT %s OFFSET %s"
         
         query = f"""
-        SELECT b.*, s.name as section_name
+        SELECT {BOOK_COLUMNS}, s.name as section_name
         FROM books b
         JOIN sections s ON b.section_id = s.id
         WHERE {where_clause}
-        ORDER BY b.title
-        LIMIT %s OFFSET %s
+        ORDER BY {order_by}
+        {limit_clause}
         """
         
-        result = execute_query(query, params)
+        books = fetch_models(cls, query, select_params)
+        has_more = len(books) > per_page
+        books = books[:per_page]
         
-        books = [
-            cls(
-                id=row['id'],
-                title=row['title'],
-                author=row['author'],
-                isbn=row['isbn'],
-                genre=row['genre'],
-                section_id=row['section_id'],
-                available=row['available'],
-                created_at=row['created_at'],
-                updated_at=row['updated_at'],
-                section_name=row['section_name']
-            )
-            for row in result
-        ]
+        if backwards:
+            books.reverse()
+            has_next, has_prev = True, has_more
+            if not has_prev:
+                page = 1
+        else:
+            has_next, has_prev = has_more, page > 1
+        
+        # Seek cursors are only meaningful when results are ordered by (title, id)
+        next_cursor = prev_cursor = None
+        if books and not rank_params:
+            if has_next:
+                next_cursor = encode_cursor('next', books[-1].title, books[-1].id, page + 1)
+            if has_prev:
+                prev_cursor = encode_cursor('prev', books[0].title, books[0].id, page - 1)
         
         # Return a pagination-like object
         return {
@@ -783,34 +1436,29 @@ class Book:
             'page': page,
             'per_page': per_page,
             'total': count,
-            'pages': (count + per_page - 1) // per_page
+            'pages': (count + per_page - 1) // per_page,
+            'has_next': has_next,
+            'has_prev': has_prev,
+            'next_cursor': next_cursor,
+            'prev_cursor': prev_cursor
         }
     
-    @classmethod
-    def get_by_id(cls, book_id):
-        """Get book by ID"""
-        query = """
-        SELECT b.*, s.name as section_name
+    @staticmethod
+    def count_matching(where_clause, params, count_mode=None):
+        """Count books matching a WHERE clause, exactly or from planner estimates"""
+        count_mode = count_mode or PAGINATION_SETTINGS['count_mode']
+        if count_mode == 'estimated':
+            estimate = estimate_count(f"SELECT 1 FROM books b WHERE {where_clause}", params)
+            # Small results are cheap to count exactly, and that is where estimates are least accurate
+            if estimate >= PAGINATION_SETTINGS['exact_count_threshold']:
+                return estimate
+        
+        count_query = f"""
+        SELECT COUNT(*) 
         FROM books b
-        JOIN sections s ON b.section_id = s.id
-        WHERE b.id = %s
+        WHERE {where_clause}
         """
-        result = execute_query(query, (book_id,))
-        if result:
-            row = result[0]
-            return cls(
-                id=row['id'],
-                title=row['title'],
-                author=row['author'],
-                isbn=row['isbn'],
-                genre=row['genre'],
-                section_id=row['section_id'],
-                available=row['available'],
-                created_at=row['created_at'],
-                updated_at=row['updated_at'],
-                section_name=row['section_name']
-            )
-        return None
+        return execute_query(count_query, params)[0][0]
     
     def create(self):
         """Create a new book"""
@@ -829,16 +1477,21 @@ class Book:
             self.id = row['id']
             self.created_at = row['created_at']
             self.updated_at = row['updated_at']
+            invalidate_books(self.section_id)
+            invalidate_section_counts()
+            self._reindex()
             return True
         return False
     
     def update(self):
         """Update book"""
+        # Self-join so RETURNING can report the section the book is moving out of
         query = """
-        UPDATE books
+        UPDATE books b
         SET title = %s, author = %s, isbn = %s, genre = %s, section_id = %s, available = %s, updated_at = CURRENT_TIMESTAMP
-        WHERE id = %s
-        RETURNING updated_at
+        FROM books old
+        WHERE b.id = %s AND old.id = b.id
+        RETURNING b.updated_at, old.section_id AS old_section_id
         """
         
         logger.info(f"Updating book ID {self.id}: {self.title}")
@@ -856,6 +1509,10 @@ class Book:
                     self.updated_at = result['updated_at']
                     conn.commit()  # Explicitly commit the transaction
                     logger.info(f"Book update committed to database: ID {self.id}")
+                    invalidate_books(self.section_id, result['old_section_id'])
+                    if self.section_id != result['old_section_id']:
+                        invalidate_section_counts()
+                    self._reindex()
                     return True
                 else:
                     conn.rollback()
@@ -869,30 +1526,85 @@ class Book:
     def delete(self):
         """Delete book"""
         query = "DELETE FROM books WHERE id = %s"
-        return execute_query(query, (self.id,), fetch=False, commit=True) > 0
+        deleted = execute_query(query, (self.id,), fetch=False, commit=True) > 0
+        if deleted:
+            invalidate_books(self.section_id)
+            invalidate_section_counts()
+            book_index.remove(self.id)
+        return deleted
+    
+    def _reindex(self):
+        """Push this book's current state into the type-ahead index"""
+        if book_index.ready:
+            section = Section.get_many([self.section_id]).get(self.section_id)
+            book_index.add(self, section_name=section.name if section else None)
     
     def purchase(self, user_id):
         """Purchase this book for the specified user"""
         success, message = purchase_book(user_id, self.id)
         return success, message
 
+def encode_cursor(direction, title, book_id, page):
+    """Build an opaque seek token for the page after ('next') or before ('prev') a (title, id) key"""
+    payload = json.dumps([direction, title, book_id, page], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+# Largest book id or page a cursor may carry (PostgreSQL integer)
+CURSOR_MAX_VALUE = 2 ** 31 - 1
+
+def decode_cursor(token):
+    """Decode a seek token, or return None if it is malformed or out of range"""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        direction, title, book_id, page = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        if direction not in ('next', 'prev') or not isinstance(title, str):
+            return None
+        book_id, page = int(book_id), int(page)
+        if not (0 < book_id <= CURSOR_MAX_VALUE and 0 < page <= CURSOR_MAX_VALUE):
+            raise ValueError('cursor value out of range')
+        return {'direction': direction, 'title': title, 'id': book_id, 'page': page}
+    except (ValueError, TypeError, UnicodeError, OverflowError):
+        logger.warning(f"Ignoring malformed pagination cursor: {token!r}")
+        return None
+
 # Helper class for pagination to mimic SQLAlchemy's pagination
 class Pagination:
-    def __init__(self, items, page, per_page, total):
+    def __init__(self, items, page, per_page, total, has_next=None, has_prev=None,
+                 next_cursor=None, prev_cursor=None):
         self.items = items
         self.page = page
         self.per_page = per_page
         self.total = total
         self.pages = (total + per_page - 1) // per_page
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+        self._has_next = has_next
+        self._has_prev = has_prev
+        
+        # Estimated totals can undershoot; never report fewer pages than we have seen
+        if items and has_next is not None:
+            self.pages = max(self.pages, page + 1 if has_next else page)
     
     @property
     def has_prev(self):
+        if self._has_prev is not None:
+            return self._has_prev
         return self.page > 1
     
     @property
     def has_next(self):
+        if self._has_next is not None:
+            return self._has_next
         return self.page < self.pages
     
+    @property
+    def prev_num(self):
+        return self.page - 1 if self.has_prev else None
+    
+    @property
+    def next_num(self):
+        return self.page + 1 if self.has_next else None
+    
     def iter_pages(self, left_edge=2, left_current=2, right_current=5, right_edge=2):
         last = 0
         for num in range(1, self.pages + 1):
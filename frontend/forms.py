@@ -1,6 +1,6 @@
 from flask_wtf import FlaskForm
-from wtforms import StringField, PasswordField, BooleanField, SubmitField, SelectField, TextAreaField
-from wtforms.validators import DataRequired, Email, EqualTo, Length, ValidationError
+from wtforms import StringField, PasswordField, BooleanField, SubmitField, SelectField, TextAreaField, DecimalField
+from wtforms.validators import DataRequired, Email, EqualTo, Length, ValidationError, NumberRange, InputRequired
 from db import User, Section
 
 # Login form
@@ -41,9 +41,15 @@ class BookForm(FlaskForm):
 
     def __init__(self, *args, **kwargs):
         super(BookForm, self).__init__(*args, **kwargs)
-        # Get all sections from the database
-        sections = Section.get_all()
-        self.section_id.choices = [(s.id, s.name) for s in sections]
+        # Get all sections from the cached section catalog
+        self.section_id.choices = Section.choices()
+        # The catalog may be cached per worker and miss a section created through another one;
+        # accept any section that exists rather than failing the submission
+        section_id = self.section_id.data
+        if section_id is not None and section_id not in dict(self.section_id.choices):
+            section = Section.get_by_id(section_id)
+            if section:
+                self.section_id.choices.append((section.id, section.name))
 
 # Section form
 class SectionForm(FlaskForm):
@@ -69,9 +75,8 @@ class SearchForm(FlaskForm):
 
     def __init__(self, *args, **kwargs):
         super(SearchForm, self).__init__(*args, **kwargs)
-        # Get all sections from the database
-        sections = Section.get_all()
-        self.section.choices = [(0, 'All Sections')] + [(s.id, s.name) for s in sections]
+        # Get all sections from the cached section catalog
+        self.section.choices = [(0, 'All Sections')] + Section.choices()
 
 # Librarian Creation Form (for admin use)
 class LibrarianCreationForm(FlaskForm):
@@ -80,4 +85,10 @@ class LibrarianCreationForm(FlaskForm):
     password = PasswordField('Password', validators=[DataRequired(), Length(min=8)])
     password2 = PasswordField('Confirm Password', validators=[DataRequired(), EqualTo('password')])
     role = SelectField('Role', validators=[DataRequired()])
-    submit = SubmitField('Create Account')
\ No newline at end of file
+    submit = SubmitField('Create Account')
+
+# Purchase Settings Form (for admin use)
+class PurchaseSettingsForm(FlaskForm):
+    allow_student_purchases = BooleanField('Allow Student Purchases')
+    default_book_price = DecimalField('Default Book Price', places=2, validators=[InputRequired(), NumberRange(min=0)])
+    submit = SubmitField('Save Settings')
@@ -1,8 +1,11 @@
 import os
 import sys
 import logging
+
+# The development server applies pending migrations itself; deployments run `python migrate.py`
+os.environ.setdefault('DB_AUTO_MIGRATE', '1')
+
 from app import app
-import db  # Import the entire module instead of specific functions
 
 # Configure logging
 logging.basicConfig(
@@ -26,13 +29,6 @@ if __name__ == "__main__":
         else:
             logger.info(f"Template directory found: {template_dir}")
         
-        # Initialize database
-        logger.info("Initializing database tables...")
-        db.create_tables()
-        
-        logger.info("Initializing purchase system...")
-        db.initialize_purchase_system()
-        
         # Register blueprint URLs for debugging
         logger.info("Registered routes:")
         for rule in app.url_map.iter_rules():
@@ -0,0 +1,406 @@
+"""Prometheus metrics for the web app, served at /metrics in the text exposition format.
+
+Recording is lock-free: every thread updates its own shard of counters, and
+shards are only summed when a snapshot is taken. When a thread exits its shard
+is folded into a per-process total, so a thread-per-request server does not
+accumulate shards. Each worker process writes its snapshot to METRICS_DIR every
+METRICS_FLUSH_INTERVAL seconds, and whichever worker answers a scrape merges
+the other workers' files with its own live numbers. Files left by workers that
+have exited are folded into one retired total, so their counters are kept and
+totals never go backwards; their gauges are dropped.
+
+/metrics exposes endpoint names, query counts and pool internals, so it is only
+served to a signed-in administrator, to a scraper sending METRICS_TOKEN as a
+bearer token, or to a client address in METRICS_ALLOW.
+"""
+import os
+import json
+import time
+import hmac
+import fcntl
+import weakref
+import logging
+import tempfile
+import ipaddress
+import threading
+from flask import g, request, Response
+from flask_login import current_user
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+METRICS_SETTINGS = {
+    'enabled': os.environ.get('METRICS_ENABLED', '1') == '1',
+    # Shared by every worker; by default one directory per server (the workers' parent process)
+    'dir': os.environ.get('METRICS_DIR', ''),
+    'flush_interval': float(os.environ.get('METRICS_FLUSH_INTERVAL', 5)),
+    # Scrapers send "Authorization: Bearer <token>"; empty = no token access
+    'token': os.environ.get('METRICS_TOKEN', ''),
+    # Comma-separated addresses or networks allowed without a token. Behind a reverse proxy on the
+    # same host every request comes from the proxy's address, so do not list that here.
+    'allow': [ipaddress.ip_network(network.strip(), strict=False)
+              for network in os.environ.get('METRICS_ALLOW', '').split(',') if network.strip()],
+    'buckets': [float(b) for b in os.environ.get(
+        'METRICS_LATENCY_BUCKETS', '0.005,0.01,0.025,0.05,0.1,0.25,0.5,1,2.5,5,10'
+    ).split(',')]
+}
+
+HELP = {
+    'http_requests_total': ('counter', 'Requests handled, by endpoint, method and status'),
+    'http_request_duration_seconds': ('histogram', 'Request latency by endpoint'),
+    'db_queries_total': ('counter', 'Database queries run while serving requests, by endpoint'),
+    'db_query_seconds_total': ('counter', 'Time spent in database queries while serving requests, by endpoint'),
+    'db_pool_wait_seconds_total': ('counter', 'Time requests spent waiting for a pooled connection, by endpoint'),
+    'db_pool_checkouts_total': ('counter', 'Connections checked out of the pool'),
+    'db_pool_timeouts_total': ('counter', 'Pool checkouts that timed out'),
+    'db_pool_connections': ('gauge', 'Open pooled connections by state'),
+    'db_pool_max_connections': ('gauge', 'Pool size limit per worker'),
+    'db_replica_ejections_total': ('counter', 'Times a read replica was taken out of rotation for lag or errors'),
+    'cache_hits_total': ('counter', 'Cache hits by cache'),
+    'cache_misses_total': ('counter', 'Cache misses by cache'),
+    'cache_invalidations_total': ('counter', 'Cache invalidations by cache'),
+    'cache_errors_total': ('counter', 'Cache backend errors by cache'),
+    'cache_hit_ratio': ('gauge', 'Hits / lookups by cache, across all workers'),
+    'metrics_workers': ('gauge', 'Worker processes contributing live numbers to this scrape')
+}
+
+class _Shard:
+    """One thread's counters; only that thread ever writes to it"""
+
+    __slots__ = ('counters', 'histograms')
+
+    def __init__(self):
+        self.counters = {}     # (name, labels) -> value
+        self.histograms = {}   # (name, labels) -> [per-bucket counts..., +Inf count, sum]
+
+class _ThreadSentinel:
+    """Lives in a thread-local, so it is freed when its thread exits"""
+
+    __slots__ = ('__weakref__',)
+
+_local = threading.local()
+_shards = []
+_retired = _Shard()                # counts from threads that have exited
+_shards_lock = threading.RLock()   # taken when a thread starts or stops recording, and by snapshots
+
+def _fold(total, counters, histograms):
+    """Add counters and histograms into a _Shard"""
+    for key, value in counters.items():
+        total.counters[key] = total.counters.get(key, 0) + value
+    for key, entry in histograms.items():
+        current = total.histograms.get(key)
+        total.histograms[key] = list(entry) if current is None else [a + b for a, b in zip(current, entry)]
+
+def _retire(shard):
+    """Fold an exited thread's shard into the process total"""
+    with _shards_lock:
+        _fold(_retired, shard.counters, shard.histograms)
+        _shards.remove(shard)
+
+def _shard():
+    shard = getattr(_local, 'shard', None)
+    if shard is None:
+        shard = _local.shard = _Shard()
+        _local.sentinel = _ThreadSentinel()
+        with _shards_lock:
+            _shards.append(shard)
+        weakref.finalize(_local.sentinel, _retire, shard)
+    return shard
+
+def inc(name, labels=(), value=1):
+    """Add to a counter; `labels` is a tuple of (label, value) pairs"""
+    counters = _shard().counters
+    key = (name, labels)
+    counters[key] = counters.get(key, 0) + value
+
+def observe(name, labels, value):
+    """Record one observation in a histogram"""
+    histograms = _shard().histograms
+    key = (name, labels)
+    entry = histograms.get(key)
+    buckets = METRICS_SETTINGS['buckets']
+    if entry is None:
+        entry = histograms[key] = [0] * (len(buckets) + 2)
+    for index, bound in enumerate(buckets):
+        if value <= bound:
+            entry[index] += 1
+            break
+    else:
+        entry[len(buckets)] += 1
+    entry[-1] += value
+
+def _process_samples():
+    """Counters and gauges read from the db layer and caches at snapshot time"""
+    import db
+    import cache
+    counters = {}
+    gauges = {}
+
+    try:
+        pool = db.pool_stats()
+        counters[('db_pool_checkouts_total', ())] = pool['checkouts']
+        counters[('db_pool_timeouts_total', ())] = pool['timeouts']
+        gauges[('db_pool_connections', (('state', 'in_use'),))] = pool['in_use']
+        gauges[('db_pool_connections', (('state', 'idle'),))] = pool['idle']
+        gauges[('db_pool_max_connections', ())] = pool['maxconn']
+        for replica in pool.get('replicas', ()):
+            counters[('db_replica_ejections_total', (('replica', replica['name']),))] = replica['ejections']
+    except Exception as e:
+        logger.error(f"Error reading pool stats for metrics: {e}")
+
+    for versioned_cache in (cache.search_cache, cache.catalog_cache, cache.user_cache):
+        labels = (('cache', versioned_cache.name),)
+        counters[('cache_hits_total', labels)] = versioned_cache.hits
+        counters[('cache_misses_total', labels)] = versioned_cache.misses
+        counters[('cache_invalidations_total', labels)] = versioned_cache.invalidations
+        counters[('cache_errors_total', labels)] = versioned_cache.errors
+    return counters, gauges
+
+def snapshot():
+    """This process' numbers: summed shards plus process-level samples"""
+    counters, gauges = _process_samples()
+    total = _Shard()
+    total.counters = counters
+    with _shards_lock:
+        # dict() copies atomically under the GIL, so writers never block and never break this loop
+        for shard in (_retired, *_shards):
+            _fold(total, dict(shard.counters), dict(shard.histograms))
+    histograms = total.histograms
+    return {'pid': os.getpid(), 'at': time.time(), 'counters': counters, 'gauges': gauges, 'histograms': histograms}
+
+def _encode(samples):
+    return [[name, list(map(list, labels)), value] for (name, labels), value in samples.items()]
+
+def _decode(items):
+    return {(name, tuple(tuple(pair) for pair in labels)): value for name, labels, value in items}
+
+def _metrics_dir():
+    path = METRICS_SETTINGS['dir'] or os.path.join(tempfile.gettempdir(), f"library-metrics-{os.getppid()}")
+    os.makedirs(path, exist_ok=True)
+    return path
+
+def flush():
+    """Write this worker's snapshot to the shared directory (atomically, via rename)"""
+    data = snapshot()
+    path = os.path.join(_metrics_dir(), f"metrics-{data['pid']}.json")
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump({
+            'pid': data['pid'],
+            'at': data['at'],
+            'counters': _encode(data['counters']),
+            'gauges': _encode(data['gauges']),
+            'histograms': _encode(data['histograms'])
+        }, f)
+    os.replace(tmp_path, path)
+
+RETIRED_FILE = 'retired.json'
+
+def _worker_files(directory):
+    return [name for name in os.listdir(directory) if name.startswith('metrics-') and name.endswith('.json')]
+
+def _read(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def retire_dead_workers(directory):
+    """Fold the files of workers that have exited into the retired total and delete them.
+    
+    Takes the directory's lock exclusively; readers hold it shared, so no scrape
+    sees a worker's counters both in its own file and in the retired total.
+    """
+    with open(os.path.join(directory, '.lock'), 'a') as lock:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return   # another worker is already doing it
+        dead = []
+        for filename in _worker_files(directory):
+            data = _read(os.path.join(directory, filename))
+            if data is not None and data['pid'] != os.getpid() and not _pid_alive(data['pid']):
+                dead.append((filename, data))
+        if not dead:
+            return
+        retired_path = os.path.join(directory, RETIRED_FILE)
+        retired = _read(retired_path) or {'counters': [], 'histograms': []}
+        total = _Shard()
+        _fold(total, _decode(retired['counters']), _decode(retired['histograms']))
+        for _, data in dead:
+            _fold(total, _decode(data['counters']), _decode(data['histograms']))
+        tmp_path = f"{retired_path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({'counters': _encode(total.counters), 'histograms': _encode(total.histograms)}, f)
+        os.replace(tmp_path, retired_path)
+        for filename, _ in dead:
+            os.remove(os.path.join(directory, filename))
+        logger.info(f"Folded metrics from {len(dead)} exited worker(s) into {RETIRED_FILE}")
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+def merged():
+    """This worker's live snapshot merged with every other worker's last flushed one"""
+    data = snapshot()
+    counters, gauges, histograms = data['counters'], data['gauges'], data['histograms']
+    workers = 1
+    others = []
+    try:
+        directory = _metrics_dir()
+        retire_dead_workers(directory)
+        with open(os.path.join(directory, '.lock'), 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_SH)
+            retired = _read(os.path.join(directory, RETIRED_FILE))
+            if retired is not None:
+                others.append(dict(retired, pid=None, gauges=[]))
+            for filename in _worker_files(directory):
+                other = _read(os.path.join(directory, filename))
+                if other is not None and other['pid'] != data['pid']:
+                    others.append(other)
+    except OSError as e:
+        logger.error(f"Error reading metrics directory: {e}")
+
+    total = _Shard()
+    total.counters, total.histograms = counters, histograms
+    for other in others:
+        _fold(total, _decode(other['counters']), _decode(other['histograms']))
+        if other['pid'] is not None and _pid_alive(other['pid']):
+            workers += 1
+            for key, value in _decode(other['gauges']).items():
+                gauges[key] = gauges.get(key, 0) + value
+
+    # Ratios only make sense after summing across workers
+    for (name, labels), hits in list(counters.items()):
+        if name == 'cache_hits_total':
+            lookups = hits + counters.get(('cache_misses_total', labels), 0)
+            gauges[('cache_hit_ratio', labels)] = hits / lookups if lookups else 0.0
+    gauges[('metrics_workers', ())] = workers
+    return counters, gauges, histograms
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _label_text(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+def _number(value):
+    if isinstance(value, float):
+        return repr(value) if value != int(value) else str(int(value))
+    return str(value)
+
+def render():
+    """The merged metrics in Prometheus text format"""
+    counters, gauges, histograms = merged()
+    by_name = {}
+    for samples in (counters, gauges, histograms):
+        for (name, labels), value in samples.items():
+            by_name.setdefault(name, []).append((labels, value))
+
+    buckets = METRICS_SETTINGS['buckets']
+    lines = []
+    for name in sorted(by_name):
+        kind, help_text = HELP.get(name, ('untyped', name))
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for labels, value in sorted(by_name[name]):
+            if kind == 'histogram':
+                cumulative = 0
+                for bound, count in zip(buckets, value):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{_label_text(labels, [('le', _number(bound))])} {cumulative}")
+                cumulative += value[len(buckets)]
+                lines.append(f"{name}_bucket{_label_text(labels, [('le', '+Inf')])} {cumulative}")
+                lines.append(f"{name}_sum{_label_text(labels)} {_number(value[-1])}")
+                lines.append(f"{name}_count{_label_text(labels)} {cumulative}")
+            else:
+                lines.append(f"{name}{_label_text(labels)} {_number(value)}")
+    return '\n'.join(lines) + '\n'
+
+_flusher_pid = None
+
+def _start_flusher():
+    """Flush this worker's snapshot periodically; started once per process, after any fork"""
+    global _flusher_pid
+    if _flusher_pid == os.getpid():
+        return
+    with _shards_lock:
+        if _flusher_pid == os.getpid():
+            return
+        _flusher_pid = os.getpid()
+
+    def run():
+        pid = os.getpid()
+        while _flusher_pid == pid:
+            time.sleep(METRICS_SETTINGS['flush_interval'])
+            try:
+                flush()
+            except Exception as e:
+                logger.error(f"Error flushing metrics: {e}")
+
+    threading.Thread(target=run, name='metrics-flush', daemon=True).start()
+
+def scrape_allowed():
+    """Whether the current request may read /metrics (see the module docstring)"""
+    token = METRICS_SETTINGS['token']
+    scheme, _, supplied = request.headers.get('Authorization', '').partition(' ')
+    if token and scheme.lower() == 'bearer' and hmac.compare_digest(supplied.strip().encode(), token.encode()):
+        return True
+    if METRICS_SETTINGS['allow'] and request.remote_addr:
+        try:
+            address = ipaddress.ip_address(request.remote_addr)
+        except ValueError:
+            address = None
+        if address is not None and any(address in network for network in METRICS_SETTINGS['allow']):
+            return True
+    return current_user.is_authenticated and current_user.is_admin()
+
+def init_app(app):
+    """Time every request and serve /metrics"""
+    if not METRICS_SETTINGS['enabled']:
+        return
+
+    @app.before_request
+    def start_request_timer():
+        _start_flusher()
+        g._metrics_start = time.perf_counter()
+
+    @app.after_request
+    def remember_status(response):
+        g._metrics_status = response.status_code
+        return response
+
+    # At teardown, so streamed responses are timed to their last byte
+    @app.teardown_request
+    def record_request(exception=None):
+        start = getattr(g, '_metrics_start', None)
+        if start is None:
+            return
+        endpoint = request.endpoint or 'unmatched'
+        status = 500 if exception is not None else getattr(g, '_metrics_status', 500)
+        inc('http_requests_total', (('endpoint', endpoint), ('method', request.method), ('status', str(status))))
+        observe('http_request_duration_seconds', (('endpoint', endpoint),), time.perf_counter() - start)
+
+        stats = getattr(g, '_query_stats', None)
+        if stats is not None:
+            labels = (('endpoint', endpoint),)
+            inc('db_queries_total', labels, stats.queries)
+            inc('db_query_seconds_total', labels, stats.db_time)
+            inc('db_pool_wait_seconds_total', labels, stats.pool_wait)
+
+    def metrics():
+        if not scrape_allowed():
+            return Response('Forbidden\n', status=403, mimetype='text/plain')
+        return Response(render(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
+    app.add_url_rule('/metrics', 'metrics', metrics)
@@ -0,0 +1,240 @@
+"""Versioned schema migrations.
+
+Usage (from the frontend directory):
+
+    python migrate.py              # apply every pending migration
+    python migrate.py status       # show the current and latest version
+    python migrate.py upgrade --to 3
+    python migrate.py indexes      # list the managed indexes and how much they are used
+
+Migrations live in migrations/NNNN_description.py and are applied in order,
+each in its own transaction together with its row in schema_version. A
+migration that sets TRANSACTIONAL = False (e.g. CREATE INDEX CONCURRENTLY)
+runs in autocommit mode and must be safe to re-run. An advisory lock lets
+several workers or deploy hooks run this at once safely: processes waiting for
+it poll outside any transaction, because CREATE INDEX CONCURRENTLY in the lock
+holder waits for every open snapshot, including a waiter's. Application
+startup only checks the version (see ensure_current).
+"""
+import os
+import re
+import sys
+import time
+import logging
+import argparse
+import importlib
+
+import psycopg2
+
+import db
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations')
+MIGRATION_FILE_RE = re.compile(r'^(\d{4})_(\w+)\.py$')
+
+# Arbitrary key for pg_advisory_lock, shared by every process that migrates this database
+MIGRATION_LOCK_ID = 0x6c69626d
+MIGRATION_LOCK_POLL = 0.5   # seconds between attempts to take the lock
+
+class SchemaOutOfDate(RuntimeError):
+    """The database is behind the migrations this code expects"""
+
+def discover():
+    """Return [(version, name, module name)] for every migration file, in version order"""
+    migrations = []
+    for filename in os.listdir(MIGRATIONS_DIR):
+        match = MIGRATION_FILE_RE.match(filename)
+        if match:
+            migrations.append((int(match.group(1)), match.group(2), f"migrations.{filename[:-3]}"))
+    migrations.sort()
+    versions = [version for version, _, _ in migrations]
+    if len(versions) != len(set(versions)):
+        raise RuntimeError(f"Duplicate migration versions in {MIGRATIONS_DIR}")
+    return migrations
+
+def latest_version():
+    migrations = discover()
+    return migrations[-1][0] if migrations else 0
+
+def current_version(conn):
+    """The highest applied version, or 0 for a database that has never been migrated"""
+    with db.get_cursor(conn) as cursor:
+        try:
+            cursor.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version")
+            version = cursor.fetchone()[0]
+        except psycopg2.errors.UndefinedTable:
+            version = 0
+    conn.rollback()
+    return version
+
+def acquire_lock(conn):
+    """Take the migration lock, polling in autocommit mode so no snapshot is held between attempts.
+    
+    A session blocked inside pg_advisory_lock() keeps its statement's snapshot, and
+    CREATE INDEX CONCURRENTLY in the lock holder would wait for it forever.
+    """
+    conn.rollback()
+    conn.autocommit = True
+    try:
+        waiting = False
+        while True:
+            with db.get_cursor(conn) as cursor:
+                cursor.execute("SELECT pg_try_advisory_lock(%s)", (MIGRATION_LOCK_ID,))
+                if cursor.fetchone()[0]:
+                    return
+            if not waiting:
+                logger.info("Waiting for another process to finish migrating")
+                waiting = True
+            time.sleep(MIGRATION_LOCK_POLL)
+    finally:
+        conn.autocommit = False
+
+def upgrade(target=None):
+    """Apply pending migrations up to `target` (default: all); returns the versions applied"""
+    migrations = discover()
+    target = target if target is not None else (migrations[-1][0] if migrations else 0)
+    conn = db.get_connection()
+    applied = []
+    acquire_lock(conn)
+    try:
+        with db.get_cursor(conn) as cursor:
+            cursor.execute("""
+            CREATE TABLE IF NOT EXISTS schema_version (
+                version INTEGER PRIMARY KEY,
+                name VARCHAR(128) NOT NULL,
+                applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+            """)
+            conn.commit()
+
+            # Re-read under the lock: another process may have migrated while we waited
+            current = current_version(conn)
+            for version, name, module_name in migrations:
+                if version <= current or version > target:
+                    continue
+                logger.info(f"Applying migration {version:04d} {name}")
+                try:
+                    module = importlib.import_module(module_name)
+                    if getattr(module, 'TRANSACTIONAL', True):
+                        module.upgrade(cursor)
+                    else:
+                        conn.autocommit = True
+                        try:
+                            module.upgrade(cursor)
+                        finally:
+                            conn.autocommit = False
+                    cursor.execute(
+                        "INSERT INTO schema_version (version, name) VALUES (%s, %s)",
+                        (version, name)
+                    )
+                    conn.commit()
+                except Exception as e:
+                    conn.rollback()
+                    logger.error(f"Migration {version:04d} {name} failed: {e}")
+                    raise
+                applied.append(version)
+    finally:
+        conn.rollback()
+        with db.get_cursor(conn) as cursor:
+            cursor.execute("SELECT pg_advisory_unlock(%s)", (MIGRATION_LOCK_ID,))
+        conn.commit()
+
+    if applied:
+        # Roles and users may have been created underneath the in-process registries
+        db.role_registry.invalidate()
+        logger.info(f"Database migrated to version {applied[-1]}")
+    return applied
+
+def managed_indexes():
+    """Return [(name, table, definition, serves)] for the indexes declared by migrations"""
+    indexes = []
+    for _, _, module_name in discover():
+        indexes.extend(getattr(importlib.import_module(module_name), 'INDEXES', []))
+    return indexes
+
+def index_status(conn):
+    """Report each managed index: whether it exists and is valid, its size and scan count"""
+    indexes = managed_indexes()
+    with db.get_cursor(conn) as cursor:
+        cursor.execute("""
+        SELECT c.relname, i.indisvalid, pg_relation_size(c.oid), COALESCE(s.idx_scan, 0)
+        FROM pg_class c
+        JOIN pg_index i ON i.indexrelid = c.oid
+        LEFT JOIN pg_stat_user_indexes s ON s.indexrelid = c.oid
+        WHERE c.relname = ANY(%s)
+        """, ([name for name, _, _, _ in indexes],))
+        found = {row[0]: row[1:] for row in cursor.fetchall()}
+    conn.rollback()
+    return [
+        {
+            'name': name,
+            'table': table,
+            'definition': definition,
+            'serves': serves,
+            'status': ('valid' if found[name][0] else 'invalid') if name in found else 'missing',
+            'size': found[name][1] if name in found else None,
+            'scans': found[name][2] if name in found else None
+        }
+        for name, table, definition, serves in indexes
+    ]
+
+def ensure_current(auto_migrate=False):
+    """Startup check: one query, plus the migrations themselves only if `auto_migrate` is set.
+
+    Raises SchemaOutOfDate if the database is behind and auto_migrate is off.
+    """
+    conn = db.get_connection()
+    try:
+        current = current_version(conn)
+    finally:
+        db.release_connection()
+    latest = latest_version()
+    if current >= latest:
+        return current
+    if not auto_migrate:
+        raise SchemaOutOfDate(
+            f"Database schema is at version {current} but the code expects {latest}; run `python migrate.py`"
+        )
+    try:
+        upgrade()
+    finally:
+        db.release_connection()
+    return latest
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest='command')
+    upgrade_parser = subparsers.add_parser('upgrade', help='apply pending migrations (the default)')
+    upgrade_parser.add_argument('--to', type=int, dest='target', help='stop after this version')
+    subparsers.add_parser('status', help='show the current and latest schema version')
+    subparsers.add_parser('indexes', help='show the managed indexes, their state and usage')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(levelname)s %(message)s')
+    try:
+        if args.command == 'status':
+            current = current_version(db.get_connection())
+            print(f"current version: {current}")
+            for version, name, _ in discover():
+                print(f"  {'applied' if version <= current else 'pending'}  {version:04d} {name}")
+            return 0 if current >= latest_version() else 1
+
+        if args.command == 'indexes':
+            report = index_status(db.get_connection())
+            for index in report:
+                size = f"{index['size'] / 1024:.0f} kB" if index['size'] is not None else '-'
+                print(f"{index['name']:<28}{index['status']:<9}{size:>10}{index['scans'] or 0:>10} scans  "
+                      f"{index['table']} {index['definition']}")
+                print(f"    serves {index['serves']}")
+            return 0 if all(index['status'] == 'valid' for index in report) else 1
+
+        applied = upgrade(getattr(args, 'target', None))
+        print(f"applied {len(applied)} migration(s); database at version {current_version(db.get_connection())}")
+        return 0
+    finally:
+        db.release_connection()
+
+if __name__ == '__main__':
+    sys.exit(main())
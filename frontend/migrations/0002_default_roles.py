@@ -0,0 +1,14 @@
+"""The Admin, Librarian and Student roles"""
+
+ROLES = [
+    ("Admin", "System administrator with full privileges"),
+    ("Librarian", "Library staff with management access"),
+    ("Student", "Library user with limited access")
+]
+
+def upgrade(cursor):
+    for name, description in ROLES:
+        cursor.execute(
+            "INSERT INTO roles (name, description) VALUES (%s, %s) ON CONFLICT (name) DO NOTHING",
+            (name, description)
+        )
@@ -0,0 +1,43 @@
+"""Full-text search column and indexes used by Book.search"""
+import logging
+import psycopg2
+from db import SEARCH_SETTINGS
+
+logger = logging.getLogger(__name__)
+
+def upgrade(cursor):
+    # SEARCH_TS_CONFIG comes from the environment: it must name an existing text search configuration,
+    # and reaches the DDL only as a quoted literal
+    ts_config = SEARCH_SETTINGS['ts_config']
+    cursor.execute("""
+    SELECT EXISTS (
+        SELECT 1 FROM pg_ts_config c JOIN pg_namespace n ON n.oid = c.cfgnamespace
+        WHERE c.cfgname = %(name)s OR n.nspname || '.' || c.cfgname = %(name)s
+    )
+    """, {'name': ts_config})
+    if not cursor.fetchone()[0]:
+        raise RuntimeError(f"SEARCH_TS_CONFIG is not a text search configuration: {ts_config!r}")
+    
+    # Weighted tsvector kept up to date by PostgreSQL on every insert/update
+    cursor.execute("""
+    ALTER TABLE books ADD COLUMN IF NOT EXISTS search_vector tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector(%(ts_config)s::regconfig, coalesce(title, '')), 'A') ||
+        setweight(to_tsvector(%(ts_config)s::regconfig, coalesce(author, '')), 'B') ||
+        setweight(to_tsvector('simple', coalesce(isbn, '')), 'C')
+    ) STORED
+    """, {'ts_config': ts_config})
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_books_search_vector ON books USING GIN (search_vector)")
+    
+    # Trigram indexes let substring (ILIKE '%q%') matches use an index instead of a scan.
+    # pg_trgm is optional, so a failure here must not abort the migration.
+    cursor.execute("SAVEPOINT trigram")
+    try:
+        cursor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_books_title_trgm ON books USING GIN (title gin_trgm_ops)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_books_author_trgm ON books USING GIN (author gin_trgm_ops)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_books_isbn_trgm ON books USING GIN (isbn gin_trgm_ops)")
+        cursor.execute("RELEASE SAVEPOINT trigram")
+    except psycopg2.Error as e:
+        cursor.execute("ROLLBACK TO SAVEPOINT trigram")
+        logger.warning(f"Trigram indexes not created, substring search will not be indexed: {e}")
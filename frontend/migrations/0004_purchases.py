@@ -0,0 +1,28 @@
+"""Purchases and the purchase settings row"""
+
+def upgrade(cursor):
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS purchases (
+        id SERIAL PRIMARY KEY,
+        user_id INTEGER REFERENCES users(id) NOT NULL,
+        book_id INTEGER REFERENCES books(id) NOT NULL,
+        purchase_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        price NUMERIC(10, 2) NOT NULL,
+        status VARCHAR(20) DEFAULT 'completed',
+        UNIQUE(user_id, book_id)
+    )
+    """)
+    
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS purchase_settings (
+        id SERIAL PRIMARY KEY,
+        allow_student_purchases BOOLEAN DEFAULT TRUE,
+        default_book_price NUMERIC(10, 2) DEFAULT 9.99
+    )
+    """)
+    
+    cursor.execute("""
+    INSERT INTO purchase_settings (allow_student_purchases, default_book_price)
+    SELECT true, 9.99
+    WHERE NOT EXISTS (SELECT 1 FROM purchase_settings)
+    """)
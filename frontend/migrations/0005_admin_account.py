@@ -0,0 +1,20 @@
+"""Initial admin account, created only if no admin exists"""
+import logging
+import passwords
+
+logger = logging.getLogger(__name__)
+
+def upgrade(cursor):
+    cursor.execute("""
+    SELECT r.id, EXISTS (SELECT 1 FROM users u WHERE u.role_id = r.id)
+    FROM roles r WHERE r.name = 'Admin'
+    """)
+    row = cursor.fetchone()
+    if row is None or row[1]:
+        return
+    
+    cursor.execute(
+        "INSERT INTO users (username, email, password_hash, role_id) VALUES (%s, %s, %s, %s)",
+        ("admin", "admin@librarylens.com", passwords.hash_password("admin@password"), row[0])
+    )
+    logger.info("Created initial admin account (username: admin)")
@@ -0,0 +1,46 @@
+"""Secondary indexes for the hot listing, dashboard and purchase-history queries.
+
+Built with CREATE INDEX CONCURRENTLY so upgrading a live database does not
+block writes to books or purchases; that cannot run inside a transaction,
+hence TRANSACTIONAL = False.
+"""
+
+TRANSACTIONAL = False
+
+# (name, table, definition, the queries it serves)
+INDEXES = [
+    (
+        'idx_books_section_title', 'books', '(section_id, title, id)',
+        "Book.get_by_section (WHERE section_id ORDER BY title); Book.search with a section "
+        "filter, keyset-paginated on (title, id); Section.count_books and the Section._catalog "
+        "count join; the section_id foreign key check when a section is deleted"
+    ),
+    (
+        'idx_books_title_id', 'books', '(title, id)',
+        "Book.search / Book.get_all without a section filter: ORDER BY title, id and the "
+        "(title, id) > cursor seek, so each page reads only its own rows"
+    ),
+    (
+        'idx_books_available_title', 'books', '(title, id) WHERE available',
+        "The student dashboard listing (WHERE available ORDER BY title); partial, so sold "
+        "books do not take up space in it"
+    ),
+    (
+        'idx_purchases_user_date', 'purchases', '(user_id, purchase_date DESC)',
+        "The /student/purchases history (WHERE user_id ORDER BY purchase_date DESC)"
+    )
+]
+
+def upgrade(cursor):
+    for name, table, definition, serves in INDEXES:
+        # A failed concurrent build leaves an INVALID index behind that IF NOT EXISTS would keep
+        cursor.execute("""
+        SELECT NOT i.indisvalid FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid
+        WHERE c.relname = %s
+        """, (name,))
+        row = cursor.fetchone()
+        if row and row[0]:
+            cursor.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
+        
+        cursor.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {table} {definition}")
+        cursor.execute(f"COMMENT ON INDEX {name} IS %s", (f"Serves {serves}",))
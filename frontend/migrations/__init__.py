@@ -0,0 +1,6 @@
+"""Ordered schema migrations, applied by migrate.py.
+
+Each module is named NNNN_description.py and defines `upgrade(cursor)`, which
+runs inside the same transaction that records its version in schema_version.
+Never edit a migration that has shipped; add a new one instead.
+"""
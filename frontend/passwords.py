@@ -0,0 +1,86 @@
+import os
+import logging
+import threading
+import multiprocessing
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from werkzeug.security import generate_password_hash, check_password_hash
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Password hashing settings. `method` uses werkzeug's syntax, e.g. 'scrypt:32768:8:1' or 'pbkdf2:sha256:600000'.
+# Hashes made with any other method are upgraded the next time their owner logs in.
+# `workers` is per application process: with N web workers up to N x workers hashes run at once,
+# so the default leaves most cores to browsing.
+PASSWORD_SETTINGS = {
+    'method': os.environ.get('PASSWORD_HASH_METHOD', 'scrypt:32768:8:1'),
+    'workers': int(os.environ.get('PASSWORD_HASH_WORKERS', 0)) or max(1, (os.cpu_count() or 1) // 4),  # 0 = a quarter of the CPUs
+    'max_pending': int(os.environ.get('PASSWORD_HASH_MAX_PENDING', 64)),
+    'offload': os.environ.get('PASSWORD_HASH_OFFLOAD', '1') == '1'
+}
+
+# Hashing processes are never forked from a web worker: a fork copies locks held by its other
+# threads (logging, the connection pool, the purchase settings listener) and can deadlock the child
+_MP_CONTEXT = multiprocessing.get_context(
+    'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+)
+
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+_pending = threading.BoundedSemaphore(PASSWORD_SETTINGS['max_pending'])
+
+def _get_executor():
+    """Get the hashing process pool, recreating it in a forked worker"""
+    global _executor, _executor_pid
+    if _executor is None or _executor_pid != os.getpid():
+        with _executor_lock:
+            if _executor is None or _executor_pid != os.getpid():
+                _executor = ProcessPoolExecutor(max_workers=PASSWORD_SETTINGS['workers'], mp_context=_MP_CONTEXT)
+                _executor_pid = os.getpid()
+    return _executor
+
+def _run(func, *args):
+    """Run a hashing function on the process pool, blocking only the calling request thread.
+
+    At most `max_pending` jobs are queued at once; further callers wait their turn,
+    which caps the CPU a login burst can take from the rest of the app.
+    """
+    global _executor
+    if not PASSWORD_SETTINGS['offload']:
+        return func(*args)
+    with _pending:
+        try:
+            return _get_executor().submit(func, *args).result()
+        except BrokenProcessPool as e:
+            logger.error(f"Password hashing pool failed, hashing inline: {e}")
+            with _executor_lock:
+                _executor = None
+            return func(*args)
+
+def hash_password(password):
+    """Hash a password with the configured method"""
+    return _run(generate_password_hash, password, PASSWORD_SETTINGS['method'])
+
+def verify_password(password_hash, password):
+    """Check a password against a stored hash"""
+    return _run(check_password_hash, password_hash, password)
+
+@lru_cache(maxsize=8)
+def method_prefix(method):
+    """The fully parameterised form werkzeug stores for `method`, e.g. 'scrypt' -> 'scrypt:32768:8:1'"""
+    return generate_password_hash('', method).split('$', 1)[0]
+
+def needs_rehash(password_hash):
+    """Whether a stored hash was made with a different method or cost than the current one"""
+    return password_hash.split('$', 1)[0] != method_prefix(PASSWORD_SETTINGS['method'])
+
+def shutdown():
+    """Stop the hashing process pool"""
+    global _executor
+    with _executor_lock:
+        if _executor is not None and _executor_pid == os.getpid():
+            _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
@@ -0,0 +1,151 @@
+import os
+import json
+import time
+import select
+import logging
+import threading
+from decimal import Decimal
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Purchase settings cache. Changes made through update() reach every worker at once over
+# LISTEN/NOTIFY; `ttl` bounds how stale a worker can be if a notification is ever missed
+# (listener reconnecting, or settings edited directly in the database).
+SETTINGS_CONFIG = {
+    'ttl': float(os.environ.get('PURCHASE_SETTINGS_TTL', 60)),
+    'listen': os.environ.get('PURCHASE_SETTINGS_LISTEN', '1') == '1',
+    'channel': 'purchase_settings_changed'
+}
+
+class PurchaseSettings:
+    """Per-worker copy of the single purchase_settings row"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._values = None
+        self._loaded_at = 0.0
+        self._listener_pid = None
+        self.loads = 0
+        self.notifications = 0
+
+    def get(self):
+        """Current settings as {'allow_student_purchases', 'default_book_price'}"""
+        self._ensure_listener()
+        values = self._values
+        if values is not None and time.monotonic() - self._loaded_at < SETTINGS_CONFIG['ttl']:
+            return values
+        with self._lock:
+            if self._values is None or time.monotonic() - self._loaded_at >= SETTINGS_CONFIG['ttl']:
+                self._load()
+            return self._values
+
+    def _load(self):
+        from db import execute_query
+        rows = execute_query(
+            "SELECT allow_student_purchases, default_book_price FROM purchase_settings ORDER BY id LIMIT 1"
+        )
+        if rows:
+            values = {
+                'allow_student_purchases': bool(rows[0]['allow_student_purchases']),
+                'default_book_price': rows[0]['default_book_price']
+            }
+        else:
+            values = {'allow_student_purchases': False, 'default_book_price': Decimal('0.00')}
+        self._values = values
+        self._loaded_at = time.monotonic()
+        self.loads += 1
+
+    def invalidate(self):
+        """Drop the cached copy so the next get() reloads it"""
+        self._values = None
+
+    def apply(self, values):
+        """Install settings received from a change notification"""
+        self._values = {
+            'allow_student_purchases': bool(values['allow_student_purchases']),
+            'default_book_price': Decimal(str(values['default_book_price']))
+        }
+        self._loaded_at = time.monotonic()
+
+    def update(self, allow_student_purchases=None, default_book_price=None):
+        """Change the stored settings and tell every worker about it; returns the new settings"""
+        from db import get_connection, get_cursor
+        conn = get_connection()
+        try:
+            with get_cursor(conn) as cursor:
+                cursor.execute("""
+                UPDATE purchase_settings
+                SET allow_student_purchases = COALESCE(%s, allow_student_purchases),
+                    default_book_price = COALESCE(%s, default_book_price)
+                WHERE id = (SELECT id FROM purchase_settings ORDER BY id LIMIT 1)
+                RETURNING allow_student_purchases, default_book_price
+                """, (allow_student_purchases, default_book_price))
+                row = cursor.fetchone()
+                if row is None:
+                    raise ValueError("purchase_settings has no row to update")
+                values = {
+                    'allow_student_purchases': row['allow_student_purchases'],
+                    'default_book_price': str(row['default_book_price'])
+                }
+                # Delivered to listeners only when the update commits
+                cursor.execute("SELECT pg_notify(%s, %s)", (SETTINGS_CONFIG['channel'], json.dumps(values)))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        self.apply(values)
+        logger.info(f"Purchase settings updated: {values}")
+        return self._values
+
+    def _ensure_listener(self):
+        """Start the notification listener once per worker process"""
+        if not SETTINGS_CONFIG['listen'] or self._listener_pid == os.getpid():
+            return
+        with self._lock:
+            if self._listener_pid == os.getpid():
+                return
+            self._listener_pid = os.getpid()
+        threading.Thread(target=self._listen, name='purchase-settings-listener', daemon=True).start()
+
+    def _listen(self):
+        """Apply change notifications as they arrive, reconnecting after errors"""
+        from db import _connect
+        pid = os.getpid()
+        while self._listener_pid == pid:
+            conn = None
+            try:
+                conn = _connect()
+                conn.autocommit = True
+                with conn.cursor() as cursor:
+                    cursor.execute(f"LISTEN {SETTINGS_CONFIG['channel']}")
+                # Anything changed while we were not listening is picked up by a reload
+                self.invalidate()
+                while self._listener_pid == pid:
+                    if select.select([conn], [], [], 60) == ([], [], []):
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        notify = conn.notifies.pop(0)
+                        self.notifications += 1
+                        try:
+                            self.apply(json.loads(notify.payload))
+                        except (ValueError, KeyError, TypeError):
+                            self.invalidate()
+            except Exception as e:
+                logger.error(f"Purchase settings listener error, retrying: {e}")
+                self.invalidate()
+                time.sleep(5)
+            finally:
+                if conn is not None:
+                    conn.close()
+
+    def stats(self):
+        return {
+            'loads': self.loads,
+            'notifications': self.notifications,
+            'age': round(time.monotonic() - self._loaded_at, 1) if self._values is not None else None,
+            'listening': self._listener_pid == os.getpid()
+        }
+
+purchase_settings = PurchaseSettings()
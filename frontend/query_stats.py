@@ -0,0 +1,268 @@
+import os
+import re
+import time
+import logging
+import threading
+from collections import deque
+from functools import lru_cache
+from contextlib import contextmanager
+from flask import g, request, has_request_context
+
+# Configure logging
+logger = logging.getLogger(__name__)
+slow_logger = logging.getLogger('db.slow')
+
+# Query instrumentation settings
+QUERY_STATS_SETTINGS = {
+    'enabled': os.environ.get('DB_QUERY_STATS', '1') == '1',
+    'slow_ms': float(os.environ.get('DB_SLOW_QUERY_MS', 200)),
+    'n_plus_one_threshold': int(os.environ.get('DB_N_PLUS_ONE_THRESHOLD', 10)),  # same statement more than this per request
+    'headers': os.environ.get('DB_QUERY_HEADERS', ''),   # '1' / '0' to force; empty = only in debug mode
+    'max_statements': int(os.environ.get('DB_QUERY_STATS_MAX_STATEMENTS', 500)),
+    'slow_log_size': int(os.environ.get('DB_SLOW_LOG_SIZE', 100))
+}
+
+_LITERAL_RE = re.compile(r"'(?:[^']|'')*'|%\(\w+\)s|%s|\b\d+(?:\.\d+)?\b")
+_LIST_RE = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_COMMENT_RE = re.compile(r"--[^\n]*")
+_SPACE_RE = re.compile(r"\s+")
+
+@lru_cache(maxsize=2048)
+def normalize(sql):
+    """Reduce a statement to its shape: literals and parameters become ?, whitespace is collapsed"""
+    if isinstance(sql, bytes):
+        sql = sql.decode('utf-8', 'replace')
+    elif not isinstance(sql, str):
+        sql = str(sql)
+    sql = _COMMENT_RE.sub(' ', sql)
+    sql = _LITERAL_RE.sub('?', sql)
+    sql = _LIST_RE.sub('(?)', sql)
+    return _SPACE_RE.sub(' ', sql).strip()
+
+class RequestStats:
+    """Database work done while serving one request"""
+
+    __slots__ = ('queries', 'db_time', 'pool_wait', 'statements')
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.pool_wait = 0.0
+        self.statements = {}   # shape -> [count, total seconds]
+
+    def n_plus_one(self):
+        """Statement shapes repeated often enough to look like a per-row lazy load"""
+        threshold = QUERY_STATS_SETTINGS['n_plus_one_threshold']
+        return [(shape, count) for shape, (count, _) in self.statements.items() if count > threshold]
+
+class QueryStats:
+    """Per-request query accounting plus a process-wide aggregate report"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.started_at = time.time()
+            self.endpoints = {}     # endpoint -> {'requests', 'queries', 'db_time', 'max_queries', 'max_db_time'}
+            self.statements = {}    # shape -> {'calls', 'total_time', 'max_time'}
+            self.n_plus_one = {}    # (endpoint, shape) -> {'requests', 'max_repeats'}
+            self.slow_queries = deque(maxlen=QUERY_STATS_SETTINGS['slow_log_size'])
+
+    def current(self):
+        """Stats for the request being served, or None outside a request"""
+        if not has_request_context():
+            return None
+        stats = getattr(g, '_query_stats', None)
+        if stats is None:
+            stats = g._query_stats = RequestStats()
+        return stats
+
+    def record_query(self, sql, duration):
+        shape = normalize(sql)
+        stats = self.current()
+        if stats is not None:
+            stats.queries += 1
+            stats.db_time += duration
+            entry = stats.statements.get(shape)
+            if entry is None:
+                stats.statements[shape] = [1, duration]
+            else:
+                entry[0] += 1
+                entry[1] += duration
+
+        if duration * 1000 >= QUERY_STATS_SETTINGS['slow_ms']:
+            endpoint = request.endpoint if has_request_context() else None
+            slow_logger.warning(f"Slow query ({duration * 1000:.1f} ms, {endpoint or 'no request'}): {shape}")
+            self.slow_queries.append({
+                'at': time.time(),
+                'ms': round(duration * 1000, 2),
+                'endpoint': endpoint,
+                'statement': shape
+            })
+
+        # Outside requests (CLI tools, background threads) only the aggregate is kept
+        if stats is None:
+            with self._lock:
+                self._add_statement(shape, 1, duration, duration)
+
+    def record_pool_wait(self, duration):
+        stats = self.current()
+        if stats is not None:
+            stats.pool_wait += duration
+
+    def _add_statement(self, shape, calls, total_time, max_time):
+        entry = self.statements.get(shape)
+        if entry is None:
+            if len(self.statements) >= QUERY_STATS_SETTINGS['max_statements']:
+                return
+            entry = self.statements[shape] = {'calls': 0, 'total_time': 0.0, 'max_time': 0.0}
+        entry['calls'] += calls
+        entry['total_time'] += total_time
+        entry['max_time'] = max(entry['max_time'], max_time)
+
+    def finish_request(self, endpoint):
+        """Fold the finished request into the aggregate and warn about N+1 patterns"""
+        stats = getattr(g, '_query_stats', None)
+        if stats is None:
+            return
+        endpoint = endpoint or 'unknown'
+        suspects = stats.n_plus_one()
+        for shape, count in suspects:
+            logger.warning(f"Possible N+1 in {endpoint}: statement ran {count} times in one request: {shape}")
+
+        with self._lock:
+            entry = self.endpoints.setdefault(
+                endpoint, {'requests': 0, 'queries': 0, 'db_time': 0.0, 'max_queries': 0, 'max_db_time': 0.0}
+            )
+            entry['requests'] += 1
+            entry['queries'] += stats.queries
+            entry['db_time'] += stats.db_time
+            entry['max_queries'] = max(entry['max_queries'], stats.queries)
+            entry['max_db_time'] = max(entry['max_db_time'], stats.db_time)
+            for shape, (count, total_time) in stats.statements.items():
+                # Per-call maxima are not tracked per request; the request's mean is a lower bound
+                self._add_statement(shape, count, total_time, total_time / count)
+            for shape, count in suspects:
+                suspect = self.n_plus_one.setdefault((endpoint, shape), {'requests': 0, 'max_repeats': 0})
+                suspect['requests'] += 1
+                suspect['max_repeats'] = max(suspect['max_repeats'], count)
+
+    def report(self, top=25):
+        """Aggregate view: per-endpoint query counts and DB time, the costliest statements, N+1 suspects"""
+        with self._lock:
+            endpoints = {
+                name: dict(
+                    entry,
+                    db_time=round(entry['db_time'], 4),
+                    max_db_time=round(entry['max_db_time'], 4),
+                    avg_queries=round(entry['queries'] / entry['requests'], 2),
+                    avg_db_ms=round(entry['db_time'] * 1000 / entry['requests'], 2)
+                )
+                for name, entry in self.endpoints.items()
+            }
+            statements = sorted(self.statements.items(), key=lambda item: item[1]['total_time'], reverse=True)
+            n_plus_one = [
+                dict(suspect, endpoint=endpoint, statement=shape)
+                for (endpoint, shape), suspect in self.n_plus_one.items()
+            ]
+            slow_queries = list(self.slow_queries)
+        return {
+            'since': self.started_at,
+            'settings': dict(QUERY_STATS_SETTINGS),
+            'endpoints': endpoints,
+            'statements': [
+                {
+                    'statement': shape,
+                    'calls': entry['calls'],
+                    'total_ms': round(entry['total_time'] * 1000, 2),
+                    'mean_ms': round(entry['total_time'] * 1000 / entry['calls'], 3),
+                    'max_ms': round(entry['max_time'] * 1000, 2)
+                }
+                for shape, entry in statements[:top]
+            ],
+            'n_plus_one': sorted(n_plus_one, key=lambda suspect: suspect['requests'], reverse=True),
+            'slow_queries': slow_queries
+        }
+
+query_stats = QueryStats()
+
+_capture_local = threading.local()
+
+@contextmanager
+def capture():
+    """Collect (statement, parameters) for every query this thread executes while active, e.g. to EXPLAIN them"""
+    outer = getattr(_capture_local, 'statements', None)
+    statements = _capture_local.statements = []
+    try:
+        yield statements
+    finally:
+        _capture_local.statements = outer
+
+class InstrumentedCursorMixin:
+    """Times execute/executemany/copy_expert and records them in query_stats"""
+
+    def execute(self, query, vars=None):
+        statements = getattr(_capture_local, 'statements', None)
+        if statements is not None:
+            statements.append((query, vars))
+        start = time.perf_counter()
+        try:
+            return super().execute(query, vars)
+        finally:
+            query_stats.record_query(query, time.perf_counter() - start)
+
+    def executemany(self, query, vars_list):
+        start = time.perf_counter()
+        try:
+            return super().executemany(query, vars_list)
+        finally:
+            query_stats.record_query(query, time.perf_counter() - start)
+
+    def copy_expert(self, sql, file, size=8192):
+        start = time.perf_counter()
+        try:
+            return super().copy_expert(sql, file, size)
+        finally:
+            query_stats.record_query(sql, time.perf_counter() - start)
+
+_instrumented_factories = {}
+
+def instrumented(cursor_factory):
+    """The instrumented subclass of a psycopg2 cursor class (the class itself when disabled)"""
+    if not QUERY_STATS_SETTINGS['enabled']:
+        return cursor_factory
+    factory = _instrumented_factories.get(cursor_factory)
+    if factory is None:
+        factory = type(f"Instrumented{cursor_factory.__name__}", (InstrumentedCursorMixin, cursor_factory), {})
+        _instrumented_factories[cursor_factory] = factory
+    return factory
+
+def _headers_enabled(app):
+    if QUERY_STATS_SETTINGS['headers']:
+        return QUERY_STATS_SETTINGS['headers'] == '1'
+    return app.debug
+
+def init_app(app):
+    """Expose per-request numbers as response headers (debug mode) and aggregate them at teardown"""
+    if not QUERY_STATS_SETTINGS['enabled']:
+        return
+
+    @app.after_request
+    def add_query_headers(response):
+        stats = getattr(g, '_query_stats', None)
+        if stats is not None and _headers_enabled(app):
+            response.headers['X-DB-Queries'] = str(stats.queries)
+            response.headers['X-DB-Time-Ms'] = f"{stats.db_time * 1000:.2f}"
+            response.headers['X-DB-Pool-Wait-Ms'] = f"{stats.pool_wait * 1000:.2f}"
+            suspects = stats.n_plus_one()
+            if suspects:
+                response.headers['X-DB-N-Plus-One'] = str(len(suspects))
+            response.headers.add('Server-Timing', f"db;desc=\"{stats.queries} queries\";dur={stats.db_time * 1000:.2f}")
+        return response
+
+    # Teardown rather than after_request, so queries made while streaming a response are included
+    @app.teardown_request
+    def finish_query_stats(exception=None):
+        query_stats.finish_request(request.endpoint)
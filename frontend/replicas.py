@@ -0,0 +1,178 @@
+import os
+import time
+import random
+import logging
+import threading
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Read replicas. DB_REPLICAS is a comma-separated list of host[:port]; the database name and
+# credentials are the primary's (db.DB_PARAMS). Empty keeps every query on the primary.
+REPLICA_SETTINGS = {
+    'hosts': [host.strip() for host in os.environ.get('DB_REPLICAS', '').split(',') if host.strip()],
+    'max_lag': float(os.environ.get('DB_REPLICA_MAX_LAG', 5)),                # seconds behind before ejection
+    'check_interval': float(os.environ.get('DB_REPLICA_CHECK_INTERVAL', 2)),  # seconds between lag checks
+    'sticky_seconds': float(os.environ.get('DB_READ_YOUR_WRITES_SECONDS', 10)),  # primary-only reads after a write
+    'maxconn': int(os.environ.get('DB_REPLICA_POOL_MAX', os.environ.get('DB_POOL_MAX', 10))),
+    'timeout': float(os.environ.get('DB_REPLICA_POOL_TIMEOUT', 1)),           # then fall back to the primary
+    'connect_timeout': int(os.environ.get('DB_REPLICA_CONNECT_TIMEOUT', 3))
+}
+
+# 0 when the replica has replayed everything it received (an idle primary is not lag)
+LAG_QUERY = """
+SELECT pg_is_in_recovery(),
+       CASE WHEN NOT pg_is_in_recovery() OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+            ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+       END
+"""
+
+class Replica:
+    """One read replica: its own connection pool plus the health kept up to date by the lag monitor"""
+
+    def __init__(self, address):
+        host, _, port = address.partition(':')
+        self.host = host
+        self.port = port or '5432'
+        self.name = f"{self.host}:{self.port}"
+        self.healthy = False      # until the first lag check passes
+        self.lag = None
+        self.in_recovery = None
+        self.error = None
+        self.checked_at = None
+        self.ejections = 0
+        self._monitor_conn = None
+        self._monitor_pid = None
+        self._pool = None
+
+    def params(self):
+        import db
+        return dict(db.DB_PARAMS, host=self.host, port=self.port,
+                    connect_timeout=REPLICA_SETTINGS['connect_timeout'])
+
+    def _connect(self):
+        import psycopg2
+        return psycopg2.connect(**self.params())
+
+    @property
+    def pool(self):
+        if self._pool is None:
+            import db
+            self._pool = db.ConnectionPool(
+                minconn=0,
+                maxconn=REPLICA_SETTINGS['maxconn'],
+                timeout=REPLICA_SETTINGS['timeout'],
+                recycle=db.POOL_SETTINGS['recycle'],
+                health_check=db.POOL_SETTINGS['health_check'],
+                connect=self._connect
+            )
+        return self._pool
+
+    def check(self):
+        """Measure replication lag and eject or readmit the replica accordingly"""
+        try:
+            if self._monitor_conn is None or self._monitor_conn.closed or self._monitor_pid != os.getpid():
+                # A connection inherited across a fork belongs to the parent; never touch it
+                self._monitor_conn = self._connect()
+                self._monitor_conn.autocommit = True
+                self._monitor_pid = os.getpid()
+            with self._monitor_conn.cursor() as cursor:
+                cursor.execute(LAG_QUERY)
+                in_recovery, lag = cursor.fetchone()
+            self.in_recovery = in_recovery
+            self.lag = float(lag)
+            self.error = None
+            if not in_recovery:
+                logger.warning(f"Replica {self.name} is not in recovery; it is a primary, not a replica")
+            self._set_healthy(self.lag <= REPLICA_SETTINGS['max_lag'],
+                              f"lag {self.lag:.1f}s, limit {REPLICA_SETTINGS['max_lag']}s")
+        except Exception as e:
+            self.error = str(e).strip()
+            self.lag = None
+            if self._monitor_conn is not None and self._monitor_pid == os.getpid():
+                try:
+                    self._monitor_conn.close()
+                except Exception:
+                    pass
+            self._monitor_conn = None
+            self._set_healthy(False, f"check failed: {self.error}")
+        self.checked_at = time.time()
+
+    def fail(self, error):
+        """Eject the replica after a connection failure; the next successful lag check readmits it"""
+        self.error = str(error).strip()
+        self._set_healthy(False, f"connection failed: {self.error}")
+
+    def _set_healthy(self, healthy, reason):
+        if healthy and not self.healthy:
+            logger.info(f"Replica {self.name} admitted for reads ({reason})")
+        elif not healthy and self.healthy:
+            self.ejections += 1
+            logger.warning(f"Replica {self.name} ejected from reads ({reason})")
+        self.healthy = healthy
+
+    def stats(self):
+        return {
+            'name': self.name,
+            'healthy': self.healthy,
+            'lag': self.lag,
+            'in_recovery': self.in_recovery,
+            'error': self.error,
+            'checked_at': self.checked_at,
+            'ejections': self.ejections,
+            'pool': self._pool.stats() if self._pool is not None else None
+        }
+
+class ReplicaSet:
+    """The configured read replicas and the background thread that checks their lag"""
+
+    def __init__(self, hosts):
+        self.replicas = [Replica(host) for host in hosts]
+        self._lock = threading.Lock()
+        self._monitor_pid = None
+
+    @property
+    def enabled(self):
+        return bool(self.replicas)
+
+    def _ensure_monitor(self):
+        """Check lag once in the calling thread, then keep checking in the background; once per process"""
+        if self._monitor_pid == os.getpid():
+            return
+        with self._lock:
+            if self._monitor_pid == os.getpid():
+                return
+            for replica in self.replicas:
+                replica.check()
+            self._monitor_pid = os.getpid()
+
+        def run():
+            pid = os.getpid()
+            while self._monitor_pid == pid:
+                time.sleep(REPLICA_SETTINGS['check_interval'])
+                for replica in self.replicas:
+                    replica.check()
+
+        threading.Thread(target=run, name='replica-lag-monitor', daemon=True).start()
+
+    def getconn(self):
+        """Check out a connection from a healthy replica: (replica, conn), or (None, None) if there is none"""
+        import psycopg2
+        self._ensure_monitor()
+        candidates = [replica for replica in self.replicas if replica.healthy]
+        random.shuffle(candidates)
+        for replica in candidates:
+            try:
+                return replica, replica.pool.getconn()
+            except psycopg2.OperationalError as e:
+                # PoolTimeout means the replica is busy, not broken; anything else is a failed connect
+                if type(e).__name__ == 'PoolTimeout':
+                    logger.warning(f"Replica {replica.name} pool exhausted, trying elsewhere")
+                else:
+                    replica.fail(e)
+        return None, None
+
+    def stats(self):
+        return [replica.stats() for replica in self.replicas]
+
+replica_set = ReplicaSet(REPLICA_SETTINGS['hosts'])
@@ -1,10 +1,15 @@
-from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify, abort, current_app
+from flask import (Blueprint, render_template, redirect, url_for, flash, request, jsonify, abort, current_app, Response,
+                   stream_with_context)
 from flask_login import login_required, current_user
 from functools import wraps
+import io
 from datetime import datetime
 
 from db import Book, Section, Pagination
 from forms import BookForm, SectionForm, SearchForm
+import search_index
+import catalog_import
+import catalog_export
 
 main_bp = Blueprint('main', __name__)
 
@@ -31,13 +36,15 @@ def books():
     section_id = request.args.get('section', type=int, default=0)
     search_query = request.args.get('query', '')
     page = request.args.get('page', 1, type=int)
+    cursor = request.args.get('cursor')
     
     # Get paginated books using our search function
     paginated_books = Book.search(
         query=search_query if search_query else None,
         section_id=section_id if section_id else None,
         page=page,
-        per_page=12
+        per_page=12,
+        cursor=cursor
     )
     
     # Create a compatible pagination object
@@ -45,7 +52,11 @@ def books():
         items=paginated_books['items'],
         page=paginated_books['page'],
         per_page=paginated_books['per_page'],
-        total=paginated_books['total']
+        total=paginated_books['total'],
+        has_next=paginated_books['has_next'],
+        has_prev=paginated_books['has_prev'],
+        next_cursor=paginated_books['next_cursor'],
+        prev_cursor=paginated_books['prev_cursor']
     )
     
     return render_template('books/index.html', books=books, form=search_form, 
@@ -83,6 +94,29 @@ def create_book():
     
     return render_template('books/create.html', form=form)
 
+@main_bp.route('/books/import', methods=['POST'])
+@login_required
+@librarian_required
+def import_books():
+    """Bulk-load books from an uploaded CSV or JSONL file"""
+    upload = request.files.get('file')
+    if not upload or not upload.filename:
+        return jsonify({'error': 'No file uploaded'}), 400
+    
+    fmt = request.form.get('format') or ('jsonl' if upload.filename.endswith(('.jsonl', '.ndjson')) else 'csv')
+    if fmt not in ('csv', 'jsonl'):
+        return jsonify({'error': f'Unsupported format: {fmt}'}), 400
+    
+    stream = io.TextIOWrapper(upload.stream, encoding='utf-8', newline='')
+    result = catalog_import.import_books(
+        stream,
+        fmt,
+        batch_size=request.form.get('batch_size', 5000, type=int),
+        create_sections=request.form.get('create_sections') == '1'
+    )
+    current_app.logger.info(f"Imported books from {upload.filename}: {result.as_dict()['rows']} rows")
+    return jsonify(result.as_dict())
+
 @main_bp.route('/books/<int:id>/edit', methods=['GET', 'POST'])
 @login_required
 @librarian_required
@@ -93,13 +127,9 @@ def edit_book(id):
         flash('Book not found', 'danger')
         return redirect(url_for('main.books'))
     
-    # Create form with original book data
+    # Create form with original book data (section choices come from the cached catalog)
     form = BookForm()
     
-    # Pre-populate section choices (assuming you have a form with dropdown)
-    sections = Section.get_all()
-    form.section_id.choices = [(s.id, s.name) for s in sections]
-    
     if request.method == 'GET':
         # Pre-populate form fields for GET request
         form.title.data = book.title
@@ -222,7 +252,7 @@ def delete_section(id):
         abort(404)
     
     # Check if section has books
-    if len(section.books) > 0:
+    if section.count_books() > 0:
         flash(f'Cannot delete section "{section.name}" because it contains books.', 'danger')
         return redirect(url_for('main.sections'))
     
@@ -233,6 +263,36 @@ def delete_section(id):
     
     return redirect(url_for('main.sections'))
 
+# Export routes
+@main_bp.route('/export/<kind>.<fmt>')
+@login_required
+@librarian_required
+def export(kind, fmt):
+    """Stream books or purchases as CSV/JSONL, optionally filtered by section and date range"""
+    if kind not in catalog_export.EXPORTS or fmt not in catalog_export.FORMATS:
+        abort(404)
+    
+    try:
+        since = catalog_export.parse_date(request.args.get('since'))
+        until = catalog_export.parse_date(request.args.get('until'))
+    except ValueError:
+        return jsonify({'error': 'Dates must be formatted as YYYY-MM-DD'}), 400
+    
+    chunks = catalog_export.export(
+        kind,
+        fmt,
+        section_id=request.args.get('section', type=int),
+        since=since,
+        until=until
+    )
+    filename = f"{kind}-{datetime.now().strftime('%Y%m%d-%H%M%S')}.{fmt}"
+    # Keep the request context (g, query stats, teardown) alive until the last chunk is sent
+    return Response(
+        stream_with_context(chunks),
+        mimetype=catalog_export.FORMATS[fmt],
+        headers={'Content-Disposition': f'attachment; filename="{filename}"'}
+    )
+
 # Search route (AJAX)
 @main_bp.route('/search')
 @login_required
@@ -243,6 +303,11 @@ def search():
     if not query and not section_id:
         return jsonify([])
     
+    # Answer type-ahead from the in-memory prefix index when it is built
+    results = search_index.search(query, section_id=section_id or None, limit=10)
+    if results is not None:
+        return jsonify(results)
+    
     # Use our search function to find books
     search_results = Book.search(
         query=query if query else None,
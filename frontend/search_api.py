@@ -0,0 +1,214 @@
+"""Read-only async JSON API for type-ahead search and book lookup.
+
+Usage (from the frontend directory; needs the `aiohttp` and `asyncpg` packages,
+installed with the `search-api` extra: pip install -e '.[search-api]'):
+
+    python search_api.py                       # serves on SEARCH_API_HOST:SEARCH_API_PORT (127.0.0.1:8001)
+    python search_api.py --port 8001 --host 0.0.0.0
+    gunicorn 'search_api:create_app()' --worker-class aiohttp.GunicornWebWorker --workers 2
+
+The Flask /search endpoint holds a whole sync worker for the length of its
+queries. This service answers the same request on an event loop, with its own
+asyncpg pool, so one process can keep thousands of keystroke requests in
+flight while at most SEARCH_API_MAX_CONNECTIONS of them use the database.
+Route /search (and /api/books/) to it at the reverse proxy; static/js/main.js
+needs no change, because GET /search?query=&section= returns the same JSON list
+of {id, title, author, section, available} as the Flask route.
+
+Matching comes from db.search_filter, the same code Book.search uses. Only the
+first page is fetched, and the total count the Flask route computes and never
+returns is skipped. Sessions are the Flask app's signed session cookie, so a
+user signed in to the main app is signed in here too. Every connection runs
+with default_transaction_read_only, so nothing in this process can write.
+"""
+import os
+import re
+import sys
+import logging
+import argparse
+import itertools
+from datetime import timedelta
+
+from db import DB_PARAMS, search_filter, SEARCH_RANK_ORDER
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+SEARCH_API_SETTINGS = {
+    'host': os.environ.get('SEARCH_API_HOST', '127.0.0.1'),
+    'port': int(os.environ.get('SEARCH_API_PORT', 8001)),
+    'min_connections': int(os.environ.get('SEARCH_API_MIN_CONNECTIONS', 2)),
+    'max_connections': int(os.environ.get('SEARCH_API_MAX_CONNECTIONS', 20)),
+    'acquire_timeout': float(os.environ.get('SEARCH_API_ACQUIRE_TIMEOUT', 5)),   # seconds to wait for a connection
+    'statement_timeout_ms': int(os.environ.get('SEARCH_API_STATEMENT_TIMEOUT_MS', 2000)),
+    'require_login': os.environ.get('SEARCH_API_REQUIRE_LOGIN', '1') == '1',
+    'limit': 10    # results per type-ahead request, as in the Flask route
+}
+
+# Must match the Flask app's secret (see app.create_app) to read its session cookie
+SESSION_SECRET = os.environ.get("SESSION_SECRET", "library_management_secret_key")
+SESSION_COOKIE_NAME = 'session'
+SESSION_MAX_AGE = timedelta(days=31)   # Flask's default PERMANENT_SESSION_LIFETIME
+
+SEARCH_COLUMNS = "b.id, b.title, b.author, s.name AS section, b.available"
+LOOKUP_COLUMNS = "b.id, b.title, b.author, b.isbn, b.genre, b.section_id, s.name AS section, b.available"
+
+# A placeholder, or psycopg2's escaped literal percent sign
+_PLACEHOLDER_RE = re.compile(r'%%|%s')
+
+def numbered(sql):
+    """Rewrite psycopg2 %s placeholders as asyncpg's $1, $2, ... and %% as a plain %"""
+    counter = itertools.count(1)
+    return _PLACEHOLDER_RE.sub(lambda match: '%' if match.group() == '%%' else f"${next(counter)}", sql)
+
+def search_statement(query, section_id, limit):
+    """SQL and arguments for one type-ahead search, ordered like the first page of Book.search"""
+    where_clause, params, rank_params = search_filter(query, section_id)
+    order_by = SEARCH_RANK_ORDER if rank_params else "b.title, b.id"
+    sql = f"""
+    SELECT {SEARCH_COLUMNS}
+    FROM books b
+    JOIN sections s ON b.section_id = s.id
+    WHERE {where_clause}
+    ORDER BY {order_by}
+    LIMIT %s
+    """
+    return numbered(sql), [*params, *rank_params, limit]
+
+def _session_serializer():
+    """The serializer the Flask app signs its session cookie with"""
+    from flask import Flask
+    signer = Flask(__name__)
+    signer.secret_key = SESSION_SECRET
+    return signer.session_interface.get_signing_serializer(signer)
+
+_serializer = None
+
+def session_user_id(cookies):
+    """The signed-in user's id from the Flask session cookie, or None"""
+    global _serializer
+    value = cookies.get(SESSION_COOKIE_NAME)
+    if not value:
+        return None
+    if _serializer is None:
+        _serializer = _session_serializer()
+    try:
+        session = _serializer.loads(value, max_age=int(SESSION_MAX_AGE.total_seconds()))
+    except Exception:
+        return None
+    return session.get('_user_id')
+
+def create_app():
+    """Build the aiohttp application; the pool is opened on startup and closed on cleanup"""
+    try:
+        import asyncpg
+        from aiohttp import web
+    except ImportError as e:
+        raise RuntimeError("The search API needs the 'aiohttp' and 'asyncpg' packages "
+                           f"(pip install -e '.[search-api]'): {e}")
+
+    routes = web.RouteTableDef()
+
+    def error(status, message):
+        return web.json_response({'error': message}, status=status)
+
+    async def fetch(request, sql, args):
+        """Run a read on a pooled connection; None means the database could not answer in time"""
+        pool = request.app['pool']
+        try:
+            async with pool.acquire(timeout=SEARCH_API_SETTINGS['acquire_timeout']) as conn:
+                return await conn.fetch(sql, *args)
+        except (TimeoutError, asyncpg.exceptions.QueryCanceledError) as e:
+            logger.warning(f"Search API query timed out ({type(e).__name__}): {sql.split()[:4]}")
+            return None
+
+    @web.middleware
+    async def require_login(request, handler):
+        if SEARCH_API_SETTINGS['require_login'] and request.path != '/api/health':
+            if session_user_id(request.cookies) is None:
+                return error(401, 'Please log in to access this page.')
+        return await handler(request)
+
+    @routes.get('/search')
+    async def search(request):
+        query = request.query.get('query', '')
+        try:
+            section_id = int(request.query.get('section') or 0)
+        except ValueError:
+            section_id = 0
+
+        if not query and not section_id:
+            return web.json_response([])
+
+        sql, args = search_statement(query or None, section_id or None, SEARCH_API_SETTINGS['limit'])
+        rows = await fetch(request, sql, args)
+        if rows is None:
+            return error(503, 'Search is busy, please try again')
+        return web.json_response([dict(row) for row in rows])
+
+    @routes.get(r'/api/books/{book_id:\d+}')
+    async def book(request):
+        sql = numbered(f"""
+        SELECT {LOOKUP_COLUMNS}
+        FROM books b
+        JOIN sections s ON b.section_id = s.id
+        WHERE b.id = %s
+        """)
+        rows = await fetch(request, sql, [int(request.match_info['book_id'])])
+        if rows is None:
+            return error(503, 'Lookup is busy, please try again')
+        if not rows:
+            return error(404, 'Book not found')
+        return web.json_response(dict(rows[0]))
+
+    @routes.get('/api/health')
+    async def health(request):
+        pool = request.app['pool']
+        return web.json_response({
+            'status': 'ok',
+            'connections': pool.get_size(),
+            'idle': pool.get_idle_size(),
+            'max_connections': pool.get_max_size()
+        })
+
+    async def open_pool(app):
+        app['pool'] = await asyncpg.create_pool(
+            host=DB_PARAMS['host'],
+            port=int(DB_PARAMS['port']),
+            user=DB_PARAMS['user'],
+            password=DB_PARAMS['password'],
+            database=DB_PARAMS['dbname'],
+            min_size=SEARCH_API_SETTINGS['min_connections'],
+            max_size=SEARCH_API_SETTINGS['max_connections'],
+            server_settings={
+                'application_name': 'library-search-api',
+                'default_transaction_read_only': 'on',
+                'statement_timeout': str(SEARCH_API_SETTINGS['statement_timeout_ms'])
+            }
+        )
+        logger.info(f"Search API pool open on {DB_PARAMS['host']}:{DB_PARAMS['port']} "
+                    f"({SEARCH_API_SETTINGS['min_connections']}-{SEARCH_API_SETTINGS['max_connections']} connections)")
+
+    async def close_pool(app):
+        await app['pool'].close()
+
+    app = web.Application(middlewares=[require_login])
+    app.add_routes(routes)
+    app.on_startup.append(open_pool)
+    app.on_cleanup.append(close_pool)
+    return app
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default=SEARCH_API_SETTINGS['host'], help='interface to listen on')
+    parser.add_argument('--port', type=int, default=SEARCH_API_SETTINGS['port'], help='port to listen on')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(levelname)s %(name)s %(message)s')
+    app = create_app()
+    from aiohttp import web
+    web.run_app(app, host=args.host, port=args.port, access_log=None)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
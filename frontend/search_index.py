@@ -0,0 +1,315 @@
+import os
+import re
+import bisect
+import logging
+import threading
+import time
+from cache import CACHE_SETTINGS, books_generation
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Type-ahead index settings
+INDEX_SETTINGS = {
+    'enabled': os.environ.get('SEARCH_INDEX_ENABLED', '1') == '1',
+    'check_interval': float(os.environ.get('SEARCH_INDEX_CHECK_INTERVAL', 1)),  # seconds between generation checks
+    # Rebuild after this many seconds even without a generation change (0 = never). With the in-process
+    # cache backend one worker never sees another's generations, so only then is it on by default.
+    'max_age': float(os.environ.get('SEARCH_INDEX_MAX_AGE', 0 if CACHE_SETTINGS['url'] else 60))
+}
+
+_WORD_RE = re.compile(r'\w+')
+# Digits with dashes or spaces, and X only as an ISBN-10 check digit at the end
+_ISBN_QUERY_RE = re.compile(r'^\d[\d\- ]*[xX]?$')
+
+def _normalize_isbn(isbn):
+    """Strip dashes and spaces so ISBNs match however they were typed"""
+    return re.sub(r'[^0-9x]', '', (isbn or '').lower())
+
+class PrefixIndex:
+    """In-memory word-prefix index over book titles, authors and ISBNs.
+
+    Distinct terms are kept in a sorted list so a prefix maps to a contiguous
+    range found with bisect; each term points at a posting list of book ids kept
+    in title order, as does each section. Lookups never touch the database.
+
+    The index remembers the books generation (see cache.books_generation) it was
+    built at and is rebuilt when that moves on, or once it is older than max_age.
+    Writes made by this process are patched in directly and advance the
+    remembered generation instead.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._reset()
+        self.ready = False
+        self.built_at = None
+        self.generation = None
+        self.checked_at = None
+        self._rebuilding = False
+
+    def _reset(self):
+        self._terms = []      # sorted distinct terms
+        self._postings = {}   # term -> list of book ids ordered by (title, id)
+        self._sections = {}   # section id -> list of book ids ordered by (title, id); None -> every book
+        self._books = {}      # book id -> record
+
+    @staticmethod
+    def tokenize(title, author, isbn):
+        """Get the set of index terms for a book"""
+        terms = set(_WORD_RE.findall(f"{title or ''} {author or ''}".lower()))
+        isbn_term = _normalize_isbn(isbn)
+        if isbn_term:
+            terms.add(isbn_term)
+        return terms
+
+    def _sort_key(self, book_id):
+        return (self._books[book_id]['title_key'], book_id)
+
+    def _insert(self, record):
+        """Add a book record (lock must be held)"""
+        book_id = record['id']
+        self._books[book_id] = record
+        for term in record['terms']:
+            postings = self._postings.get(term)
+            if postings is None:
+                postings = self._postings[term] = []
+                bisect.insort(self._terms, term)
+            bisect.insort(postings, book_id, key=self._sort_key)
+        for section_id in (None, record['section_id']):
+            bisect.insort(self._sections.setdefault(section_id, []), book_id, key=self._sort_key)
+
+    def _remove_sorted(self, ids, book_id):
+        """Remove a book id from a list in title order (lock must be held)"""
+        i = bisect.bisect_left(ids, self._sort_key(book_id), key=self._sort_key)
+        if i < len(ids) and ids[i] == book_id:
+            del ids[i]
+        else:
+            ids.remove(book_id)
+
+    def _delete(self, book_id):
+        """Remove a book record (lock must be held)"""
+        record = self._books.get(book_id)
+        if record is None:
+            return
+        for term in record['terms']:
+            postings = self._postings[term]
+            self._remove_sorted(postings, book_id)
+            if not postings:
+                del self._postings[term]
+                del self._terms[bisect.bisect_left(self._terms, term)]
+        for section_id in (None, record['section_id']):
+            ids = self._sections[section_id]
+            self._remove_sorted(ids, book_id)
+            if not ids and section_id is not None:
+                del self._sections[section_id]
+        del self._books[book_id]
+
+    @classmethod
+    def make_record(cls, id, title, author, isbn, section_id, section_name, available):
+        return {
+            'id': id,
+            'title': title,
+            'author': author,
+            'isbn': isbn,
+            'section_id': section_id,
+            'section': section_name,
+            'available': available,
+            'title_key': (title or '').lower(),
+            'terms': cls.tokenize(title, author, isbn)
+        }
+
+    def build(self, rows, generation=None):
+        """Replace the index contents with rows of (id, title, author, isbn, section_id, section_name, available).
+
+        `generation` is the books generation read before the rows were.
+        """
+        start = time.monotonic()
+        books = {}
+        postings = {}
+        sections = {None: []}
+        for row in rows:
+            record = self.make_record(*row)
+            books[record['id']] = record
+            for term in record['terms']:
+                postings.setdefault(term, []).append(record['id'])
+            sections[None].append(record['id'])
+            sections.setdefault(record['section_id'], []).append(record['id'])
+        sort_key = lambda book_id: (books[book_id]['title_key'], book_id)
+        for ids in (*postings.values(), *sections.values()):
+            ids.sort(key=sort_key)
+        terms = sorted(postings)
+
+        with self._lock:
+            self._books, self._postings, self._sections, self._terms = books, postings, sections, terms
+            self.ready = True
+            self.built_at = time.monotonic()
+            self.generation = generation
+        logger.info(f"Search index built: {len(books)} books, {len(terms)} terms in {time.monotonic() - start:.2f}s")
+
+    def add(self, book, section_name=None):
+        """Index a newly created or updated book"""
+        record = self.make_record(book.id, book.title, book.author, book.isbn, book.section_id,
+                                  section_name or book._section_name, book.available)
+        with self._lock:
+            if record['section'] is None and book.id in self._books:
+                record['section'] = self._books[book.id]['section']
+            self._delete(book.id)
+            self._insert(record)
+            self._follow_local_write()
+
+    def remove(self, book_id):
+        """Drop a deleted book from the index"""
+        with self._lock:
+            self._delete(book_id)
+            self._follow_local_write()
+
+    def set_available(self, book_id, available):
+        """Reflect an availability change (e.g. after a purchase)"""
+        with self._lock:
+            record = self._books.get(book_id)
+            if record is not None:
+                record['available'] = available
+            self._follow_local_write()
+
+    def rename_section(self, section_id, name):
+        """Reflect a section rename in every indexed book of that section"""
+        with self._lock:
+            for book_id in self._sections.get(section_id, ()):
+                self._books[book_id]['section'] = name
+            self._follow_local_write()
+
+    def _follow_local_write(self):
+        """After patching in this process' own write, whose invalidation has already bumped the
+        generation: if that write is the only change since the index was built, the index is
+        current again (lock must be held). Anything else is left for is_stale to notice."""
+        if self.generation is None:
+            return
+        current = books_generation()
+        if current == self.generation + 1:
+            self.generation = current
+
+    def search(self, query, section_id=None, limit=10):
+        """Find books whose words start with every word of `query`.
+
+        Results are ordered by the closest matching term, then by title, so exact
+        word matches come before longer words that merely share the prefix.
+        """
+        text = (query or '').strip().lower()
+        if _ISBN_QUERY_RE.match(text) and _normalize_isbn(text):
+            prefixes = [_normalize_isbn(text)]
+        else:
+            prefixes = _WORD_RE.findall(text)
+
+        with self._lock:
+            if not prefixes:
+                # Section-only browsing: titles in order
+                ids = self._sections.get(section_id or None, ())
+                return [self._public(self._books[book_id]) for book_id in ids[:limit]]
+
+            # Drive the scan with the longest prefix (the narrowest range); check the rest per book
+            driver = max(prefixes, key=len)
+            others = [p for p in prefixes if p != driver]
+
+            results = []
+            seen = set()
+            i = bisect.bisect_left(self._terms, driver)
+            while i < len(self._terms) and self._terms[i].startswith(driver):
+                for book_id in self._postings[self._terms[i]]:
+                    if book_id in seen:
+                        continue
+                    seen.add(book_id)
+                    record = self._books[book_id]
+                    if section_id and record['section_id'] != section_id:
+                        continue
+                    if others and not all(any(t.startswith(p) for t in record['terms']) for p in others):
+                        continue
+                    results.append(self._public(record))
+                    if len(results) >= limit:
+                        return results
+                i += 1
+            return results
+
+    @staticmethod
+    def _public(record):
+        return {
+            'id': record['id'],
+            'title': record['title'],
+            'author': record['author'],
+            'section': record['section'],
+            'available': record['available']
+        }
+
+    def is_stale(self):
+        """Whether the books generation has moved on since the build, checked every `check_interval` seconds"""
+        if self.built_at is None:
+            return True
+        now = time.monotonic()
+        if INDEX_SETTINGS['max_age'] and now - self.built_at > INDEX_SETTINGS['max_age']:
+            return True
+        if self.checked_at is not None and now - self.checked_at < INDEX_SETTINGS['check_interval']:
+            return False
+        self.checked_at = now
+        current = books_generation()
+        return current is not None and current != self.generation
+
+    def __len__(self):
+        return len(self._books)
+
+# Process-wide index used by the /search endpoint
+book_index = PrefixIndex()
+
+def load():
+    """(Re)build the index from the books table"""
+    import db
+
+    query = """
+    SELECT b.id, b.title, b.author, b.isbn, b.section_id, s.name, b.available
+    FROM books b
+    JOIN sections s ON b.section_id = s.id
+    """
+    try:
+        # Read before the rows, so a write committed during the load triggers another rebuild;
+        # the rows come from the primary, since a lagging replica could predate that generation
+        generation = books_generation()
+        with db.primary_reads():
+            rows = db.execute_query(query)
+        book_index.build((tuple(row) for row in rows), generation)
+    finally:
+        db.release_connection()
+
+def refresh_in_background():
+    """Rebuild a stale index on a background thread while the old one keeps serving"""
+    with book_index._lock:
+        if book_index._rebuilding:
+            return
+        book_index._rebuilding = True
+
+    def run():
+        try:
+            load()
+        except Exception as e:
+            logger.error(f"Error building search index: {e}")
+        finally:
+            book_index._rebuilding = False
+
+    threading.Thread(target=run, name='search-index-build', daemon=True).start()
+
+def _after_fork_in_child():
+    """Forget rebuild state inherited from the parent, e.g. after gunicorn --preload"""
+    book_index._lock = threading.RLock()
+    book_index._rebuilding = False
+    book_index.checked_at = None
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
+
+def search(query, section_id=None, limit=10):
+    """Answer a type-ahead lookup from memory, or return None if the index is not ready"""
+    if not INDEX_SETTINGS['enabled']:
+        return None
+    if book_index.is_stale():
+        refresh_in_background()
+    if not book_index.ready:
+        return None
+    return book_index.search(query, section_id=section_id, limit=limit)
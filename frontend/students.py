@@ -0,0 +1,164 @@
+import os
+import logging
+from flask import (Blueprint, render_template, redirect, url_for, flash, request, jsonify, Response, stream_template,
+                   get_flashed_messages)
+from flask_login import login_required, current_user
+from flask_wtf.csrf import generate_csrf
+import db
+from db import Book, Pagination
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+students_bp = Blueprint('students', __name__)
+
+# Student dashboard settings
+DASHBOARD_SETTINGS = {
+    'per_page': int(os.environ.get('STUDENT_DASHBOARD_PER_PAGE', 24)),
+    'stream': os.environ.get('STUDENT_DASHBOARD_STREAM', '0') == '1'  # also available per request with ?stream=1
+}
+
+@students_bp.route('/books/<int:book_id>/purchase', methods=['POST'])
+@login_required
+def purchase_book(book_id):
+    """Route to handle book purchase requests"""
+    # Add debug logging
+    logger.debug(f"Purchase request received for book {book_id} by user {current_user.id}")
+    logger.debug(f"User is student: {current_user.is_student()}")
+    
+    if not current_user.is_student():
+        flash('Only students can purchase books', 'danger')
+        # Fix the redirect to the correct endpoint - likely 'main.books' not 'main.book_detail'
+        return redirect(url_for('main.books', id=book_id))
+        
+    # Existence and availability are checked atomically by the purchase itself
+    success, message = db.purchase_book(current_user.id, book_id)
+    
+    if success:
+        flash(message, 'success')
+    else:
+        flash(message, 'danger')
+    
+    # Redirect to the main books page instead of the non-existent book_detail page
+    return redirect(url_for('main.books'))
+
+def parse_checkout(payload, form):
+    """Get (book_ids, partial) from a checkout request's JSON payload, or its form if there is none.
+    
+    Raises ValueError with a message for the client when the request is malformed.
+    """
+    if payload is None:
+        try:
+            book_ids = [int(book_id) for book_id in form.getlist('book_ids')]
+        except ValueError:
+            raise ValueError('book_ids must be integers')
+        return book_ids, form.get('partial') == '1'
+    
+    if not isinstance(payload, dict):
+        raise ValueError('Expected a JSON object')
+    book_ids = payload.get('book_ids', [])
+    partial = payload.get('partial', False)
+    # bool is an int subclass, and a string would be iterated one character at a time
+    if not isinstance(book_ids, list) or not all(type(book_id) is int for book_id in book_ids):
+        raise ValueError('book_ids must be a list of integers')
+    if not isinstance(partial, bool):
+        raise ValueError('partial must be true or false')
+    return book_ids, partial
+
+@students_bp.route('/cart/checkout', methods=['POST'])
+@login_required
+def checkout_cart():
+    """Purchase every book in a cart in one transaction.
+    
+    Accepts JSON ({"book_ids": [...], "partial": false}) or form fields
+    (book_ids repeated, partial=1). Returns per-book results as JSON.
+    """
+    if not current_user.is_student():
+        return jsonify({'success': False, 'message': 'Only students can purchase books', 'results': []}), 403
+    
+    try:
+        book_ids, partial = parse_checkout(request.get_json(silent=True), request.form)
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e), 'results': []}), 400
+    
+    success, message, results = db.checkout_cart(current_user.id, book_ids, all_or_nothing=not partial)
+    return jsonify({'success': success, 'message': message, 'results': results}), (200 if success else 409)
+
+# Add new routes for students
+@students_bp.route('/student')
+@login_required
+def student_dashboard():
+    """Student dashboard with purchase options"""
+    if not current_user.is_student():
+        flash('Access denied. Student access only.', 'danger')
+        return redirect(url_for('main.index'))
+    
+    # Available books, one page at a time, through the same cached search as /books
+    page = request.args.get('page', 1, type=int)
+    cursor = request.args.get('cursor')
+    try:
+        available = Book.search(
+            page=page,
+            per_page=DASHBOARD_SETTINGS['per_page'],
+            cursor=cursor,
+            available_only=True
+        )
+    except Exception as e:
+        logger.error(f"Error fetching available books: {e}")
+        available = {'items': [], 'page': 1, 'per_page': DASHBOARD_SETTINGS['per_page'], 'total': 0,
+                     'has_next': False, 'has_prev': False, 'next_cursor': None, 'prev_cursor': None}
+    
+    available_books = Pagination(
+        items=available['items'],
+        page=available['page'],
+        per_page=available['per_page'],
+        total=available['total'],
+        has_next=available['has_next'],
+        has_prev=available['has_prev'],
+        next_cursor=available['next_cursor'],
+        prev_cursor=available['prev_cursor']
+    )
+    
+    # Pagination links keep a per-request ?stream=1
+    link_args = {'stream': '1'} if request.args.get('stream') == '1' else {}
+    
+    if DASHBOARD_SETTINGS['stream'] or link_args:
+        # The session is saved before a streamed body renders, so anything the templates would
+        # change in it happens now: reading the flashes clears them, and the CSRF token is stored.
+        # Both are memoized for the request, so base.html sees the same values while streaming.
+        get_flashed_messages(with_categories=True)
+        generate_csrf()
+        # stream_template keeps the request context (current_user, csrf_token) alive via stream_with_context
+        return Response(stream_template('student_dashboard.html', available_books=available_books,
+                                        link_args=link_args))
+    return render_template('student_dashboard.html', available_books=available_books, link_args=link_args)
+
+@students_bp.route('/student/purchases')
+@login_required
+def student_purchases():
+    """Display books purchased by the student"""
+    if not current_user.is_student():
+        flash('Access denied. Student access only.', 'danger')
+        return redirect(url_for('main.index'))
+    
+    # Get the student's purchased books
+    query = f"""
+    SELECT {db.BOOK_COLUMNS}, s.name as section_name, p.purchase_date, p.price
+    FROM purchases p
+    JOIN books b ON p.book_id = b.id
+    JOIN sections s ON b.section_id = s.id
+    WHERE p.user_id = %s
+    ORDER BY p.purchase_date DESC
+    """
+    
+    purchases = []
+    try:
+        rows = db.fetch_models(Book, query, (current_user.id,), extra=('purchase_date', 'price'))
+        purchases = [
+            {'book': book, 'purchase_date': purchase_date, 'price': price}
+            for book, purchase_date, price in rows
+        ]
+    except Exception as e:
+        logger.error(f"Error fetching student purchases: {e}")
+    
+    return render_template('student_purchases.html', purchases=purchases)
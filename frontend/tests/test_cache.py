@@ -0,0 +1,82 @@
+import pytest
+
+from cache import LocalBackend, VersionedCache
+
+
+class Loader:
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return self.calls
+
+
+class BrokenBackend(LocalBackend):
+    def get_counters(self, keys):
+        raise ConnectionError('cache is down')
+
+    def incr(self, key):
+        raise ConnectionError('cache is down')
+
+
+@pytest.fixture
+def cache():
+    return VersionedCache('test', backend=LocalBackend(max_entries=8), ttl=60)
+
+
+def test_hit_after_fill(cache):
+    loader = Loader()
+    assert cache.get_or_load('k', ['all'], loader) == 1
+    assert cache.get_or_load('k', ['all'], loader) == 1
+    assert loader.calls == 1
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_invalidating_a_scope_reloads_its_entries_only(cache):
+    fantasy, scifi = Loader(), Loader()
+    cache.get_or_load('fantasy', ['books', 'section:1'], fantasy)
+    cache.get_or_load('scifi', ['books', 'section:2'], scifi)
+
+    cache.invalidate('section:1')
+
+    assert cache.get_or_load('fantasy', ['books', 'section:1'], fantasy) == 2
+    assert cache.get_or_load('scifi', ['books', 'section:2'], scifi) == 1
+
+
+def test_invalidating_a_shared_scope_reloads_everything(cache):
+    loaders = {key: Loader() for key in ('a', 'b')}
+    for key, loader in loaders.items():
+        cache.get_or_load(key, ['books', f"section:{key}"], loader)
+
+    cache.invalidate('books')
+
+    for key, loader in loaders.items():
+        assert cache.get_or_load(key, ['books', f"section:{key}"], loader) == 2
+
+
+def test_generation_changes_with_any_scope(cache):
+    before = cache.generation(['books', 'all'])
+    cache.invalidate('section:3')
+    assert cache.generation(['books', 'all']) == before
+    cache.invalidate('all')
+    assert cache.generation(['books', 'all']) == before + 1
+
+
+def test_zero_ttl_turns_the_cache_off():
+    cache = VersionedCache('off', backend=LocalBackend(), ttl=0)
+    loader = Loader()
+    cache.get_or_load('k', ['all'], loader)
+    cache.get_or_load('k', ['all'], loader)
+    assert loader.calls == 2
+    assert len(cache.backend) == 0
+
+
+def test_backend_errors_fall_back_to_the_loader():
+    cache = VersionedCache('broken', backend=BrokenBackend(), ttl=60)
+    loader = Loader()
+    assert cache.get_or_load('k', ['all'], loader) == 1
+    assert cache.get_or_load('k', ['all'], loader) == 2
+    cache.invalidate('all')
+    assert cache.generation(['all']) is None
+    assert cache.errors == 4
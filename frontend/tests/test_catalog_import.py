@@ -0,0 +1,35 @@
+import pytest
+
+from catalog_import import IMPORT_COLUMNS, clean_row
+
+
+class Sections:
+    def resolve(self, row):
+        return 1
+
+
+def available(row):
+    return clean_row({'title': 'Dune', 'author': 'Frank Herbert', **row}, Sections())[IMPORT_COLUMNS.index('available')]
+
+
+@pytest.mark.parametrize('row, expected', [
+    ({}, None),
+    ({'available': ''}, None),
+    ({'available': None}, None),
+    ({'available': 'yes'}, True),
+    ({'available': 'F'}, False),
+    ({'available': True}, True),
+    ({'available': False}, False),
+])
+def test_available_is_only_set_when_given(row, expected):
+    assert available(row) is expected
+
+
+def test_invalid_available_is_rejected():
+    with pytest.raises(ValueError):
+        available({'available': 'sold'})
+
+
+def test_missing_title_is_rejected():
+    with pytest.raises(ValueError, match='missing title'):
+        clean_row({'author': 'Frank Herbert'}, Sections())
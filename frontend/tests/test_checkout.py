@@ -0,0 +1,57 @@
+import pytest
+from werkzeug.datastructures import MultiDict
+
+from students import parse_checkout
+
+NO_FORM = MultiDict()
+
+
+@pytest.mark.parametrize('payload, expected', [
+    ({'book_ids': [3, 1, 2]}, ([3, 1, 2], False)),
+    ({'book_ids': [1], 'partial': True}, ([1], True)),
+    ({'book_ids': [1], 'partial': False}, ([1], False)),
+    ({'book_ids': []}, ([], False)),
+    ({}, ([], False)),
+])
+def test_json_payload(payload, expected):
+    assert parse_checkout(payload, NO_FORM) == expected
+
+
+@pytest.mark.parametrize('payload', [
+    [1, 2],
+    'book_ids',
+    7,
+    {'book_ids': '12'},
+    {'book_ids': 12},
+    {'book_ids': None},
+    {'book_ids': {'1': True}},
+    {'book_ids': ['1', '2']},
+    {'book_ids': [True, 2]},
+    {'book_ids': [1.5]},
+    {'book_ids': [1], 'partial': 'false'},
+    {'book_ids': [1], 'partial': 1},
+    {'book_ids': [1], 'partial': None},
+])
+def test_malformed_json_payload_is_rejected(payload):
+    with pytest.raises(ValueError):
+        parse_checkout(payload, NO_FORM)
+
+
+def test_form_fields():
+    form = MultiDict([('book_ids', '4'), ('book_ids', '2'), ('partial', '1')])
+    assert parse_checkout(None, form) == ([4, 2], True)
+
+
+@pytest.mark.parametrize('partial', ['0', 'true', 'false', ''])
+def test_form_partial_only_for_1(partial):
+    form = MultiDict([('book_ids', '4'), ('partial', partial)])
+    assert parse_checkout(None, form) == ([4], False)
+
+
+def test_form_without_books():
+    assert parse_checkout(None, NO_FORM) == ([], False)
+
+
+def test_form_rejects_non_integer_ids():
+    with pytest.raises(ValueError):
+        parse_checkout(None, MultiDict([('book_ids', '4'), ('book_ids', 'x')]))
@@ -0,0 +1,49 @@
+import json
+import base64
+
+import pytest
+
+from db import encode_cursor, decode_cursor, CURSOR_MAX_VALUE
+
+
+def token(payload):
+    """Encode an arbitrary payload the way encode_cursor does"""
+    raw = payload if isinstance(payload, bytes) else json.dumps(payload).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+@pytest.mark.parametrize('direction', ['next', 'prev'])
+@pytest.mark.parametrize('title', ['Dune', 'Ænéide — vol. 2', '', 'a' * 256])
+def test_round_trip(direction, title):
+    cursor = encode_cursor(direction, title, 42, 7)
+    assert decode_cursor(cursor) == {'direction': direction, 'title': title, 'id': 42, 'page': 7}
+
+
+def test_cursor_is_url_safe():
+    cursor = encode_cursor('next', '??>>~~', CURSOR_MAX_VALUE, CURSOR_MAX_VALUE)
+    assert set(cursor) <= set('ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-_')
+    assert decode_cursor(cursor)['id'] == CURSOR_MAX_VALUE
+
+
+@pytest.mark.parametrize('cursor', [
+    '',
+    'not base64!',
+    'ü',
+    token(b'\xff\xfe'),
+    token(b'{"not": "a list"}'),
+    token(['next', 'Dune', 42]),
+    token(['sideways', 'Dune', 42, 2]),
+    token(['next', 7, 42, 2]),
+    token(['next', 'Dune', 'abc', 2]),
+    token(['next', 'Dune', None, 2]),
+    token(b'["next", "Dune", 1e999, 2]'),
+    token(b'["next", "Dune", 42, 1e999]'),
+    token(b'["next", "Dune", NaN, 2]'),
+    token(['next', 'Dune', 0, 2]),
+    token(['next', 'Dune', -1, 2]),
+    token(['next', 'Dune', CURSOR_MAX_VALUE + 1, 2]),
+    token(['next', 'Dune', 42, 0]),
+    token(['next', 'Dune', 42, 10 ** 30]),
+])
+def test_bad_input_is_rejected(cursor):
+    assert decode_cursor(cursor) is None
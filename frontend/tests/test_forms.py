@@ -0,0 +1,49 @@
+import pytest
+from flask import Flask
+
+import forms
+from db import Section
+
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+    app.config.update(SECRET_KEY='test', WTF_CSRF_ENABLED=False)
+    return app
+
+
+@pytest.fixture
+def sections(monkeypatch):
+    # 3 exists in the database but not in this worker's cached catalog
+    database = {1: 'Fantasy', 2: 'Science Fiction', 3: 'Poetry'}
+    monkeypatch.setattr(Section, 'choices', classmethod(lambda cls: [(1, 'Fantasy'), (2, 'Science Fiction')]))
+    monkeypatch.setattr(Section, 'get_by_id', classmethod(
+        lambda cls, section_id: Section(id=section_id, name=database[section_id]) if section_id in database else None
+    ))
+
+
+def submit(app, section_id):
+    data = {'title': 'The Odyssey', 'author': 'Homer', 'section_id': str(section_id)}
+    with app.test_request_context('/books/add', method='POST', data=data):
+        form = forms.BookForm()
+        return form.validate(), form
+
+
+@pytest.mark.usefixtures('sections')
+def test_cached_section_is_accepted(app):
+    valid, _ = submit(app, 2)
+    assert valid
+
+
+@pytest.mark.usefixtures('sections')
+def test_section_missing_from_the_cached_catalog_is_checked_in_the_database(app):
+    valid, form = submit(app, 3)
+    assert valid
+    assert (3, 'Poetry') in form.section_id.choices
+
+
+@pytest.mark.usefixtures('sections')
+def test_unknown_section_is_rejected(app):
+    valid, form = submit(app, 99)
+    assert not valid
+    assert form.section_id.errors
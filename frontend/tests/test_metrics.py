@@ -0,0 +1,123 @@
+import gc
+import json
+import os
+import threading
+
+import pytest
+
+import metrics
+
+
+@pytest.fixture(autouse=True)
+def process_metrics(monkeypatch, tmp_path):
+    monkeypatch.setitem(metrics.METRICS_SETTINGS, 'dir', str(tmp_path))
+    monkeypatch.setattr(metrics, '_process_samples', lambda: ({}, {}))
+    return tmp_path
+
+
+def counter(counters, name):
+    return counters.get((name, ()), 0)
+
+
+def test_exited_threads_are_folded_into_the_process_total():
+    before = counter(metrics.snapshot()['counters'], 'test_thread_requests_total')
+    shards_before = len(metrics._shards)
+
+    def record():
+        metrics.inc('test_thread_requests_total')
+        metrics.observe('test_thread_seconds', (), 0.01)
+
+    threads = [threading.Thread(target=record) for _ in range(50)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    gc.collect()
+
+    assert len(metrics._shards) <= shards_before
+    data = metrics.snapshot()
+    assert counter(data['counters'], 'test_thread_requests_total') == before + 50
+    assert sum(data['histograms'][('test_thread_seconds', ())][:-1]) >= 50
+
+
+def write_worker_file(directory, pid, requests):
+    with open(os.path.join(directory, f"metrics-{pid}.json"), 'w') as f:
+        json.dump({'pid': pid, 'at': 0, 'counters': [['test_worker_requests_total', [], requests]],
+                   'gauges': [['test_worker_gauge', [], 1]], 'histograms': []}, f)
+
+
+def test_dead_workers_are_retired_without_losing_counts(process_metrics, monkeypatch):
+    monkeypatch.setattr(metrics, '_pid_alive', lambda pid: pid == 2)
+    write_worker_file(process_metrics, 1, 5)
+    write_worker_file(process_metrics, 2, 7)
+    write_worker_file(process_metrics, 3, 11)
+
+    counters, gauges, _ = metrics.merged()
+    assert counter(counters, 'test_worker_requests_total') == 23
+    assert gauges[('test_worker_gauge', ())] == 1
+    assert sorted(os.listdir(process_metrics)) == ['.lock', 'metrics-2.json', metrics.RETIRED_FILE]
+
+    # Retiring again later keeps adding to the same total
+    write_worker_file(process_metrics, 4, 13)
+    counters, _, _ = metrics.merged()
+    assert counter(counters, 'test_worker_requests_total') == 36
+    assert not os.path.exists(os.path.join(process_metrics, 'metrics-4.json'))
+
+
+class User:
+    is_authenticated = True
+
+    def __init__(self, admin):
+        self.admin = admin
+
+    def get_id(self):
+        return 'admin' if self.admin else 'student'
+
+    def is_admin(self):
+        return self.admin
+
+
+@pytest.fixture
+def client(monkeypatch):
+    from flask import Flask
+    from flask_login import LoginManager
+
+    monkeypatch.setitem(metrics.METRICS_SETTINGS, 'enabled', True)
+    monkeypatch.setitem(metrics.METRICS_SETTINGS, 'token', 'scrape-secret')
+    monkeypatch.setitem(metrics.METRICS_SETTINGS, 'allow', [])
+    monkeypatch.setattr(metrics, '_start_flusher', lambda: None)
+    app = Flask(__name__)
+    app.secret_key = 'test'
+    login_manager = LoginManager(app)
+    login_manager.request_loader(
+        lambda request: User(request.headers['X-User'] == 'admin') if 'X-User' in request.headers else None
+    )
+    metrics.init_app(app)
+    return app.test_client()
+
+
+@pytest.mark.parametrize('headers', [
+    {},
+    {'Authorization': 'Bearer wrong'},
+    {'Authorization': 'Basic scrape-secret'},
+    {'X-User': 'student'},
+])
+def test_metrics_are_private(client, headers):
+    assert client.get('/metrics', headers=headers).status_code == 403
+
+
+@pytest.mark.parametrize('headers', [
+    {'Authorization': 'Bearer scrape-secret'},
+    {'X-User': 'admin'},
+])
+def test_metrics_for_scrapers_and_admins(client, headers):
+    response = client.get('/metrics', headers=headers)
+    assert response.status_code == 200
+    assert response.mimetype == 'text/plain'
+
+
+def test_metrics_for_allowed_addresses(client, monkeypatch):
+    import ipaddress
+    monkeypatch.setitem(metrics.METRICS_SETTINGS, 'allow', [ipaddress.ip_network('10.0.0.0/8')])
+    assert client.get('/metrics', environ_base={'REMOTE_ADDR': '10.1.2.3'}).status_code == 200
+    assert client.get('/metrics', environ_base={'REMOTE_ADDR': '192.168.1.2'}).status_code == 403
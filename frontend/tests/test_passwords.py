@@ -0,0 +1,33 @@
+import pytest
+from werkzeug.security import generate_password_hash
+
+import passwords
+
+
+@pytest.mark.parametrize('method, stored', [
+    ('scrypt', 'scrypt:32768:8:1'),
+    ('scrypt:32768:8:1', 'scrypt:32768:8:1'),
+    ('pbkdf2:sha256:600000', 'pbkdf2:sha256:600000'),
+    # werkzeug's current default iterations, whatever the installed version uses
+    ('pbkdf2', 'pbkdf2'),
+    ('pbkdf2:sha256', 'pbkdf2'),
+])
+def test_shorthand_methods_match_their_stored_prefix(monkeypatch, method, stored):
+    monkeypatch.setitem(passwords.PASSWORD_SETTINGS, 'method', method)
+    assert not passwords.needs_rehash(generate_password_hash('secret', stored))
+
+
+def test_other_method_or_cost_needs_rehash(monkeypatch):
+    monkeypatch.setitem(passwords.PASSWORD_SETTINGS, 'method', 'scrypt')
+    assert passwords.needs_rehash(generate_password_hash('secret', 'pbkdf2:sha256:600000'))
+    assert passwords.needs_rehash(generate_password_hash('secret', 'scrypt:16384:8:1'))
+
+
+def test_pool_does_not_fork_the_web_worker(monkeypatch):
+    monkeypatch.setitem(passwords.PASSWORD_SETTINGS, 'offload', True)
+    monkeypatch.setitem(passwords.PASSWORD_SETTINGS, 'method', 'pbkdf2:sha256:1000')
+    try:
+        assert passwords._get_executor()._mp_context.get_start_method() != 'fork'
+        assert passwords.verify_password(passwords.hash_password('secret'), 'secret')
+    finally:
+        passwords.shutdown()
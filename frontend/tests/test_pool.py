@@ -0,0 +1,156 @@
+import threading
+import time
+
+import psycopg2.extensions
+import pytest
+
+from db import ConnectionPool, PoolTimeout
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, query, params=None):
+        self.conn.pings += 1
+        if self.conn.ping_delay:
+            time.sleep(self.conn.ping_delay)
+        if self.conn.broken:
+            raise psycopg2.OperationalError("server closed the connection unexpectedly")
+
+
+class FakeConnection:
+    def __init__(self):
+        self.closed = 0
+        self.broken = False
+        self.ping_delay = 0
+        self.pings = 0
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        self.closed = 1
+
+    def get_transaction_status(self):
+        return psycopg2.extensions.TRANSACTION_STATUS_IDLE
+
+
+def make_pool(**kwargs):
+    opened = []
+
+    def connect():
+        conn = FakeConnection()
+        opened.append(conn)
+        return conn
+
+    settings = dict(minconn=0, maxconn=2, timeout=0.2, recycle=0, health_check=None, connect=connect)
+    settings.update(kwargs)
+    return ConnectionPool(**settings), opened
+
+
+def test_returned_connection_is_reused():
+    pool, opened = make_pool()
+    conn = pool.getconn()
+    pool.putconn(conn)
+    assert pool.getconn() is conn
+    assert len(opened) == 1
+
+
+def test_checkout_times_out_when_exhausted():
+    pool, _ = make_pool(maxconn=1, timeout=0.05)
+    pool.getconn()
+    with pytest.raises(PoolTimeout):
+        pool.getconn()
+    assert pool.stats()['timeouts'] == 1
+
+
+def test_waiter_gets_released_connection():
+    pool, _ = make_pool(maxconn=1, timeout=2)
+    conn = pool.getconn()
+    threading.Timer(0.05, pool.putconn, (conn,)).start()
+    assert pool.getconn() is conn
+    assert pool.stats()['waits'] == 1
+
+
+def test_invalid_sizes_are_rejected():
+    with pytest.raises(ValueError):
+        ConnectionPool(minconn=3, maxconn=2, connect=FakeConnection)
+
+
+def test_failed_health_check_replaces_connection():
+    pool, opened = make_pool(health_check=0)
+    conn = pool.getconn()
+    pool.putconn(conn)
+    conn.broken = True
+    replacement = pool.getconn()
+    assert replacement is not conn
+    assert conn.closed
+    assert pool.size == 1
+    assert pool.stats()['failed_health_checks'] == 1
+
+
+def test_recycled_connection_is_closed():
+    pool, _ = make_pool(recycle=0.01)
+    conn = pool.getconn()
+    pool.putconn(conn)
+    time.sleep(0.02)
+    assert pool.getconn() is not conn
+    assert conn.closed
+    assert pool.stats()['recycled'] == 1
+
+
+def test_slow_health_check_does_not_block_other_checkouts():
+    pool, _ = make_pool(maxconn=3, health_check=0)
+    slow = pool.getconn()
+    pool.putconn(slow)
+    slow.ping_delay = 0.5
+    pinging = threading.Thread(target=pool.getconn)
+    pinging.start()
+    while slow.pings == 0:
+        time.sleep(0.001)
+
+    start = time.monotonic()
+    other = pool.getconn()
+    pool.putconn(other)
+    assert time.monotonic() - start < 0.25
+    pinging.join()
+
+
+def test_connection_being_pinged_keeps_its_slot():
+    pool, _ = make_pool(maxconn=1, health_check=0, timeout=0.05)
+    conn = pool.getconn()
+    pool.putconn(conn)
+    conn.ping_delay = 0.3
+    pinging = threading.Thread(target=pool.getconn)
+    pinging.start()
+    while conn.pings == 0:
+        time.sleep(0.001)
+    with pytest.raises(PoolTimeout):
+        pool.getconn()
+    pinging.join()
+
+
+def test_fork_drops_inherited_connections_without_closing_them():
+    pool, opened = make_pool()
+    inherited = pool.getconn()
+    idle = pool.getconn()
+    pool.putconn(idle)
+
+    pool._pid = -1   # as seen from a child process
+    fresh = pool.getconn()
+    assert fresh not in (inherited, idle)
+    assert not inherited.closed and not idle.closed
+
+    # Returning the parent's connection is a no-op in the child
+    pool.putconn(inherited)
+    assert pool.stats()['in_use'] == 1
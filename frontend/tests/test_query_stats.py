@@ -0,0 +1,37 @@
+import pytest
+
+from query_stats import normalize
+
+
+@pytest.mark.parametrize('sql', [
+    "SELECT * FROM books WHERE id = 5",
+    "SELECT * FROM books WHERE id = %s",
+    "SELECT * FROM books WHERE id = %(book_id)s",
+    "SELECT *\n  FROM books\n WHERE id = 12345  ",
+    "SELECT * FROM books -- by id\nWHERE id = 5",
+    b"SELECT * FROM books WHERE id = 5",
+])
+def test_same_statement_has_one_shape(sql):
+    assert normalize(sql) == "SELECT * FROM books WHERE id = ?"
+
+
+def test_strings_and_decimals_become_parameters():
+    assert normalize("UPDATE settings SET value = 'it''s 1.5' WHERE price > 9.99") == \
+        "UPDATE settings SET value = ? WHERE price > ?"
+
+
+@pytest.mark.parametrize('ids', ['(1, 2, 3)', '(%s,%s)', "('a', 'b', 'c', 'd')"])
+def test_in_lists_of_any_length_collapse(ids):
+    assert normalize(f"SELECT * FROM books WHERE id IN {ids}") == "SELECT * FROM books WHERE id IN (?)"
+
+
+def test_digits_inside_identifiers_are_kept():
+    assert normalize("SELECT md5(title) FROM books_2024 b1") == "SELECT md5(title) FROM books_2024 b1"
+
+
+def test_non_string_statement():
+    class Composed:
+        def __str__(self):
+            return "SELECT 1"
+
+    assert normalize(Composed()) == "SELECT ?"
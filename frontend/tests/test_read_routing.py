@@ -0,0 +1,43 @@
+import pytest
+
+from db import is_read_only
+
+
+@pytest.mark.parametrize('query', [
+    "SELECT * FROM books WHERE id = %s",
+    "  select count(*) from books",
+    "WITH recent AS (SELECT * FROM purchases) SELECT * FROM recent",
+    "EXPLAIN (FORMAT JSON) SELECT * FROM books",
+    "SHOW server_version",
+    "SELECT b.id FROM books b WHERE b.title ILIKE %s",
+    "SELECT * FROM users WHERE updated_at > %s",
+])
+def test_reads_may_go_to_a_replica(query):
+    assert is_read_only(query)
+
+
+@pytest.mark.parametrize('query', [
+    "INSERT INTO books (title) VALUES (%s)",
+    "UPDATE books SET available = FALSE WHERE id = %s",
+    "DELETE FROM books WHERE id = %s",
+    "WITH claimed AS (UPDATE books SET available = FALSE RETURNING id) SELECT * FROM claimed",
+    "WITH added AS (INSERT INTO purchases (user_id) VALUES (1) RETURNING id) SELECT id FROM added",
+    "SELECT * FROM books WHERE id = %s FOR UPDATE",
+    "SELECT * FROM books WHERE id = %s FOR NO KEY UPDATE",
+    "SELECT * FROM books WHERE id = %s FOR SHARE",
+    "SELECT * FROM books WHERE id = %s FOR KEY SHARE",
+    "SELECT * INTO books_copy FROM books",
+    "SELECT nextval('books_id_seq')",
+    "SELECT setval('books_id_seq', 10)",
+    "SELECT pg_notify('purchase_settings', %s)",
+    "SELECT pg_advisory_lock(1)",
+    "SELECT pg_try_advisory_lock(1)",
+    "CREATE INDEX CONCURRENTLY idx ON books (title)",
+    "VACUUM ANALYZE books",
+    "TRUNCATE books",
+    "COPY books FROM STDIN",
+    "SET statement_timeout = 0",
+    "LOCK TABLE books",
+])
+def test_writes_stay_on_the_primary(query):
+    assert not is_read_only(query)
@@ -0,0 +1,66 @@
+import pytest
+
+import db
+from db import Role, RoleRegistry
+
+ROLES = [Role(id=1, name='Admin'), Role(id=2, name='Student'), Role(id=3, name='Librarian')]
+
+
+@pytest.fixture
+def table(monkeypatch):
+    """The roles table, and how many times it was read"""
+    class Table:
+        rows = list(ROLES)
+        reads = 0
+
+    def fetch_models(cls, query, params=None, extra=()):
+        Table.reads += 1
+        return list(Table.rows)
+
+    monkeypatch.setattr(db, 'fetch_models', fetch_models)
+    return Table
+
+
+def test_roles_are_loaded_once(table):
+    registry = RoleRegistry()
+    assert registry.get_by_name('Student').id == 2
+    assert registry.get_by_id(3).name == 'Librarian'
+    assert registry.name_for(1) == 'Admin'
+    assert sorted(role.id for role in registry.roles()) == [1, 2, 3]
+    assert table.reads == 1
+
+
+def test_miss_reloads_at_most_once_per_interval(table):
+    registry = RoleRegistry(miss_reload_interval=3600)
+    registry.load()
+    table.rows.append(Role(id=4, name='Auditor'))
+
+    # Loaded just now, so the miss is trusted
+    assert registry.get_by_name('Auditor') is None
+    assert registry.name_for(4) is None
+    assert table.reads == 1
+
+
+def test_miss_after_the_interval_picks_up_new_roles(table):
+    registry = RoleRegistry(miss_reload_interval=0)
+    registry.load()
+    table.rows.append(Role(id=4, name='Auditor'))
+
+    assert registry.get_by_name('Auditor').id == 4
+    assert registry.get_by_id(4).name == 'Auditor'
+    assert table.reads == 2
+
+
+def test_invalidate_reloads_and_drops_cached_users(table, monkeypatch):
+    dropped = []
+    monkeypatch.setattr(db, 'invalidate_users', lambda: dropped.append(True))
+    registry = RoleRegistry()
+    registry.load()
+    table.rows[1] = Role(id=2, name='Reader')
+
+    registry.invalidate()
+
+    assert registry.name_for(2) == 'Reader'
+    assert registry.get_by_name('Student') is None
+    assert table.reads == 2
+    assert dropped == [True]
@@ -0,0 +1,48 @@
+from db import Section, row_maker
+
+
+class Point:
+    _columns = ('x', 'y', 'label')
+
+    def __init__(self, x=None, y=None, label='origin'):
+        self.x, self.y, self.label = x, y, label
+
+
+def test_every_column_in_any_order():
+    make = row_maker(Point, ('label', 'y', 'x'))
+    point = make(('a', 2, 1))
+    assert (point.x, point.y, point.label) == (1, 2, 'a')
+
+
+def test_unknown_columns_are_ignored_and_missing_fields_keep_defaults():
+    make = row_maker(Point, ('x', 'section_name', 'y'))
+    point = make((1, 'Fantasy', 2))
+    assert (point.x, point.y, point.label) == (1, 2, 'origin')
+
+
+def test_single_field():
+    point = row_maker(Point, ('y',))((5,))
+    assert (point.x, point.y) == (None, 5)
+
+
+def test_duplicate_column_uses_the_first():
+    point = row_maker(Point, ('x', 'y', 'label', 'x'))((1, 2, 'a', 99))
+    assert point.x == 1
+
+
+def test_extra_values_follow_the_instance():
+    make = row_maker(Point, ('x', 'y', 'total', 'rank'), extra=('rank', 'total'))
+    point, rank, total = make((1, 2, 40, 0.5))
+    assert (point.x, point.y, rank, total) == (1, 2, 0.5, 40)
+
+
+def test_single_extra_value():
+    point, total = row_maker(Point, ('x', 'total'), extra=('total',))((1, 40))
+    assert (point.x, total) == (1, 40)
+
+
+def test_makers_are_reused():
+    columns = ('id', 'name', 'description', 'created_at', 'updated_at')
+    assert row_maker(Section, columns) is row_maker(Section, columns)
+    section = row_maker(Section, columns)((3, 'Poetry', None, None, None))
+    assert (section.id, section.name, section.book_count) == (3, 'Poetry', None)
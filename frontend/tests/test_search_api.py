@@ -0,0 +1,27 @@
+import pytest
+
+from search_api import numbered, search_statement
+
+
+@pytest.mark.parametrize('sql, expected', [
+    ("SELECT 1", "SELECT 1"),
+    ("WHERE id = %s", "WHERE id = $1"),
+    ("WHERE a = %s AND b = %s OR c = %s", "WHERE a = $1 AND b = $2 OR c = $3"),
+    # psycopg2 numbers every %s on its own, even when the same value is passed twice
+    ("WHERE title ILIKE %s OR author ILIKE %s", "WHERE title ILIKE $1 OR author ILIKE $2"),
+    ("WHERE title LIKE 'a%%' AND id = %s", "WHERE title LIKE 'a%' AND id = $1"),
+    ("SELECT '100%%s' WHERE id = %s", "SELECT '100%s' WHERE id = $1"),
+    ("SELECT %%%s", "SELECT %$1"),
+    ("SELECT 5 %% %s", "SELECT 5 % $1"),
+])
+def test_numbered(sql, expected):
+    assert numbered(sql) == expected
+
+
+@pytest.mark.parametrize('query, section_id', [('harry pot', None), ('dune', 2), ('', 3), (None, None)])
+def test_search_statement_numbers_every_argument(query, section_id):
+    sql, args = search_statement(query, section_id, 10)
+    assert '%s' not in sql
+    assert all(f"${n}" in sql for n in range(1, len(args) + 1))
+    assert f"${len(args) + 1}" not in sql
+    assert args[-1] == 10
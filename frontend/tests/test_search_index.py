@@ -0,0 +1,132 @@
+import types
+
+import pytest
+
+import search_index
+from search_index import PrefixIndex
+
+ROWS = [
+    (1, 'The Hobbit', 'J. R. R. Tolkien', '978-0-261-10221-7', 1, 'Fantasy', True),
+    (2, 'Harry Potter and the Philosopher\'s Stone', 'J. K. Rowling', '9780747532699', 1, 'Fantasy', True),
+    (3, 'Dune', 'Frank Herbert', '9780441013593', 2, 'Science Fiction', False),
+    (4, 'Hyperion', 'Dan Simmons', '9780553283686', 2, 'Science Fiction', True),
+    (5, 'A Game of Thrones', 'George R. R. Martin', '9780553103540', 1, 'Fantasy', True),
+]
+
+
+@pytest.fixture
+def generation(monkeypatch):
+    state = types.SimpleNamespace(value=7)
+    monkeypatch.setattr(search_index, 'books_generation', lambda: state.value)
+    return state
+
+
+@pytest.fixture
+def index(generation):
+    index = PrefixIndex()
+    index.build(ROWS, generation.value)
+    return index
+
+
+def ids(results):
+    return [result['id'] for result in results]
+
+
+def test_prefix_matches_words_in_title_and_author(index):
+    assert ids(index.search('hob')) == [1]
+    assert ids(index.search('tolk')) == [1]
+    # Closest matching term first: harry, herbert, hobbit, hyperion
+    assert ids(index.search('h')) == [2, 3, 1, 4]
+
+
+def test_every_word_must_match(index):
+    assert ids(index.search('harry sto')) == [2]
+    assert ids(index.search('harry dune')) == []
+
+
+def test_isbn_matches_however_it_is_typed(index):
+    assert ids(index.search('978-0-261')) == [1]
+    assert ids(index.search('9780261')) == [1]
+
+
+@pytest.mark.parametrize('query, isbn', [
+    ('978-0-261', True),
+    ('0 261 10221', True),
+    ('026110221x', True),
+    ('x', False),
+    ('-', False),
+    ('x-1', False),
+    ('12x34', False),
+])
+def test_isbn_queries(query, isbn):
+    assert bool(search_index._ISBN_QUERY_RE.match(query)) == isbn
+
+
+def test_section_filter_and_limit(index):
+    assert ids(index.search('h', section_id=2)) == [3, 4]
+    assert ids(index.search('h', limit=2)) == [2, 3]
+
+
+def test_section_only_browsing_is_in_title_order(index):
+    assert ids(index.search('', section_id=1)) == [5, 2, 1]
+    assert ids(index.search('', section_id=1, limit=2)) == [5, 2]
+    assert ids(index.search('', section_id=99)) == []
+
+
+def test_add_moves_a_book_between_sections(index):
+    book = types.SimpleNamespace(id=3, title='Dune Messiah', author='Frank Herbert', isbn='9780441172696',
+                                 section_id=1, available=True, _section_name='Fantasy')
+    index.add(book)
+    assert ids(index.search('', section_id=1)) == [5, 3, 2, 1]
+    assert ids(index.search('', section_id=2)) == [4]
+    assert index.search('messiah')[0]['section'] == 'Fantasy'
+
+
+def test_remove_and_set_available(index):
+    index.remove(1)
+    assert ids(index.search('hob')) == []
+    assert ids(index.search('', section_id=1)) == [5, 2]
+    index.set_available(4, False)
+    assert index.search('hyperion')[0]['available'] is False
+
+
+def test_rename_section(index):
+    index.rename_section(2, 'SF')
+    assert {result['section'] for result in index.search('', section_id=2)} == {'SF'}
+
+
+def test_index_is_stale_only_when_the_generation_moves(index, generation, monkeypatch):
+    monkeypatch.setitem(search_index.INDEX_SETTINGS, 'check_interval', 0)
+    monkeypatch.setitem(search_index.INDEX_SETTINGS, 'max_age', 0)
+    assert not index.is_stale()
+    generation.value += 1
+    assert index.is_stale()
+
+
+def test_index_is_stale_after_max_age(index, generation, monkeypatch):
+    monkeypatch.setitem(search_index.INDEX_SETTINGS, 'check_interval', 60)
+    monkeypatch.setitem(search_index.INDEX_SETTINGS, 'max_age', 30)
+    assert not index.is_stale()
+    index.built_at -= 31
+    assert index.is_stale()
+
+
+def test_own_write_keeps_the_index_current(index, generation, monkeypatch):
+    monkeypatch.setitem(search_index.INDEX_SETTINGS, 'check_interval', 0)
+    # The write's invalidation bumps the generation before the index is patched
+    generation.value += 1
+    index.set_available(2, False)
+    assert not index.is_stale()
+
+
+def test_write_elsewhere_makes_the_index_stale(index, generation, monkeypatch):
+    monkeypatch.setitem(search_index.INDEX_SETTINGS, 'check_interval', 0)
+    generation.value += 2   # another worker's write, then this one's
+    index.set_available(2, False)
+    assert index.is_stale()
+
+
+def test_fork_resets_rebuild_state(monkeypatch):
+    monkeypatch.setattr(search_index.book_index, '_rebuilding', True)
+    search_index._after_fork_in_child()
+    assert search_index.book_index._rebuilding is False
@@ -0,0 +1,80 @@
+import pytest
+from flask import Flask
+
+import db
+from db import Book, Section, SectionRef
+
+SECTIONS = {1: 'Fantasy', 2: 'Science Fiction', 3: 'Poetry'}
+
+
+@pytest.fixture
+def queries(monkeypatch):
+    """Section ids asked for by each query Section.get_many runs"""
+    queries = []
+
+    def fetch_models(cls, query, params=None, extra=()):
+        queries.append(sorted(params[0]))
+        return [cls(id=section_id, name=SECTIONS[section_id], description=f"About {SECTIONS[section_id]}")
+                for section_id in params[0] if section_id in SECTIONS]
+
+    monkeypatch.setattr(db, 'fetch_models', fetch_models)
+    return queries
+
+
+@pytest.fixture
+def request_context():
+    with Flask(__name__).test_request_context():
+        yield
+
+
+@pytest.mark.usefixtures('request_context')
+def test_id_and_name_need_no_query(queries):
+    ref = SectionRef(1, 'Fantasy')
+    assert (ref.id, ref.name) == (1, 'Fantasy')
+    assert queries == []
+
+
+@pytest.mark.usefixtures('request_context')
+def test_first_lookup_resolves_every_pending_reference(queries):
+    books = [Book(id=book_id, section_id=section_id, section_name=SECTIONS[section_id])
+             for book_id, section_id in enumerate([1, 2, 1, 3])]
+    refs = [book.section for book in books]
+
+    assert [ref.description for ref in refs] == ['About Fantasy', 'About Science Fiction', 'About Fantasy',
+                                                 'About Poetry']
+    assert queries == [[1, 2, 3]]
+
+
+@pytest.mark.usefixtures('request_context')
+def test_name_is_resolved_when_not_joined_in(queries):
+    assert SectionRef(2).name == 'Science Fiction'
+    assert queries == [[2]]
+
+
+@pytest.mark.usefixtures('request_context')
+def test_missing_section(queries):
+    assert SectionRef(99).description is None
+
+
+@pytest.mark.usefixtures('request_context')
+def test_private_attributes_are_not_resolved(queries):
+    with pytest.raises(AttributeError):
+        SectionRef(1)._books
+    assert queries == []
+
+
+def test_book_reference_follows_its_section_id(queries):
+    book = Book(id=1, section_id=1, section_name='Fantasy')
+    assert book.section.id == 1
+    book.section_id = 2
+    assert book.section.id == 2
+    book.section_id = None
+    assert book.section is None
+
+
+def test_references_are_per_request(queries):
+    app = Flask(__name__)
+    for _ in range(2):
+        with app.test_request_context():
+            SectionRef(1).description
+    assert queries == [[1], [1]]
@@ -0,0 +1,82 @@
+import pytest
+from flask import Flask
+
+import db
+from db import User, invalidate_user, invalidate_users, user_cache
+
+
+@pytest.fixture
+def loads(monkeypatch):
+    """User ids read from the database"""
+    loads = []
+
+    def get_by_id(cls, user_id):
+        loads.append(user_id)
+        return User(id=user_id, username=f"user{user_id}", role_id=2)
+
+    monkeypatch.setattr(User, 'get_by_id', classmethod(get_by_id))
+    monkeypatch.setattr(user_cache, 'backend', type(user_cache.backend)())
+    monkeypatch.setattr(user_cache, 'ttl', 60)
+    return loads
+
+
+@pytest.fixture
+def app():
+    return Flask(__name__)
+
+
+def test_memo_serves_the_same_user_within_a_request(app, loads):
+    with app.test_request_context():
+        first = User.get_cached(1)
+        assert User.get_cached(1) is first
+        User.get_cached(2)
+    assert loads == [1, 2]
+
+
+def test_cache_serves_later_requests(app, loads):
+    for _ in range(3):
+        with app.test_request_context():
+            assert User.get_cached(1).username == 'user1'
+    assert loads == [1]
+
+
+def test_invalidating_one_user_reloads_only_that_user(app, loads):
+    with app.test_request_context():
+        User.get_cached(1)
+        User.get_cached(2)
+    invalidate_user(1)
+    with app.test_request_context():
+        User.get_cached(1)
+        User.get_cached(2)
+    assert loads == [1, 2, 1]
+
+
+def test_invalidating_every_user(app, loads):
+    with app.test_request_context():
+        User.get_cached(1)
+        User.get_cached(2)
+    invalidate_users()
+    with app.test_request_context():
+        User.get_cached(1)
+        User.get_cached(2)
+    assert loads == [1, 2, 1, 2]
+
+
+def test_invalidation_does_not_reach_the_current_request_memo(app, loads):
+    with app.test_request_context():
+        first = User.get_cached(1)
+        invalidate_user(1)
+        assert User.get_cached(1) is first
+    assert loads == [1]
+
+
+def test_password_upgrade_invalidates_the_user(app, loads, monkeypatch):
+    monkeypatch.setattr(db.passwords, 'needs_rehash', lambda password_hash: True)
+    monkeypatch.setattr(db.passwords, 'hash_password', lambda password: 'new-hash')
+    monkeypatch.setattr(db, 'execute_query', lambda *args, **kwargs: None)
+    with app.test_request_context():
+        user = User.get_cached(1)
+    assert user.upgrade_password_hash('secret')
+    with app.test_request_context():
+        User.get_cached(1)
+    assert loads == [1, 1]